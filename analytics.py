@@ -0,0 +1,277 @@
+import re
+import threading
+import numpy as np
+import pandas as pd
+
+TRADING_DAYS = 252
+
+# Metric key -> (label, kind, source); kind decides how the value is formatted
+METRICS = {
+    "latest_close": ("Latest close", "price", "prices"),
+    "high_52w": ("52-week high", "price", "prices"),
+    "low_52w": ("52-week low", "price", "prices"),
+    "sma_50": ("50-day moving average", "price", "prices"),
+    "sma_200": ("200-day moving average", "price", "prices"),
+    "return_1m": ("1-month return", "pct", "prices"),
+    "return_3m": ("3-month return", "pct", "prices"),
+    "return_1y": ("1-year return", "pct", "prices"),
+    "ytd_return": ("YTD return", "pct", "prices"),
+    "volatility_30d": ("30-day volatility (annualized)", "pct", "prices"),
+    "volatility_1y": ("1-year volatility (annualized)", "pct", "prices"),
+    "max_drawdown_1y": ("1-year max drawdown", "pct", "prices"),
+    "avg_volume_30d": ("30-day average volume", "count", "prices"),
+    "revenue_growth_yoy": ("Revenue growth YoY", "pct", "financials"),
+    "net_income_growth_yoy": ("Net income growth YoY", "pct", "financials"),
+    "free_cash_flow_growth_yoy": ("Free cash flow growth YoY", "pct", "financials"),
+    "gross_margin": ("Gross margin", "pct", "financials"),
+    "operating_margin": ("Operating margin", "pct", "financials"),
+    "net_margin": ("Net margin", "pct", "financials"),
+}
+
+
+# Query patterns for the fast path, checked in order; the first match wins
+# Each matches a whole metric phrase, horizon included; words around it must be filler or a ticker
+QUERY_PATTERNS = [
+    (r"\b(52[- ]?w(ee)?k|year(ly)?) high\b", "high_52w"),
+    (r"\b(52[- ]?w(ee)?k|year(ly)?) low\b", "low_52w"),
+    (r"\b(ytd|year[- ]to[- ]date)( return| performance)?\b", "ytd_return"),
+    (r"\b((1|one)[- ]?y(ea)?r|12[- ]?month|annual) vol(atility)?\b", "volatility_1y"),
+    (r"\b((30|thirty)[- ]?day )?(annualized )?vol(atility)?\b", "volatility_30d"),
+    (r"\b(50|fifty)[- ]?day (moving average|ma|sma)\b", "sma_50"),
+    (r"\b(200|two hundred)[- ]?day (moving average|ma|sma)\b", "sma_200"),
+    (r"\b(1|one)[- ]?month return\b", "return_1m"),
+    (r"\b(3|three)[- ]?month return\b", "return_3m"),
+    (r"\b((1|one)[- ]?y(ea)?r|12[- ]?month|annual) return\b", "return_1y"),
+    (r"\b(max(imum)?|biggest) drawdown\b", "max_drawdown_1y"),
+    (r"\b((30|thirty)[- ]?day )?average (daily )?volume\b", "avg_volume_30d"),
+    (r"\brevenue growth( yoy| year[- ]over[- ]year)?\b", "revenue_growth_yoy"),
+    (r"\b(net income|earnings) growth( yoy| year[- ]over[- ]year)?\b", "net_income_growth_yoy"),
+    (r"\b(free cash flow|fcf) growth( yoy| year[- ]over[- ]year)?\b", "free_cash_flow_growth_yoy"),
+    (r"\bgross margin\b", "gross_margin"),
+    (r"\boperating margin\b", "operating_margin"),
+    (r"\b(net|profit) margin\b", "net_margin"),
+    (r"\b((latest|last|current|recent) (close|closing price|price)|closing price|price (now|today))\b", "latest_close"),
+]
+
+# Words a fast-path question may have besides the metric phrase and a ticker ("what's NVDA's 52-week high?")
+FILLER_WORDS = {"what", "whats", "what's", "is", "was", "the", "a", "an", "of", "for", "its", "it's", "current",
+                "currently", "latest", "today", "now", "stock", "share", "shares", "show", "me", "tell", "give",
+                "get", "please"}
+
+# Questions that want reasoning rather than a single number always go to the agent
+OPEN_ENDED = re.compile(r"\b(why|how come|explain|compare|versus|vs\.?|should|analy[sz]e|justif|predict|"
+                        r"forecast|news|and|relative|summari[sz]e)\b", re.IGNORECASE)
+
+MAX_FAST_PATH_WORDS = 12
+
+
+# Computes headline price metrics for one ticker's OHLCV frame (Date index)
+def compute_price_metrics(prices):
+    close = prices["Close"].dropna()
+    if close.empty:
+        return {}
+
+    values = close.to_numpy(dtype=np.float64)
+    latest = values[-1]
+    last_year = values[-TRADING_DAYS:]
+    log_returns = np.diff(np.log(values))
+
+    def trailing_return(days):
+        if len(values) <= days:
+            return np.nan
+        return latest / values[-days - 1] - 1
+
+    def annualized_vol(days):
+        window = log_returns[-days:]
+        if len(window) < 2:
+            return np.nan
+        return window.std(ddof=1) * np.sqrt(TRADING_DAYS)
+
+    year_start = close[close.index.year == close.index[-1].year]
+    previous_year = close[close.index < year_start.index[0]]
+    ytd_base = previous_year.iloc[-1] if not previous_year.empty else year_start.iloc[0]
+
+    running_peak = np.maximum.accumulate(last_year)
+
+    metrics = {
+        "as_of": close.index[-1].strftime("%Y-%m-%d"),
+        "latest_close": latest,
+        "high_52w": last_year.max(),
+        "low_52w": last_year.min(),
+        "sma_50": values[-50:].mean() if len(values) >= 50 else np.nan,
+        "sma_200": values[-200:].mean() if len(values) >= 200 else np.nan,
+        "return_1m": trailing_return(21),
+        "return_3m": trailing_return(63),
+        "return_1y": trailing_return(TRADING_DAYS),
+        "ytd_return": latest / ytd_base - 1,
+        "volatility_30d": annualized_vol(30),
+        "volatility_1y": annualized_vol(TRADING_DAYS),
+        "max_drawdown_1y": (last_year / running_peak - 1).min(),
+    }
+
+    if "Volume" in prices.columns:
+        metrics["avg_volume_30d"] = prices["Volume"].dropna().to_numpy()[-30:].mean()
+
+    return metrics
+
+
+# Computes growth and margins from the long-format financials saved by get_financials
+def compute_financial_metrics(financials):
+    if financials is None or financials.empty:
+        return {}
+
+    values = pd.to_numeric(financials["Value"], errors="coerce")
+    table = (financials.assign(Value=values)
+             .pivot_table(index="Financial", columns="Date", values="Value", aggfunc="first", observed=True))
+    table = table[sorted(table.columns, reverse=True)]  # Most recent period first
+
+    def line(name):
+        return table.loc[name].to_numpy(dtype=np.float64) if name in table.index else None
+
+    def growth(name):
+        row = line(name)
+        if row is None or len(row) < 2 or not row[1]:
+            return np.nan
+        return row[0] / abs(row[1]) - 1
+
+    def margin(name):
+        row, revenue = line(name), line("IS_TotalRevenue")
+        if row is None or revenue is None or not revenue[0]:
+            return np.nan
+        return row[0] / revenue[0]
+
+    return {
+        "revenue_growth_yoy": growth("IS_TotalRevenue"),
+        "net_income_growth_yoy": growth("IS_NetIncome"),
+        "free_cash_flow_growth_yoy": growth("CF_FreeCashFlow"),
+        "gross_margin": margin("IS_GrossProfit"),
+        "operating_margin": margin("IS_OperatingIncome"),
+        "net_margin": margin("IS_NetIncome"),
+    }
+
+
+# Line items compute_financial_metrics reads
+FINANCIAL_ITEMS = ["IS_TotalRevenue", "IS_NetIncome", "CF_FreeCashFlow", "IS_GrossProfit", "IS_OperatingIncome"]
+
+
+# Same metrics as compute_financial_metrics for many tickers at once, from FinancialsStore.latest(FINANCIAL_ITEMS)
+# (one row per ticker, a (Financial, Period) column per value). Returns a (Ticker x metric) frame.
+def financial_metrics_by_ticker(latest):
+    def growth(name):
+        previous = latest[(name, 2)]
+        return latest[(name, 1)] / previous.abs().where(previous != 0) - 1
+
+    def margin(name):
+        revenue = latest[("IS_TotalRevenue", 1)]
+        return latest[(name, 1)] / revenue.where(revenue != 0)
+
+    return pd.DataFrame({
+        "revenue_growth_yoy": growth("IS_TotalRevenue"),
+        "net_income_growth_yoy": growth("IS_NetIncome"),
+        "free_cash_flow_growth_yoy": growth("CF_FreeCashFlow"),
+        "gross_margin": margin("IS_GrossProfit"),
+        "operating_margin": margin("IS_OperatingIncome"),
+        "net_margin": margin("IS_NetIncome"),
+    }, index=latest.index, dtype=np.float64)
+
+
+def format_metric(key, value):
+    label, kind, _ = METRICS[key]
+    if value is None or pd.isna(value):
+        return f"{label}: not available"
+    if kind == "price":
+        return f"{label}: ${value:,.2f}"
+    if kind == "pct":
+        return f"{label}: {value * 100:.2f}%"
+    return f"{label}: {value:,.0f}"
+
+
+# Precomputed analytics over StockDataService's stored data
+# Metrics are computed once per ticker and recomputed only when the stored prices or
+# financials change, so answering from them takes microseconds instead of an LLM round-trip.
+class AnalyticsService():
+    def __init__(self, service):
+        self.service = service
+        self._cache = {}  # ticker -> (data version, metrics)
+        self._lock = threading.Lock()
+
+    def _version(self, ticker):
+        return (self.service.price_store.version(ticker),
+                self.service.ticker_store(ticker).version("financials"))
+
+    # Returns {metric: value} for a ticker (empty if nothing is stored for it)
+    def get(self, ticker):
+        ticker = ticker.upper()
+        version = self._version(ticker)
+
+        with self._lock:
+            cached = self._cache.get(ticker)
+            if cached is not None and cached[0] == version:
+                return cached[1]
+
+        metrics = {}
+        prices = self.service.price_store.read(ticker)
+        if not prices.empty:
+            metrics.update(compute_price_metrics(prices))
+
+        financials = self.service.financials.read(ticker)
+        if not financials.empty:
+            metrics.update(compute_financial_metrics(financials))
+
+        with self._lock:
+            self._cache[ticker] = (version, metrics)
+        return metrics
+
+    # Formats every available metric for a ticker, one per line
+    def summary(self, ticker):
+        metrics = self.get(ticker)
+        if not metrics:
+            return f"No stored data for {ticker.upper()}."
+
+        lines = [f"{ticker.upper()} (prices as of {metrics.get('as_of', 'n/a')})"]
+        lines += [format_metric(key, metrics[key]) for key in METRICS if key in metrics]
+        return "\n".join(lines)
+
+    # Answers a simple single-metric question directly, or returns None to fall back to the agent
+    # known_tickers is used to spot a ticker named in the question; otherwise default_ticker is used
+    def answer(self, query, default_ticker=None, known_tickers=()):
+        if len(query.split()) > MAX_FAST_PATH_WORDS or OPEN_ENDED.search(query):
+            return None
+
+        match, key = None, None
+        for pattern, key in QUERY_PATTERNS:
+            match = re.search(pattern, query, re.IGNORECASE)
+            if match:
+                break
+        if match is None:
+            return None
+
+        # Anything else in the question - a horizon or qualifier the metric doesn't have ("5 year high",
+        # "price to book ratio"), a company name, a ticker we have no data for - is left to the agent
+        known = {t.upper() for t in known_tickers}
+        named = set()
+        rest = query[:match.start()] + " " + query[match.end():]
+        for token in re.findall(r"\$?[A-Za-z0-9]+(?:['’][A-Za-z]+)?", rest):
+            word = re.sub(r"['’]s$", "", token.lstrip("$"))
+            looks_like_ticker = token.startswith("$") or (word.isupper() and len(word) > 1)
+            if token.lower().replace("’", "'") in FILLER_WORDS and not looks_like_ticker:
+                continue
+            if word.upper() not in known:
+                return None
+            named.add(word.upper())
+
+        if len(named) > 1:
+            return None
+        ticker = named.pop() if named else default_ticker
+        if not ticker:
+            return None
+
+        metrics = self.get(ticker)
+        if key not in metrics or pd.isna(metrics[key]):
+            return None
+
+        if METRICS[key][2] == "prices":
+            as_of = f" (as of {metrics['as_of']})"
+        else:
+            as_of = " (latest reported fiscal year)"
+        return f"{ticker.upper()} {format_metric(key, metrics[key])}{as_of}"
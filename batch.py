@@ -0,0 +1,189 @@
+import os
+import json
+import time
+import asyncio
+import logging
+import argparse
+
+from rag import StockAnalyzerAgent
+from universe import load_universe
+
+# Progress is logged after this many finished tickers
+REPORT_EVERY = 10
+
+
+# Spaces out calls so that at most per_minute start in any minute (no limit if per_minute is falsy)
+class RateLimiter():
+    def __init__(self, per_minute=None):
+        self.interval = 60 / per_minute if per_minute else 0
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self):
+        if not self.interval:
+            return
+        async with self._lock:
+            now = time.monotonic()
+            delay = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+# Reads the tickers already answered for a prompt from a results file
+# Failed tickers are not counted as done, so a resumed run tries them again
+def load_checkpoint(path, prompt):
+    done = {}
+    if not os.path.exists(path):
+        return done
+
+    with open(path) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # A line cut short by an interrupted run
+            if record.get("prompt") == prompt and not record.get("error"):
+                done[record["ticker"]] = record
+    return done
+
+
+# Runs one prompt for every ticker in a list
+# Data for all tickers is prefetched first: prices in batched downloads, financials and metrics
+# with prefetch_workers threads. Analyses then run on `workers` agents forked from one warm
+# agent, so they share the data service and caches. Each result is appended to output_path as
+# one JSON line as soon as it finishes, and a rerun skips tickers that already have an answer.
+class BatchRunner():
+    # per_minute caps how many analyses start per minute, to stay under the LLM provider's rate limits
+    def __init__(self, agent, output_path, workers=4, per_minute=None, prefetch_workers=8):
+        self.agent = agent
+        self.service = agent.service
+        self.output_path = output_path
+        self.workers = workers
+        self.prefetch_workers = prefetch_workers
+        self.limiter = RateLimiter(per_minute)
+
+        self._write_lock = asyncio.Lock()
+
+    # Fetches prices, financials and metrics for tickers that don't have them stored yet
+    async def prefetch(self, tickers):
+        start = time.monotonic()
+        failed = await asyncio.to_thread(self.service.sync_prices, self.agent.years, tickers)
+        if failed:
+            logging.warning(f"No prices downloaded for {len(failed)} tickers: {', '.join(failed[:20])}")
+
+        semaphore = asyncio.Semaphore(self.prefetch_workers)
+
+        async def fetch(ticker):
+            async with semaphore:
+                try:
+                    await asyncio.to_thread(self._prefetch_ticker, ticker)
+                except Exception as e:
+                    logging.warning(f"Error prefetching {ticker}: {str(e)}")
+
+        await asyncio.gather(*(fetch(ticker) for ticker in tickers))
+        logging.info(f"Prefetched {len(tickers)} tickers in {time.monotonic() - start:.1f}s")
+
+    def _prefetch_ticker(self, ticker):
+        store = self.service.ticker_store(ticker)
+        if not store.exists("financials"):
+            self.service.get_financials(ticker)
+        if not store.exists("metrics"):
+            self.service.get_metrics(self.service.get_info(ticker))
+
+    async def _analyze(self, agent, prompt, ticker):
+        await self.limiter.wait()
+        agent.set_ticker(ticker)
+
+        start = time.monotonic()
+        record = {"ticker": ticker, "prompt": prompt}
+        try:
+            async for event in agent.analyze_stream(prompt):
+                if event["type"] == "answer":
+                    record["answer"] = event["text"]
+        except Exception as e:
+            logging.error(f"Error analyzing {ticker}: {str(e)}")
+            record["error"] = str(e)
+        record["seconds"] = round(time.monotonic() - start, 3)
+        return record
+
+    async def _write(self, record):
+        async with self._write_lock:
+            with open(self.output_path, "a") as f:
+                f.write(json.dumps(record) + "\n")
+
+    # Runs the prompt for every ticker without a saved answer and returns a summary of the run
+    async def run(self, prompt, tickers, prefetch=True):
+        tickers = [ticker.upper() for ticker in tickers]
+        done = load_checkpoint(self.output_path, prompt)
+        todo = [ticker for ticker in tickers if ticker not in done]
+        if done:
+            logging.info(f"Resuming: {len(tickers) - len(todo)} of {len(tickers)} tickers already done")
+
+        if prefetch and todo:
+            await self.prefetch(todo)
+
+        if self.agent.workflow is None:
+            self.agent.initialize()
+
+        queue = asyncio.Queue()
+        for ticker in todo:
+            queue.put_nowait(ticker)
+
+        start = time.monotonic()
+        counts = {"completed": 0, "failed": 0}
+
+        async def worker(agent):
+            while not queue.empty():
+                ticker = queue.get_nowait()
+                record = await self._analyze(agent, prompt, ticker)
+                await self._write(record)
+
+                counts["failed" if "error" in record else "completed"] += 1
+                finished = counts["completed"] + counts["failed"]
+                if finished % REPORT_EVERY == 0 or finished == len(todo):
+                    rate = finished / (time.monotonic() - start) * 60
+                    logging.info(f"{finished}/{len(todo)} tickers, {rate:.1f} tickers/min")
+
+        agents = [self.agent] + [self.agent.fork() for _ in range(min(self.workers, max(len(todo), 1)) - 1)]
+        await asyncio.gather(*(worker(agent) for agent in agents))
+
+        elapsed = time.monotonic() - start
+        return {
+            "tickers": len(tickers),
+            "skipped": len(tickers) - len(todo),
+            "completed": counts["completed"],
+            "failed": counts["failed"],
+            "seconds": round(elapsed, 1),
+            "tickers_per_minute": round(len(todo) / elapsed * 60, 2) if todo and elapsed else 0.0,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run one analysis prompt across a list of tickers")
+    parser.add_argument("prompt")
+    parser.add_argument("--tickers", default=None, help="Ticker file (.csv or text) or comma-separated symbols")
+    parser.add_argument("--output", default="data/batch_results.jsonl")
+    parser.add_argument("--model", default="claude-sonnet-4-5-20250929")
+    parser.add_argument("--data-dir", default="data/")
+    parser.add_argument("--years", type=int, default=5)
+    parser.add_argument("--workers", type=int, default=4, help="Analyses running at once")
+    parser.add_argument("--per-minute", type=float, default=None, help="Maximum analyses started per minute")
+    parser.add_argument("--no-prefetch", action="store_true")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+
+    source = args.tickers
+    if source and not os.path.exists(source):
+        source = source.split(",")
+    tickers = load_universe(source)
+
+    agent = StockAnalyzerAgent(args.model, data_dir=args.data_dir, years=args.years)
+    runner = BatchRunner(agent, args.output, workers=args.workers, per_minute=args.per_minute)
+    summary = asyncio.run(runner.run(args.prompt, tickers, prefetch=not args.no_prefetch))
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+# Measures price chart generation before and after charts.py, for histories of several lengths and
+# for one ticker and an overlay of --overlay tickers:
+#   - before:  every close in a plotly Scatter, written as the self-contained HTML fig.show() opens
+#              (the figure plus the whole plotly.js bundle)
+#   - after:   ChartRenderer - each line downsampled (LTTB by default) and written as HTML that loads
+#              plotly.js from its CDN; "cached" is asking for the same chart again
+# Points are the points drawn across all lines; MB is the size of the file written.
+#
+# Usage: python benchmarks/bench_charts.py --years 1 5 10 30 --overlay 10
+#        python benchmarks/bench_charts.py --method minmax --max-points 1000
+import os
+import sys
+import time
+import argparse
+import tempfile
+import warnings
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+warnings.filterwarnings("ignore")
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go  # Imported up front so the import isn't timed with the first chart
+
+from charts import ChartRenderer
+from pricestore import PriceStore
+
+
+def make_prices(years, seed):
+    rng = np.random.default_rng(seed)
+    index = pd.bdate_range(end="2025-12-31", periods=252 * years, name="Date")
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, len(index))))
+    return pd.DataFrame({"Close": close, "Volume": rng.integers(1e6, 1e8, len(index)).astype(float)}, index=index)
+
+
+# The chart create_price_chart used to show: all closes, full plotly.js embedded
+def render_before(store, tickers, start, path):
+    fig = go.Figure()
+    points = 0
+    for ticker in tickers:
+        close = store.read(ticker)["Close"].loc[start:]
+        fig.add_trace(go.Scatter(x=close.index, y=close.values, mode="lines", name=ticker))
+        points += len(close)
+    fig.update_layout(title=", ".join(tickers), width=1000, height=600)
+    fig.write_html(path, include_plotlyjs=True)
+    return points
+
+
+def timed(fn):
+    t0 = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - t0
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--years", type=int, nargs="+", default=[1, 5, 10, 30])
+    parser.add_argument("--overlay", type=int, default=10, help="Tickers in the overlay chart")
+    parser.add_argument("--method", default="lttb")
+    parser.add_argument("--max-points", type=int, default=600)
+    args = parser.parse_args()
+
+    tickers = [f"SYN{i:03d}" for i in range(args.overlay)]
+    longest = max(args.years)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = PriceStore(os.path.join(tmp, "prices"))
+        for i, ticker in enumerate(tickers):
+            bars = make_prices(longest, i)
+            store.merge(ticker, bars, bars.index[0].date(), bars.index[-1].date())
+        renderer = ChartRenderer(store, tmp, max_points=args.max_points, method=args.method)
+
+        print(f"Price charts, {args.method} downsampling to {args.max_points} points per line")
+        print(f"  {'chart':<22} {'---------- before -----------':>29} {'----------- after ------------':>30} "
+              f"{'cached':>9}")
+        print(f"  {'':<22} {'points':>8} {'MB':>7} {'seconds':>12} {'points':>8} {'MB':>7} {'seconds':>13}")
+        for years in args.years:
+            end = store.read(tickers[0]).index[-1]
+            start = end - pd.DateOffset(years=years)
+            for chart in (tickers[:1], tickers):
+                label = f"{years}y, {len(chart)} ticker{'s' if len(chart) > 1 else ''}"
+                before_path = os.path.join(tmp, f"before_{years}_{len(chart)}.html")
+                points, before = timed(lambda: render_before(store, chart, start, before_path))
+
+                renders = renderer.stats()["points_out"]
+                path, after = timed(lambda: renderer.render(chart, start))
+                after_points = renderer.stats()["points_out"] - renders
+                _, cached = timed(lambda: renderer.render(chart, start))
+
+                print(f"  {label:<22} {points:8d} {os.path.getsize(before_path) / 1e6:7.2f} {before:11.3f}s "
+                      f"{after_points:8d} {os.path.getsize(path) / 1e6:7.3f} {after:12.3f}s "
+                      f"{cached * 1e6:7.0f}us")
+
+        print(f"\n  {renderer.stats()}")
+
+
+if __name__ == "__main__":
+    main()
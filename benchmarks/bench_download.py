@@ -0,0 +1,73 @@
+# Compares price download throughput (tickers/second):
+#   - baseline: one yf.download call over the whole universe (the original get_historical_prices)
+#   - batched:  BatchDownloader chunks fetched in parallel and streamed into a fresh PriceStore
+#
+# Usage: python benchmarks/bench_download.py --universe sp500.txt --years 5 --chunk-size 100 --workers 4
+import os
+import sys
+import time
+import argparse
+import datetime as dt
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import yfinance as yf
+
+from universe import load_universe
+from downloader import BatchDownloader
+from stockdata import StockDataService
+
+
+def bench_baseline(tickers, years):
+    end = dt.datetime.now()
+    start = end - dt.timedelta(days=years * 365)
+
+    t0 = time.perf_counter()
+    df = yf.download(tickers, start, end, progress=False)
+    elapsed = time.perf_counter() - t0
+
+    returned = df["Close"].dropna(axis=1, how="all").shape[1] if not df.empty else 0
+    return elapsed, returned
+
+
+def bench_batched(tickers, years, chunk_size, workers):
+    with tempfile.TemporaryDirectory() as tmp:
+        service = StockDataService(tmp, universe=tickers,
+                                   downloader=BatchDownloader(chunk_size=chunk_size, max_workers=workers))
+
+        t0 = time.perf_counter()
+        failed = service.sync_prices(years)
+        elapsed = time.perf_counter() - t0
+
+        # Second run is served from the store
+        t0 = time.perf_counter()
+        service.sync_prices(years)
+        warm = time.perf_counter() - t0
+
+    return elapsed, len(tickers) - len(failed), warm
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--universe", default=None, help="Ticker file (defaults to the 10-stock list)")
+    parser.add_argument("--years", type=int, default=5)
+    parser.add_argument("--chunk-size", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--skip-baseline", action="store_true")
+    args = parser.parse_args()
+
+    tickers = load_universe(args.universe)
+    print(f"Universe: {len(tickers)} tickers, {args.years} years")
+
+    if not args.skip_baseline:
+        elapsed, returned = bench_baseline(tickers, args.years)
+        print(f"baseline  {elapsed:8.2f}s  {len(tickers) / elapsed:8.1f} tickers/s  ({returned} returned data)")
+
+    elapsed, returned, warm = bench_batched(tickers, args.years, args.chunk_size, args.workers)
+    print(f"batched   {elapsed:8.2f}s  {len(tickers) / elapsed:8.1f} tickers/s  ({returned} stored)")
+    print(f"warm      {warm:8.2f}s  (re-run against the populated store)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+# Compares the compact financials table (financialstore.py) with the previous melt-based one on
+# synthetic statements (200 tickers x 60 line items per statement x 40 quarters by default):
+#   - build:  turning each ticker's three statements into the long table
+#   - memory: deep memory use of all tickers' tables
+#   - slice:  one line item across every ticker, and one ticker's history of one line item
+#
+# Usage: python benchmarks/bench_financials.py --tickers 200 --periods 40
+import os
+import sys
+import time
+import argparse
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from financialstore import build_financials, concat_financials, INDEX_LEVELS
+
+
+def make_statements(n_items, n_periods, seed=0):
+    rng = np.random.default_rng(seed)
+    periods = pd.date_range("2000-03-31", periods=n_periods, freq="QE")[::-1]  # Most recent first, like yfinance
+    return {
+        name: pd.DataFrame(rng.normal(1e9, 1e8, (n_items, n_periods)),
+                           index=[f"Line Item {i}" for i in range(n_items)], columns=periods)
+        for name in ("income_stmt", "cashflow", "balance_sheet")
+    }
+
+
+# Reference implementation: the previous get_financials (transpose, melt, per-row prefix split)
+def melt_financials(ticker, statements):
+    income_stmt, cashflow, balance_sheet = (statements[name].copy() for name in ("income_stmt", "cashflow",
+                                                                                 "balance_sheet"))
+    income_stmt.index = [f"IS_{idx}" for idx in income_stmt.index]
+    balance_sheet.index = [f"BS_{idx}" for idx in balance_sheet.index]
+    cashflow.index = [f"CF_{idx}" for idx in cashflow.index]
+
+    financials = pd.concat([income_stmt, cashflow, balance_sheet]).T
+    financials.index.name = "Date"
+    financials = financials.reset_index()
+    financials["Ticker"] = ticker
+    financials = financials.melt(id_vars=["Date", "Ticker"], var_name="Financial", value_name="Value")
+    financials["Statement_Type"] = financials["Financial"].apply(lambda x: x.split("_")[0])
+    return financials
+
+
+def timed(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - t0)
+    return result, min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tickers", type=int, default=200)
+    parser.add_argument("--items", type=int, default=60, help="Line items per statement")
+    parser.add_argument("--periods", type=int, default=40)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    statements = make_statements(args.items, args.periods)
+    tickers = [f"T{i:04d}" for i in range(args.tickers)]
+    item, ticker = "IS_Line Item 0", tickers[len(tickers) // 2]
+
+    melted, melt_build = timed(lambda: [melt_financials(t, statements) for t in tickers], 1)
+    compact, compact_build = timed(lambda: [build_financials(t, statements) for t in tickers], 1)
+
+    melted = pd.concat(melted, ignore_index=True)
+    indexed = concat_financials(compact).set_index(INDEX_LEVELS).sort_index()
+
+    _, melt_cross = timed(lambda: melted[melted["Financial"] == item], args.repeat)
+    _, compact_cross = timed(lambda: indexed.xs(item, level="Financial"), args.repeat)
+    _, melt_series = timed(lambda: melted[(melted["Ticker"] == ticker) & (melted["Financial"] == item)], args.repeat)
+    _, compact_series = timed(lambda: indexed.loc[(ticker, item)], args.repeat)
+
+    rows = len(melted)
+    print(f"{args.tickers} tickers x {3 * args.items} line items x {args.periods} periods = {rows:,} rows")
+    print(f"  {'':<22} {'melt':>10} {'compact':>10}")
+    print(f"  {'build':<22} {melt_build:9.2f}s {compact_build:9.2f}s")
+    print(f"  {'memory':<22} {melted.memory_usage(deep=True).sum() / 1e6:8.1f}MB "
+          f"{indexed.memory_usage(deep=True).sum() / 1e6:8.1f}MB")
+    print(f"  {'item across tickers':<22} {melt_cross * 1000:8.2f}ms {compact_cross * 1000:8.2f}ms")
+    print(f"  {'one ticker, one item':<22} {melt_series * 1000:8.2f}ms {compact_series * 1000:8.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+# Times the vectorized IndicatorEngine on a synthetic price panel (500 tickers x 10 years by default):
+#   - full:        all indicators for every ticker from scratch
+#   - incremental: appending one new bar to an up-to-date engine
+#   - per-ticker:  the same indicators computed with pandas one ticker at a time (for comparison)
+#
+# Usage: python benchmarks/bench_indicators.py --tickers 500 --years 10
+import os
+import sys
+import time
+import argparse
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from indicators import IndicatorEngine
+
+
+def make_panel(n_tickers, n_days, seed=0):
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range("2000-01-03", periods=n_days, name="Date")
+    tickers = [f"T{i:04d}" for i in range(n_tickers)]
+
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, (n_days, n_tickers)), axis=0))
+    spread = np.abs(rng.normal(0, 0.01, (n_days, n_tickers)))
+    frames = {
+        "Close": close,
+        "High": close * (1 + spread),
+        "Low": close * (1 - spread),
+        "Open": close,
+        "Volume": rng.integers(1_000, 1_000_000, (n_days, n_tickers)).astype(float),
+    }
+    return pd.concat({name: pd.DataFrame(values, index=dates, columns=tickers) for name, values in frames.items()},
+                     axis=1)
+
+
+# Reference implementation: the same indicators with pandas, looping over tickers
+def per_ticker(panel):
+    market = panel["Close"].pct_change().mean(axis=1)
+    for ticker in panel["Close"].columns:
+        close, high, low = panel["Close"][ticker], panel["High"][ticker], panel["Low"][ticker]
+        for window in (20, 50, 200):
+            close.rolling(window).mean()
+        close.rolling(20).std()
+        fast, slow = close.ewm(span=12, adjust=False).mean(), close.ewm(span=26, adjust=False).mean()
+        (fast - slow).ewm(span=9, adjust=False).mean()
+        change = close.diff()
+        change.clip(lower=0).ewm(alpha=1 / 14, adjust=False).mean()
+        (-change).clip(lower=0).ewm(alpha=1 / 14, adjust=False).mean()
+        prev = close.shift()
+        pd.concat([high - low, (high - prev).abs(), (low - prev).abs()], axis=1).max(axis=1).ewm(alpha=1 / 14).mean()
+        close / close.cummax() - 1
+        returns = close.pct_change()
+        returns.rolling(60).cov(market) / market.rolling(60).var()
+        returns.rolling(60).corr(market)
+
+
+def timed(fn):
+    t0 = time.perf_counter()
+    fn()
+    return time.perf_counter() - t0
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tickers", type=int, default=500)
+    parser.add_argument("--years", type=int, default=10)
+    parser.add_argument("--skip-per-ticker", action="store_true")
+    args = parser.parse_args()
+
+    n_days = args.years * 252
+    panel = make_panel(args.tickers, n_days + 1)
+    history, latest = panel.iloc[:-1], panel
+    print(f"Panel: {args.tickers} tickers x {n_days} days")
+
+    engine = IndicatorEngine()
+    print(f"full         {timed(lambda: engine.update(history)):8.3f}s")
+    print(f"incremental  {timed(lambda: engine.update(latest)) * 1000:8.1f}ms  (1 new bar)")
+
+    if not args.skip_per_ticker:
+        print(f"per-ticker   {timed(lambda: per_ticker(panel)):8.3f}s  (pandas loop, for comparison)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+# Measures a burst of concurrent LLM requests against stubs.FakeProvider (a local server with the
+# provider's API, latency and requests-per-minute limit), before and after llmgateway.py:
+#   - direct:   the LlamaIndex provider LLM as initialize used to create it - every request is sent at
+#               once and 429s are left to the SDK's own retries
+#   - gateway:  the same LLM through an LLMGateway sized to the provider's limit - identical prompts
+#               share a call, the rest queue for a slot and for the rate budget
+# --requests are sent together, cycling through --distinct prompts (several agents asking the same
+# questions). Reported: calls the provider received and rejected with 429, failures, wall time and
+# per-request latency.
+#
+# Usage: python benchmarks/bench_llm_gateway.py --requests 120 --distinct 60 --provider-rpm 60
+#        python benchmarks/bench_llm_gateway.py --provider anthropic --failure-rate 0.1
+import os
+import sys
+import time
+import asyncio
+import argparse
+import warnings
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+warnings.filterwarnings("ignore")
+
+import numpy as np
+
+from llama_index.core.llms import ChatMessage
+
+from llmgateway import LLMGateway
+from stubs import FakeProvider
+
+MODELS = {"anthropic": "claude-sonnet-4-5-20250929", "openai": "gpt-4o"}
+
+
+def direct_llm(provider, base_url):
+    if provider == "anthropic":
+        from llama_index.llms.anthropic import Anthropic
+        return Anthropic(model=MODELS[provider], base_url=base_url, api_key="fake")
+    from llama_index.llms.openai import OpenAI
+    return OpenAI(model=MODELS[provider], api_base=f"{base_url}/v1", api_key="fake")
+
+
+async def burst(llm, requests, distinct):
+    async def one(i):
+        start = time.monotonic()
+        try:
+            await llm.achat([ChatMessage(role="user", content=f"Summarize the outlook for ticker {i % distinct}")])
+            return time.monotonic() - start, None
+        except Exception as e:
+            return time.monotonic() - start, e
+
+    start = time.monotonic()
+    results = await asyncio.gather(*[one(i) for i in range(requests)])
+    return time.monotonic() - start, results
+
+
+def report(label, provider, wall, results):
+    latency = [seconds for seconds, error in results if error is None]
+    errors = [error for _, error in results if error is not None]
+    p50, p95 = np.percentile(latency, [50, 95]) if latency else (float("nan"), float("nan"))
+    print(f"  {label:<10} {provider.requests:8d} {provider.rate_limited:6d} {provider.failed:6d} {len(errors):7d} "
+          f"{wall:9.2f}s {p50:8.2f}s {p95:8.2f}s")
+    if errors:
+        print(f"             first error: {type(errors[0]).__name__}: {str(errors[0])[:100]}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--provider", choices=list(MODELS), default="openai")
+    parser.add_argument("--requests", type=int, default=120)
+    parser.add_argument("--distinct", type=int, default=60, help="Distinct prompts among the requests")
+    parser.add_argument("--latency", type=float, default=0.3, help="Seconds the fake provider takes per response")
+    parser.add_argument("--provider-rpm", type=int, default=60, help="Requests per minute the fake provider allows")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Share of requests answered 529")
+    parser.add_argument("--concurrency", type=int, default=8, help="Gateway requests in flight at once")
+    args = parser.parse_args()
+
+    print(f"{args.requests} concurrent requests, {args.distinct} distinct, to a fake {args.provider} endpoint "
+          f"({args.latency}s per response, {args.provider_rpm} requests/minute)")
+    print(f"  {'':<10} {'received':>8} {'429s':>6} {'5xx':>6} {'failed':>7} {'wall':>10} {'p50':>9} {'p95':>9}")
+
+    with FakeProvider(latency=args.latency, requests_per_minute=args.provider_rpm,
+                      failure_rate=args.failure_rate) as provider:
+        wall, results = asyncio.run(burst(direct_llm(args.provider, provider.url), args.requests, args.distinct))
+        report("direct", provider, wall, results)
+
+    with FakeProvider(latency=args.latency, requests_per_minute=args.provider_rpm,
+                      failure_rate=args.failure_rate) as provider:
+        gateway = LLMGateway(args.provider, max_concurrency=args.concurrency, requests_per_minute=args.provider_rpm)
+        base_url = provider.url if args.provider == "anthropic" else f"{provider.url}/v1"
+        llm = gateway.llm(MODELS[args.provider], base_url=base_url, api_key="fake")
+        wall, results = asyncio.run(burst(llm, args.requests, args.distinct))
+        report("gateway", provider, wall, results)
+
+    print(f"\n  {gateway.stats()}")
+
+
+if __name__ == "__main__":
+    main()
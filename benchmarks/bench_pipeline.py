@@ -0,0 +1,201 @@
+# Times each stage of the main.py pipeline offline and checks it against a stored baseline:
+#   get_historical_prices, get_single_stock_prices, get_financials, get_news,
+#   _build_query_engine, _build_news_index, initialize, analyze
+#
+# Yahoo Finance is replaced by fixtures (recorded with --record, or generated synthetically),
+# and the LLM and embedding model by the deterministic stubs in stubs.py, so runs are repeatable
+# and need no network or API keys. Every stage runs in a fresh data directory (cold caches).
+# One untimed run comes first, so modules that load on first use (see bench_startup.py) aren't counted,
+# and the sandbox's worker processes (see sandbox.py) are started before it.
+# Time is the median over --repeat runs; memory is the peak Python allocation of each stage
+# (tracemalloc, measured in one extra run) and the process's peak RSS after it.
+#
+# --update-baseline saves the results as the baseline (timings are machine-specific, so it isn't
+# committed); other runs compare against it and exit with status 1 if a stage got slower or allocates
+# more than --tolerance allows, or with status 2 if there is no baseline to compare against.
+#
+# --trace also prints where the time went inside the stages (spans from tracing.py, e.g.
+# storage.load, embedding, llm.completion, pandas.eval), totalled over one extra run.
+#
+# Usage: python benchmarks/bench_pipeline.py --repeat 5
+#        python benchmarks/bench_pipeline.py --fixtures fixtures/ --record AAPL,MSFT,NVDA   (needs network)
+#        python benchmarks/bench_pipeline.py --update-baseline
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import resource
+import tempfile
+import tracemalloc
+import statistics
+import warnings
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+warnings.filterwarnings("ignore")
+
+from llama_index.core import Settings
+
+import tracing
+
+from fixtures import record_fixtures, synthetic_fixtures, use_fixtures
+from stubs import StubLLM, StubEmbedding
+from universe import DEFAULT_UNIVERSE
+from stockdata import StockDataService
+from rag import StockAnalyzerAgent
+from sandbox import default_executor
+
+STAGES = ["get_historical_prices", "get_single_stock_prices", "get_financials", "get_news",
+          "_build_query_engine", "_build_news_index", "initialize", "analyze"]
+
+QUERY = "Analyze the valuation and recent momentum"
+
+# Differences smaller than these are noise, whatever the percentage
+MIN_SECONDS_DELTA = 0.005
+MIN_MB_DELTA = 1.0
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024  # bytes on macOS, KB on Linux
+
+
+# Runs the pipeline once; returns {stage: seconds} or, with trace_memory, {stage: peak MB allocated}
+def run_pipeline(tickers, ticker, years, args, trace_memory=False):
+    results = {}
+
+    def stage(name, fn):
+        if trace_memory:
+            tracemalloc.start()
+            value = fn()
+            results[name] = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+            tracemalloc.stop()
+        else:
+            t0 = time.perf_counter()
+            value = fn()
+            results[name] = time.perf_counter() - t0
+        return value
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        service = StockDataService(data_dir, universe=tickers)
+        agent = StockAnalyzerAgent("stub", data_dir=data_dir, ticker=ticker, years=years,
+                                   llm=Settings.llm, embed_model=Settings.embed_model,
+                                   parallel_tools=args.parallel_tools)
+
+        all_stocks = stage("get_historical_prices", lambda: service.get_historical_prices(years))
+        prices = stage("get_single_stock_prices", lambda: service.get_single_stock_prices(all_stocks, ticker))
+        stage("get_financials", lambda: service.get_financials(ticker))
+        stage("get_news", lambda: service.get_news(ticker))
+        service.get_metrics(service.get_info(ticker))  # Not timed, but analyze's metrics tool needs it
+
+        stage("_build_query_engine", lambda: agent._build_query_engine(prices))
+        stage("_build_news_index", lambda: agent._build_news_index(ticker))
+        stage("initialize", agent.initialize)
+        stage("analyze", lambda: asyncio.run(agent.analyze(QUERY)))
+
+    return results
+
+
+# Returns a list of human-readable regressions of current against baseline
+def find_regressions(current, baseline, tolerance):
+    regressions = []
+    for name in STAGES:
+        now, before = current["stages"].get(name), baseline["stages"].get(name)
+        if not now or not before:
+            continue
+
+        if now["seconds"] > before["seconds"] * (1 + tolerance) and now["seconds"] - before["seconds"] > MIN_SECONDS_DELTA:
+            regressions.append(f"{name}: {before['seconds'] * 1000:.1f}ms -> {now['seconds'] * 1000:.1f}ms")
+
+        if now["alloc_mb"] > before["alloc_mb"] * (1 + tolerance) and now["alloc_mb"] - before["alloc_mb"] > MIN_MB_DELTA:
+            regressions.append(f"{name}: {before['alloc_mb']:.1f}MB -> {now['alloc_mb']:.1f}MB allocated")
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--fixtures", default=None, help="Fixture directory (synthetic fixtures if omitted)")
+    parser.add_argument("--record", default=None, help="Comma-separated tickers to record into --fixtures first")
+    parser.add_argument("--tickers", type=int, default=len(DEFAULT_UNIVERSE), help="Synthetic universe size")
+    parser.add_argument("--years", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="Seconds the stub LLM waits per call")
+    parser.add_argument("--parallel-tools", action="store_true")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown/growth before flagging")
+    parser.add_argument("--trace", action="store_true", help="Print span totals from one traced run")
+    args = parser.parse_args()
+    if not args.update_baseline and not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline} to check against; record one on this machine with --update-baseline")
+        sys.exit(2)
+
+    Settings.llm = StubLLM(latency=args.llm_latency)
+    Settings.embed_model = StubEmbedding()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        fixture_dir = args.fixtures or os.path.join(tmp, "fixtures")
+        if args.record:
+            record_fixtures(fixture_dir, [t.strip().upper() for t in args.record.split(",")], years=args.years)
+
+        if args.fixtures:
+            tickers = sorted(name[:-len(".pkl")] for name in os.listdir(os.path.join(fixture_dir, "prices")))
+        else:
+            tickers = (DEFAULT_UNIVERSE + [f"SYN{i:03d}" for i in range(args.tickers)])[:args.tickers]
+            synthetic_fixtures(fixture_dir, tickers, years=args.years)
+        ticker = tickers[0]
+
+        with use_fixtures(fixture_dir):
+            default_executor().warm()
+            run_pipeline(tickers, ticker, args.years, args)
+            runs = [run_pipeline(tickers, ticker, args.years, args) for _ in range(args.repeat)]
+            allocs = run_pipeline(tickers, ticker, args.years, args, trace_memory=True)
+
+            if args.trace:
+                sink = tracing.add_sink(tracing.MemorySink())
+                run_pipeline(tickers, ticker, args.years, args)
+                tracing.remove_sink(sink)
+                print("Spans (one run):")
+                for name, total in sorted(sink.summary().items(), key=lambda item: -item[1]["ms"]):
+                    print(f"  {name:<36} {total['count']:5d} calls {total['ms']:10.1f}ms")
+
+    current = {
+        "config": {"tickers": len(tickers), "years": args.years, "llm_latency": args.llm_latency,
+                   "parallel_tools": args.parallel_tools},
+        "stages": {name: {"seconds": statistics.median(run[name] for run in runs), "alloc_mb": allocs[name]}
+                   for name in STAGES},
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+    print(f"Pipeline: {len(tickers)} tickers x {args.years} years, median of {args.repeat}")
+    for name in STAGES:
+        result = current["stages"][name]
+        print(f"  {name:<24} {result['seconds'] * 1000:9.1f}ms  {result['alloc_mb']:8.1f}MB allocated")
+    print(f"  peak RSS {current['peak_rss_mb']:.0f}MB")
+
+    if args.update_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(current, f, indent=2)
+        print(f"Saved baseline to {args.baseline}")
+        return
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline.get("config") != current["config"]:
+        print(f"Warning: baseline was recorded with {baseline.get('config')}")
+
+    regressions = find_regressions(current, baseline, args.tolerance)
+    if regressions:
+        print(f"Regressions against {args.baseline} (tolerance {args.tolerance:.0%}):")
+        for regression in regressions:
+            print(f"  {regression}")
+        sys.exit(1)
+    print(f"No regressions against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+# Measures the prompt PandasQueryEngine sends for each tool call, before and after framesummary.py:
+#   - head:    the table context as print(df.head()) (PandasQueryEngine's default)
+#   - summary: FrameSummary's compact description, with columns picked for the query
+# Frames are built from synthetic fixtures (or a recorded fixture directory) the way the agent's
+# tools build them: prices, technical indicators, financials and metrics. Tokens are counted with
+# tiktoken's cl100k_base encoding when it is installed, otherwise estimated as characters / 4.
+#
+# Usage: python benchmarks/bench_prompt.py
+#        python benchmarks/bench_prompt.py --fixtures fixtures/ --ticker NVDA --show
+import os
+import sys
+import time
+import argparse
+import tempfile
+import statistics
+import warnings
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+warnings.filterwarnings("ignore")
+
+import pandas as pd
+
+from fixtures import synthetic_fixtures, use_fixtures
+from framesummary import FrameSummary
+from indicators import IndicatorEngine
+from prompts import NEW_PROMPT, INSTRUCTION_PROMPT
+from stockdata import StockDataService
+
+# Questions of the kind the agent asks each tool (see TOOL_DESCRIPTIONS)
+QUERIES = {
+    "prices": ["What's the 50-day moving average vs current price?", "Calculate annualized volatility",
+               "Show the highest and lowest prices in the last year", "When did the biggest price drop occur?"],
+    "indicators": ["What is the latest RSI?", "Is the MACD above its signal line?",
+                   "Compare the price to its 200-day moving average", "What is the stock's beta?"],
+    "financials": ["What's the revenue growth rate over the last 4 periods?", "Calculate the debt-to-equity trend",
+                   "Show operating margin expansion/contraction", "Is free cash flow growing faster than net income?"],
+    "metrics": ["What is the P/E ratio?", "What's the PEG ratio and forward P/E?",
+                "How much debt does the company have?", "What are the profit margins and return on equity?"],
+}
+
+
+def token_counter():
+    try:
+        import tiktoken
+        encoding = tiktoken.get_encoding("cl100k_base")
+        return lambda text: len(encoding.encode(text)), "cl100k_base tokens"
+    except Exception:
+        return lambda text: len(text) // 4, "estimated tokens (chars / 4)"
+
+
+# PandasQueryEngine's own table context: print(df.head()) with every column shown
+def head_context(df):
+    with pd.option_context("display.max_colwidth", None, "display.max_columns", None,
+                           "display.max_rows", 5, "display.width", None):
+        return str(df.head(5))
+
+
+# "before  after  change" columns for two lists of sizes
+def compare(before, after):
+    before, after = statistics.mean(before), statistics.mean(after)
+    return f"{before:8.0f} {after:8.0f} {after / before - 1:11.0%}"
+
+
+def load_frames(data_dir, ticker, years):
+    service = StockDataService(data_dir, universe=[ticker])
+    service.sync_prices(years)
+    prices = service.price_store.read(ticker)
+    indicators = IndicatorEngine().update(service.price_store.load_panel([ticker], prices.index[0],
+                                                                          prices.index[-1])).for_ticker(ticker)
+    financials = service.get_financials(ticker)
+    metrics = service.get_metrics(service.get_info(ticker))
+    return {"prices": prices, "indicators": indicators, "financials": financials, "metrics": metrics}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--fixtures", default=None, help="Fixture directory (synthetic fixtures if omitted)")
+    parser.add_argument("--ticker", default="NVDA")
+    parser.add_argument("--years", type=int, default=5)
+    parser.add_argument("--show", action="store_true", help="Print both contexts for the first query of each frame")
+    args = parser.parse_args()
+
+    count, unit = token_counter()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        fixture_dir = args.fixtures or os.path.join(tmp, "fixtures")
+        if not args.fixtures:
+            synthetic_fixtures(fixture_dir, [args.ticker], years=args.years)
+        with use_fixtures(fixture_dir):
+            frames = load_frames(os.path.join(tmp, "data"), args.ticker, args.years)
+
+    print(f"Size per tool call ({unit}), mean over {len(QUERIES['prices'])} queries: the table context alone, "
+          f"and the whole prompt")
+    print(f"  {'':<25} {'---------- context ----------':>29} {'---------- prompt -----------':>29}")
+    print(f"  {'frame':<12} {'shape':>12} {'head':>8} {'summary':>8} {'change':>11} {'head':>8} {'summary':>8} "
+          f"{'change':>11} {'first':>9} {'cached':>9}")
+    totals = {"context": ([], []), "prompt": ([], [])}
+    for name, df in frames.items():
+        summary = FrameSummary(df)
+        t0 = time.perf_counter()
+        summary.describe(QUERIES[name][0])
+        first = time.perf_counter() - t0
+
+        sizes = {"context": ([], []), "prompt": ([], [])}
+        for query in QUERIES[name]:
+            for i, context in enumerate((head_context(df), summary.describe(query))):
+                sizes["context"][i].append(count(context))
+                sizes["prompt"][i].append(count(NEW_PROMPT.format(df_str=context, instruction_str=INSTRUCTION_PROMPT,
+                                                                  query_str=query)))
+
+        t0 = time.perf_counter()
+        summary.describe(QUERIES[name][0])
+        cached = time.perf_counter() - t0
+
+        columns = []
+        for kind in ("context", "prompt"):
+            before, after = sizes[kind]
+            totals[kind][0].extend(before)
+            totals[kind][1].extend(after)
+            columns.append(compare(before, after))
+        shape = f"{df.shape[0]}x{df.shape[1]}"
+        print(f"  {name:<12} {shape:>12} {columns[0]} {columns[1]} {first * 1000:7.1f}ms {cached * 1e6:7.1f}us")
+
+        if args.show:
+            print(f"\n--- {name}: head ---\n{head_context(df)}\n--- {name}: summary ---\n"
+                  f"{summary.describe(QUERIES[name][0])}\n")
+
+    print(f"  {'all':<12} {'':>12} {compare(*totals['context'])} {compare(*totals['prompt'])}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+# Measures background refresh (refresh.py) on synthetic fixtures: a universe of --universe tickers
+# with prices, of which --tracked also have financials, info, metrics and news stored.
+#   - one refresh round when nothing changed upstream, and one after the latest bar of a --changed
+#     fraction of tickers was revised: seconds, files and MB written, and how many of the agent's
+#     per-ticker tool engines would be rebuilt (their data version moved). The "rewrite all" columns
+#     are what a blind refresh (re-running stockdata.py) does: every dataset is rewritten, so every
+#     engine and cached answer is invalidated.
+#   - foreground latency (quick_metrics answers from AnalyticsService) while idle and while refreshes
+#     run back to back on another thread
+#
+# Usage: python benchmarks/bench_refresh.py --universe 100 --tracked 10 --changed 0.1
+import os
+import sys
+import time
+import argparse
+import tempfile
+import threading
+import statistics
+import warnings
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+warnings.filterwarnings("ignore")
+
+import pandas as pd
+
+import tracing
+from fixtures import synthetic_fixtures, use_fixtures, _prices_path
+from stubs import StubLLM, StubEmbedding
+from rag import StockAnalyzerAgent
+from refresh import RefreshScheduler
+from stockdata import StockDataService
+
+TICKER_DATASETS = ["financials", "info", "metrics", "news"]
+
+
+# Revises the latest close of some tickers in the fixtures, as a provider correcting a bar would
+def revise_prices(fixture_dir, tickers):
+    for ticker in tickers:
+        path = _prices_path(fixture_dir, ticker)
+        bars = pd.read_pickle(path)
+        bars.iloc[-1, bars.columns.get_loc("Close")] *= 1.01
+        bars.to_pickle(path)
+
+
+def versions(agent, tickers):
+    return {(ticker, tool): agent.registry.version(ticker, tool)
+            for ticker in tickers for tool in agent.registry.builders if tool != "parse_news"}
+
+
+# Files and bytes a blind refresh rewrites: every price file and every tracked ticker's datasets
+def rewrite_all_size(service, tracked):
+    paths = [service.price_store.store.path(ticker) for ticker in service.universe]
+    paths += [service.ticker_store(ticker).path(name) for ticker in tracked for name in TICKER_DATASETS]
+    paths = [path for path in paths if os.path.exists(path)]
+    return len(paths), sum(os.path.getsize(path) for path in paths)
+
+
+def refresh_round(scheduler, agent, tracked, now):
+    before = versions(agent, tracked)
+    sink = tracing.add_sink(tracing.MemorySink())
+    t0 = time.perf_counter()
+    scheduler.run_pending(now=now)
+    seconds = time.perf_counter() - t0
+    tracing.remove_sink(sink)
+
+    saves = [span for span in sink.spans if span.name == "storage.save"]
+    written = sum(span.attributes.get("bytes_written", 0) for span in saves)
+    after = versions(agent, tracked)
+    rebuilt = sum(before[key] != after[key] for key in before)
+    return seconds, len(saves), written, rebuilt, len(before)
+
+
+# quick_metrics latencies (median, p99) over at least `calls` calls, and until done() if given
+def latencies(agent, tickers, calls, done=None):
+    times = []
+    i = 0
+    while i < calls or (done is not None and not done()):
+        i += 1
+        t0 = time.perf_counter()
+        agent.analytics.summary(tickers[i % len(tickers)])
+        times.append(time.perf_counter() - t0)
+    times.sort()
+    return statistics.median(times), times[int(len(times) * 0.99)]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--universe", type=int, default=100)
+    parser.add_argument("--tracked", type=int, default=10, help="Tickers with financials, info and news")
+    parser.add_argument("--changed", type=float, default=0.1, help="Fraction of tickers whose latest bar is revised")
+    parser.add_argument("--years", type=int, default=2)
+    parser.add_argument("--calls", type=int, default=2000, help="Foreground calls per latency measurement")
+    parser.add_argument("--rounds", type=int, default=3, help="Background refreshes to measure latency during")
+    args = parser.parse_args()
+
+    tickers = [f"SYN{i:03d}" for i in range(args.universe)]
+    tracked = tickers[:args.tracked]
+    changed = tickers[::max(int(1 / args.changed), 1)] if args.changed > 0 else []
+
+    with tempfile.TemporaryDirectory() as tmp:
+        fixture_dir, data_dir = os.path.join(tmp, "fixtures"), os.path.join(tmp, "data")
+        synthetic_fixtures(fixture_dir, tickers, years=args.years)
+
+        with use_fixtures(fixture_dir):
+            service = StockDataService(data_dir, universe=tickers)
+            service.sync_prices(args.years)
+            for ticker in tracked:
+                service.get_financials(ticker)
+                service.get_metrics(service.get_info(ticker))
+                service.get_news(ticker)
+
+            agent = StockAnalyzerAgent("stub", data_dir=data_dir, ticker=tracked[0], llm=StubLLM(),
+                                       embed_model=StubEmbedding())
+            scheduler = RefreshScheduler(service, tickers=tracked)
+            files, size = rewrite_all_size(service, tracked)
+
+            print(f"{args.universe} tickers with prices, {args.tracked} with financials, info, metrics and news")
+            print(f"  {'round':<34} {'seconds':>8} {'files':>7} {'MB':>7} {'engines':>9}    "
+                  f"{'rewrite all: files':>18} {'MB':>6} {'engines':>8}")
+            now = time.time() + 7 * 86400  # Every job is due
+            for label in ("nothing changed", f"{len(changed)} tickers' latest bar revised"):
+                if label != "nothing changed":
+                    revise_prices(fixture_dir, changed)
+                    now += 7 * 86400
+                seconds, saves, written, rebuilt, engines = refresh_round(scheduler, agent, tracked, now)
+                print(f"  {label:<34} {seconds:8.2f} {saves:7d} {written / 1e6:7.2f} {rebuilt:4d}/{engines:<4d}    "
+                      f"{files:18d} {size / 1e6:6.2f} {engines:4d}/{engines:<4d}")
+
+            idle = latencies(agent, tracked, args.calls)
+
+            stop = threading.Event()
+            rounds = [0]
+
+            def refresh_forever():
+                while not stop.is_set():
+                    service.refresh_prices(scheduler.price_days, tickers=tickers)
+                    for ticker in tracked:
+                        service.refresh_ticker(ticker)
+                    rounds[0] += 1
+
+            thread = threading.Thread(target=refresh_forever)
+            thread.start()
+            busy = latencies(agent, tracked, args.calls, done=lambda: rounds[0] >= args.rounds)
+            stop.set()
+            thread.join()
+
+    print(f"\nForeground quick_metrics latency (at least {args.calls} calls)")
+    print(f"  idle:                    median {idle[0] * 1e6:8.1f}us   p99 {idle[1] * 1e6:8.1f}us")
+    print(f"  refreshing continuously: median {busy[0] * 1e6:8.1f}us   p99 {busy[1] * 1e6:8.1f}us   "
+          f"({rounds[0]} full refreshes ran meanwhile)")
+
+
+if __name__ == "__main__":
+    main()
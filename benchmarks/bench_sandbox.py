@@ -0,0 +1,115 @@
+# Compares ways of running the pandas code PandasQueryEngine gets back from the LLM, on a price
+# frame (5 years of daily bars by default) and a workload of typical expressions, each repeated:
+#   - llama:     PandasQueryEngine's default parser (parses, checks and evals the code on every call)
+#   - inline:    sandbox.ExpressionExecutor(workers=0) - validated and compiled once, evaluated in-process
+#   - workers:   ExpressionExecutor with worker processes and limits, results not cached
+#   - cached:    the same with its per-(frame, expression) result cache, as the agent uses it
+# Then a runaway expression (a Python loop per row) is sent to the workers, to show it is stopped
+# at its CPU limit and the next expression is answered normally.
+#
+# Usage: python benchmarks/bench_sandbox.py --calls 400
+#        python benchmarks/bench_sandbox.py --cpu-seconds 2 --skip-llama
+import os
+import sys
+import time
+import argparse
+import statistics
+import warnings
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+warnings.filterwarnings("ignore")
+
+import numpy as np
+import pandas as pd
+
+from sandbox import ExpressionExecutor, ExpressionError
+
+# Expressions of the kind INSTRUCTION_PROMPT asks for
+EXPRESSIONS = [
+    "df['Close'].iloc[-1]",
+    "df['Close'].rolling(50).mean().iloc[-1]",
+    "df['Close'].pct_change().std() * np.sqrt(252)",
+    "df['Close'].resample('ME').last().pct_change().tail(12)",
+    "(df['Close'] / df['Close'].cummax() - 1).min()",
+    "df[['High', 'Low']].tail(252).agg(['max', 'min'])",
+    "returns = df['Close'].pct_change()\nreturns.idxmin(), returns.min()",
+    "df.loc[df['Volume'] > df['Volume'].mean() * 2, 'Close'].count()",
+    "df.describe()",
+    "df['Close'].pct_change().groupby(df.index.year).sum()",
+]
+
+RUNAWAY = "df.apply(lambda row: sum(i * i for i in range(200000)), axis=1).sum()"
+
+
+def make_prices(years, seed=0):
+    rng = np.random.default_rng(seed)
+    index = pd.bdate_range(end="2025-12-31", periods=252 * years, name="Date")
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, len(index))))
+    spread = np.abs(rng.normal(0, 0.01, len(index))) * close
+    return pd.DataFrame({"Open": close + rng.normal(0, 0.5, len(index)), "High": close + spread,
+                         "Low": close - spread, "Close": close,
+                         "Volume": rng.integers(1e6, 1e8, len(index)).astype(float)}, index=index)
+
+
+def llama_runner(df):
+    from llama_index.experimental.query_engine.pandas.output_parser import default_output_processor
+    return lambda source: default_output_processor(source, df)
+
+
+def run(label, fn, workload):
+    times = []
+    for source in workload:
+        t0 = time.perf_counter()
+        fn(source)
+        times.append(time.perf_counter() - t0)
+    times.sort()
+    total = sum(times)
+    p99 = times[min(len(times) - 1, int(len(times) * 0.99))]
+    print(f"  {label:<10} {len(times) / total:10.0f} {statistics.median(times) * 1000:9.3f}ms "
+          f"{p99 * 1000:9.3f}ms {times[-1] * 1000:9.1f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--years", type=int, default=5)
+    parser.add_argument("--calls", type=int, default=400, help="Expressions in the workload")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--cpu-seconds", type=int, default=2, help="CPU limit per expression")
+    parser.add_argument("--skip-llama", action="store_true", help="Don't import llama_index (it loads torch)")
+    args = parser.parse_args()
+
+    df = make_prices(args.years)
+    rng = np.random.default_rng(1)
+    workload = [EXPRESSIONS[i] for i in rng.integers(0, len(EXPRESSIONS), args.calls)]
+
+    inline = ExpressionExecutor(workers=0, cache_size=0)
+    uncached = ExpressionExecutor(workers=args.workers, cpu_seconds=args.cpu_seconds, cache_size=0).warm()
+    cached = ExpressionExecutor(workers=args.workers, cpu_seconds=args.cpu_seconds).warm()
+    keys = {executor: executor.new_frame_key() for executor in (inline, uncached, cached)}
+
+    print(f"{args.calls} expressions ({len(EXPRESSIONS)} distinct) on a {df.shape[0]}x{df.shape[1]} price frame")
+    print(f"  {'':<10} {'per sec':>10} {'median':>11} {'p99':>11} {'max':>11}")
+    if not args.skip_llama:
+        run("llama", llama_runner(df), workload)
+    for label, executor in (("inline", inline), ("workers", uncached), ("cached", cached)):
+        run(label, lambda source: executor.run(keys[executor], df, source), workload)
+
+    print(f"\nRunaway expression on the workers (CPU limit {args.cpu_seconds}s):")
+    t0 = time.perf_counter()
+    try:
+        uncached.run(keys[uncached], df, RUNAWAY)
+        outcome = "finished"
+    except ExpressionError as e:
+        outcome = str(e)
+    print(f"  stopped after {time.perf_counter() - t0:.2f}s: {outcome}")
+    t0 = time.perf_counter()
+    uncached.run(keys[uncached], df, EXPRESSIONS[0])
+    print(f"  next expression answered in {(time.perf_counter() - t0) * 1000:.2f}ms")
+    print(f"  {uncached.stats()}")
+
+    uncached.close()
+    cached.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+# Measures cross-ticker screening (screener.py) on synthetic fixtures: a universe of --universe tickers
+# with prices, financials and metrics stored.
+#   - per ticker: what screening takes without the screener - each ticker's stored metrics and
+#     financials loaded and checked one at a time (the agent would make a tool call per ticker on top)
+#   - build:      the first screen table, computed from everything stored
+#   - unchanged:  asking for the table again when nothing changed, within max_age (no checks) and
+#                 after it (a version check per ticker)
+#   - one changed: after one ticker's metrics were saved again with a new value, so its row is recomputed
+#   - restart:    a new Screener's first table, seeded from the table the previous one saved
+#   - screens:    filter/rank expressions over the table
+#
+# Usage: python benchmarks/bench_screener.py --universe 1000
+import os
+import sys
+import time
+import argparse
+import tempfile
+import statistics
+import warnings
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+warnings.filterwarnings("ignore")
+
+import pandas as pd
+
+from analytics import compute_financial_metrics
+from fixtures import synthetic_fixtures, use_fixtures
+from screener import Screener
+from stockdata import StockDataService
+
+SCREENS = [
+    ("peg < 1 and fcf_growth > 0", "roe / pe"),
+    ("sector == 'Technology' and volatility_1y < 0.35 and debt_to_equity < 1", "return_1y"),
+    ("fcf_margin > 0.1 and pe < 25", "rank(roe) + rank(fcf_margin) - rank(pe)"),
+    ("", "market_cap"),
+]
+
+
+# PEG < 1 and positive FCF growth, one ticker's files at a time
+def screen_per_ticker(service, tickers):
+    matches = []
+    for ticker in tickers:
+        metrics = service.ticker_store(ticker).load("metrics")
+        growth = compute_financial_metrics(service.ticker_store(ticker).load("financials"))
+        peg = pd.to_numeric(metrics["pegRatio"].iloc[0], errors="coerce") if "pegRatio" in metrics else None
+        if peg is not None and peg < 1 and growth.get("free_cash_flow_growth_yoy", 0) > 0:
+            matches.append(ticker)
+    return matches
+
+
+def timed(fn, repeat=1):
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - t0)
+    return result, statistics.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--universe", type=int, default=1000)
+    parser.add_argument("--years", type=int, default=2)
+    parser.add_argument("--repeat", type=int, default=20, help="Runs per screen (median reported)")
+    args = parser.parse_args()
+
+    tickers = [f"SYN{i:04d}" for i in range(args.universe)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        fixture_dir, data_dir = os.path.join(tmp, "fixtures"), os.path.join(tmp, "data")
+        synthetic_fixtures(fixture_dir, tickers, years=args.years, news_per_ticker=0)
+
+        with use_fixtures(fixture_dir):
+            service = StockDataService(data_dir, universe=tickers)
+            service.sync_prices(args.years)
+            for ticker in tickers:
+                service.get_financials(ticker)
+                service.get_metrics(service.get_info(ticker))
+                service.forget_ticker(ticker)
+
+            screener = Screener(service, max_age=0)
+            print(f"{args.universe} tickers with prices, financials and metrics")
+            matches, per_ticker = timed(lambda: screen_per_ticker(service, tickers))
+            print(f"  {'per ticker (files, one at a time)':<40} {per_ticker * 1000:10.1f}ms   {len(matches)} matches")
+            table, build = timed(screener.table)
+            print(f"  {'build screen table':<40} {build * 1000:10.1f}ms   {table.shape[0]} x {table.shape[1]}")
+            screener.max_age = 60
+            _, cached = timed(screener.table, repeat=5)
+            print(f"  {'table again, within max_age':<40} {cached * 1000:10.3f}ms")
+            screener.max_age = 0
+            _, unchanged = timed(screener.table, repeat=5)
+            print(f"  {'table again, nothing changed':<40} {unchanged * 1000:10.1f}ms")
+
+            metrics = service.ticker_store(tickers[0]).load("metrics")
+            service.get_metrics(metrics.assign(pegRatio=0.5))
+            _, changed = timed(screener.table)
+            print(f"  {'table again, one ticker changed':<40} {changed * 1000:10.1f}ms")
+            _, restart = timed(Screener(service, max_age=0).table)
+            print(f"  {'first table after a restart':<40} {restart * 1000:10.1f}ms")
+
+            print(f"\n  {'filter':<70} {'rank by':<40} {'matches':>8} {'median':>10}")
+            for where, rank_by in SCREENS:
+                result, seconds = timed(lambda: screener._screen(table, where, rank_by, False, None, ()),
+                                        repeat=args.repeat)
+                print(f"  {where or '(all)':<70} {rank_by:<40} {len(result):8d} {seconds * 1000:8.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+# Measures cold startup: import time and memory of the entry modules, each in a fresh interpreter
+#   - per target: wall time of the import, RSS afterwards, and which heavy dependencies got loaded
+#   - "agent": importing rag and constructing StockDataService + StockAnalyzerAgent, i.e. what
+#     main.py does before asking for a ticker (no network, no LLM client)
+#
+# Usage: python benchmarks/bench_startup.py --repeat 5
+#        python benchmarks/bench_startup.py --targets rag,stockdata --importtime   (slowest imports, via -X importtime)
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+# Dependencies worth keeping off the startup path
+HEAVY = ["llama_index.core", "llama_index.experimental", "llama_index.llms.openai", "llama_index.llms.anthropic",
+         "openai", "anthropic", "plotly", "yfinance", "pyarrow", "aiohttp"]
+
+TARGETS = {
+    "stockdata": "import stockdata",
+    "rag": "import rag",
+    "main": "import main",
+    "server": "import server",
+    "batch": "import batch",
+    "agent": ("import tempfile, rag, stockdata\n"
+              "d = tempfile.mkdtemp()\n"
+              "stockdata.StockDataService(d)\n"
+              "rag.StockAnalyzerAgent('claude-sonnet-4-5-20250929', data_dir=d, ticker='NVDA')"),
+}
+
+# Runs in the child: times the target code, then reports RSS and loaded heavy modules as JSON
+PROBE = """
+import sys, time, json
+t0 = time.perf_counter()
+exec(compile({code!r}, "<target>", "exec"))
+seconds = time.perf_counter() - t0
+rss_kb = 0
+with open("/proc/self/status") as f:
+    for line in f:
+        if line.startswith("VmRSS:"):
+            rss_kb = int(line.split()[1])
+if not rss_kb:
+    import resource
+    rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // (1024 if sys.platform == "darwin" else 1)
+print(json.dumps({{"seconds": seconds, "rss_mb": rss_kb / 1024,
+                   "loaded": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def run_target(code):
+    probe = PROBE.format(code=code, heavy=HEAVY)
+    result = subprocess.run([sys.executable, "-c", probe], cwd=ROOT, capture_output=True, text=True,
+                            env={**os.environ, "CAPIT_TRACE": ""})
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "failed")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+# Prints the slowest cumulative imports reported by python -X importtime
+def print_importtime(name, code, top):
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=ROOT,
+                            capture_output=True, text=True)
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, module = line[len("import time:"):].split("|")
+        rows.append((int(cumulative), module.strip()))
+    print(f"  slowest imports under {name}:")
+    for cumulative, module in sorted(rows, reverse=True)[:top]:
+        print(f"    {cumulative / 1000:8.1f}ms  {module}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--targets", default=",".join(TARGETS), help="Comma-separated: " + ", ".join(TARGETS))
+    parser.add_argument("--importtime", action="store_true", help="Also list the slowest imports per target")
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    print(f"Cold startup, median of {args.repeat} fresh interpreters")
+    for name in args.targets.split(","):
+        code = TARGETS[name]
+        try:
+            runs = [run_target(code) for _ in range(args.repeat)]
+        except RuntimeError as e:
+            print(f"  {name:<10} failed: {e}")
+            continue
+
+        seconds = statistics.median(run["seconds"] for run in runs)
+        rss = statistics.median(run["rss_mb"] for run in runs)
+        loaded = ", ".join(runs[-1]["loaded"]) or "none"
+        print(f"  {name:<10} {seconds * 1000:8.0f}ms  {rss:7.0f}MB RSS  heavy: {loaded}")
+
+        if args.importtime and "\n" not in code:
+            print_importtime(name, code, args.top)
+
+
+if __name__ == "__main__":
+    main()
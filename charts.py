@@ -0,0 +1,269 @@
+import os
+import re
+import hashlib
+import importlib.util
+import logging
+import threading
+
+import numpy as np
+import pandas as pd
+
+from storage import content_hash
+from tracing import traced, current_span
+
+# Renders price charts to static files under <output_dir>/charts instead of opening them in a browser.
+# Each line is downsampled to at most max_points points with a shape-preserving method, so a chart
+# costs the same to build, write and display whether it covers one year or thirty:
+#   lttb     Largest-Triangle-Three-Buckets: per bucket, the point forming the largest triangle with
+#            its neighbours - keeps the line's visual shape, turning points and extremes
+#   minmax   each bucket's lowest and highest point - every spike and crash survives exactly
+# A chart file is named after its tickers, date range and options plus a digest of the data it was
+# drawn from (the price store's versions, or the frame's contents), so asking again for the same
+# chart returns the existing file, and a chart whose prices changed is drawn again and replaces it.
+#
+#   renderer = ChartRenderer(service.price_store, "data/")
+#   renderer.render(["NVDA", "AMD"], "2020-01-01", "2025-01-01")   # -> data/charts/NVDA-AMD_..._.html
+
+DEFAULT_MAX_POINTS = 600
+
+CHART_FORMATS = ("html", "png")
+
+# lttb() runs on at most this many times its output points, preselected with minmax()
+PRESELECT_RATIO = 4
+
+
+# Indices of the `points` points of (x, y) that LTTB keeps (all of them if there are no more than that)
+# Long series are first cut down to their buckets' mins and maxes at PRESELECT_RATIO times `points`
+# (MinMaxLTTB): the points LTTB would pick are almost always among them, and the sequential pass
+# below then costs the same however long the series is.
+def lttb(x, y, points):
+    n = len(y)
+    if points >= n or points < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    if n > points * PRESELECT_RATIO:
+        candidates = minmax(y, points * PRESELECT_RATIO)
+        return candidates[lttb(x[candidates], y[candidates], points)]
+
+    # First and last points are kept; the rest is split into points - 2 buckets
+    edges = np.linspace(1, n - 1, points - 1).astype(np.int64)
+    counts = np.diff(edges)
+    mean_x = np.add.reduceat(x[1:n - 1], edges[:-1] - 1) / counts
+    mean_y = np.add.reduceat(y[1:n - 1], edges[:-1] - 1) / counts
+    # Each bucket is compared against the average point of the next one (the last point for the last bucket)
+    next_x = np.append(mean_x[1:], x[-1]).tolist()
+    next_y = np.append(mean_y[1:], y[-1]).tolist()
+
+    # Buckets hold a few points each, where plain floats are much cheaper than numpy calls
+    xs, ys, edges = x.tolist(), y.tolist(), edges.tolist()
+    selected = [0]
+    a = 0
+    for i in range(points - 2):
+        ax, ay = xs[a], ys[a]
+        dx, dy = ax - next_x[i], next_y[i] - ay
+        best, a = -1.0, edges[i]
+        for j in range(edges[i], edges[i + 1]):
+            area = abs(dx * (ys[j] - ay) + dy * (xs[j] - ax))
+            if area > best:
+                best, a = area, j
+        selected.append(a)
+    selected.append(n - 1)
+    return np.array(selected, dtype=np.int64)
+
+
+# Indices of each bucket's lowest and highest point (plus the first and last), at most `points` in all
+def minmax(y, points):
+    n = len(y)
+    if points >= n or points < 4:
+        return np.arange(n)
+
+    buckets = (points - 2) // 2
+    starts = np.arange(buckets) * n // buckets
+    ends = np.append(starts[1:], n)
+    # One row per bucket; shorter buckets repeat their last point, which changes neither min nor max
+    rows = np.minimum(starts[:, None] + np.arange((ends - starts).max()), ends[:, None] - 1)
+    values = np.asarray(y, dtype=float)[rows]
+    lows = rows[np.arange(buckets), values.argmin(axis=1)]
+    highs = rows[np.arange(buckets), values.argmax(axis=1)]
+    return np.unique(np.concatenate(([0, n - 1], lows, highs)))
+
+
+DOWNSAMPLERS = {
+    "lttb": lambda x, y, points: lttb(x, y, points),
+    "minmax": lambda x, y, points: minmax(y, points),
+}
+
+
+# A date-indexed series reduced to at most `points` points (missing values are dropped)
+def downsample(series, points=DEFAULT_MAX_POINTS, method="lttb"):
+    if method not in DOWNSAMPLERS:
+        raise ValueError(f"Unknown downsampling method {method!r}; choose from {', '.join(DOWNSAMPLERS)}")
+    series = series.dropna()
+    if len(series) <= points:
+        return series
+    x = series.index.asi8 - series.index.asi8[0] if isinstance(series.index, pd.DatetimeIndex) \
+        else np.arange(len(series))
+    return series.iloc[DOWNSAMPLERS[method](x, series.to_numpy(dtype=float), points)]
+
+
+# Close prices of the given tickers (all of them if None) as one column per ticker, from a
+# get_historical_prices panel with (Price, Ticker) columns or a single ticker's bars
+def close_prices(df, tickers=None):
+    if isinstance(df.columns, pd.MultiIndex):
+        closes = df["Close"]
+        return closes[list(tickers)] if tickers is not None else closes
+    if tickers is None or len(tickers) != 1:
+        raise ValueError("A single ticker's bars need exactly one ticker name")
+    return df[["Close"]].rename(columns={"Close": tickers[0]})
+
+
+def _date_label(value):
+    return pd.Timestamp(value).strftime("%Y%m%d") if value is not None else "all"
+
+
+class ChartRenderer():
+    # price_store is a PriceStore to chart stored prices from; charts are written to <output_dir>/charts
+    # max_points is the most points drawn per line and method picks the downsampler (see DOWNSAMPLERS)
+    # include_plotlyjs is passed to plotly's write_html: "cdn" keeps each file small but needs network
+    # access to display; "directory" copies plotly.min.js next to the charts once, for offline use
+    def __init__(self, price_store, output_dir, max_points=DEFAULT_MAX_POINTS, method="lttb",
+                 include_plotlyjs="cdn", width=1000, height=600):
+        if method not in DOWNSAMPLERS:
+            raise ValueError(f"Unknown downsampling method {method!r}; choose from {', '.join(DOWNSAMPLERS)}")
+        self.price_store = price_store
+        self.chart_dir = os.path.join(output_dir, "charts")
+        self.max_points = max_points
+        self.method = method
+        self.include_plotlyjs = include_plotlyjs
+        self.width = width
+        self.height = height
+
+        self._lock = threading.Lock()
+        self._path_locks = {}  # One lock per chart file, so a chart is drawn once when requested concurrently
+        self._counters = {"rendered": 0, "cached": 0, "points_in": 0, "points_out": 0}
+
+    # Charts the stored closes of one or more tickers between start and end and returns the file path
+    # Cached by the tickers' price store versions, so this doesn't read any prices when nothing changed.
+    # normalize rebases every line to 100 at its first point; by default, when there is more than one ticker.
+    @traced("charts.render", args=("tickers", "fmt"))
+    def render(self, tickers, start=None, end=None, fmt="html", title=None, normalize=None):
+        tickers = [tickers.upper()] if isinstance(tickers, str) else [ticker.upper() for ticker in tickers]
+        versions = [self.price_store.version(ticker) for ticker in tickers]
+
+        def load():
+            columns = {}
+            for ticker in tickers:
+                df = self.price_store.read(ticker)
+                if not df.empty:
+                    columns[ticker] = df["Close"].loc[pd.Timestamp(start) if start else None:
+                                                      pd.Timestamp(end) if end else None]
+            return pd.DataFrame(columns)
+
+        return self._render(tickers, start, end, repr(versions), load, fmt, title, normalize)
+
+    # Charts the closes in a frame already in memory - a get_historical_prices panel (every ticker in
+    # it, or the given ones) or a single ticker's bars with tickers=[ticker] - and returns the file path
+    # Cached by the frame's contents, over its own date range.
+    @traced("charts.render_frame", args=("tickers", "fmt"))
+    def render_frame(self, df, tickers=None, fmt="html", title=None, normalize=None):
+        closes = close_prices(df, tickers)
+        closes.columns = [str(column).upper() for column in closes.columns]
+        start, end = (closes.index[0], closes.index[-1]) if len(closes) else (None, None)
+        return self._render(list(closes.columns), start, end, content_hash(closes), lambda: closes,
+                            fmt, title, normalize)
+
+    def _render(self, tickers, start, end, data_key, load, fmt, title, normalize):
+        if fmt not in CHART_FORMATS:
+            raise ValueError(f"Unknown chart format {fmt!r}; choose from {', '.join(CHART_FORMATS)}")
+        if fmt == "png" and importlib.util.find_spec("kaleido") is None:
+            raise ImportError("PNG charts require kaleido: pip install kaleido")
+        normalize = len(tickers) > 1 if normalize is None else normalize
+
+        # Charts of the same thing drawn from older data share the prefix and are replaced
+        options = repr((tickers, _date_label(start), _date_label(end), title, normalize, self.max_points,
+                        self.method, self.include_plotlyjs, self.width, self.height))
+        label = re.sub(r"[^A-Za-z0-9.^=-]", "_", "-".join(tickers))[:60]
+        prefix = (f"{label}_{_date_label(start)}_{_date_label(end)}_"
+                  f"{hashlib.sha1(options.encode()).hexdigest()[:10]}_")
+        path = os.path.join(self.chart_dir, f"{prefix}{hashlib.sha1(data_key.encode()).hexdigest()[:10]}.{fmt}")
+
+        with self._lock:
+            path_lock = self._path_locks.setdefault(path, threading.Lock())
+        with path_lock:
+            if os.path.exists(path):
+                with self._lock:
+                    self._counters["cached"] += 1
+                current_span().set("cached", True)
+                return path
+
+            closes = load()
+            if closes.empty:
+                raise ValueError(f"No prices to chart for {', '.join(tickers)}")
+            figure, points_in, points_out = self._figure(closes, tickers, start, end, title, normalize)
+
+            os.makedirs(self.chart_dir, exist_ok=True)
+            tmp_path = f"{path[:-len(fmt) - 1]}.{threading.get_ident()}.tmp.{fmt}"
+            if fmt == "png":
+                figure.write_image(tmp_path, format="png")
+            else:
+                figure.write_html(tmp_path, include_plotlyjs=self.include_plotlyjs, full_html=True)
+            os.replace(tmp_path, path)
+            self._prune(prefix, path)
+
+            with self._lock:
+                self._counters["rendered"] += 1
+                self._counters["points_in"] += points_in
+                self._counters["points_out"] += points_out
+            current_span().set("cached", False).set("points_in", points_in).set("points_out", points_out)
+            return path
+
+    def _figure(self, closes, tickers, start, end, title, normalize):
+        import plotly.graph_objects as go
+
+        figure = go.Figure()
+        points_in = points_out = 0
+        for ticker in tickers:
+            if ticker not in closes:
+                logging.warning(f"No prices to chart for {ticker}")
+                continue
+            series = closes[ticker].dropna()
+            if series.empty:
+                continue
+            if normalize:
+                series = series / series.iloc[0] * 100
+            line = downsample(series, self.max_points, self.method)
+            points_in += len(series)
+            points_out += len(line)
+            figure.add_trace(go.Scatter(x=line.index, y=line.to_numpy(), mode="lines", name=ticker))
+
+        if title is None:
+            dates = closes.dropna(how="all").index
+            title = f"{', '.join(tickers)} stock price, {dates[0]:%Y-%m-%d} to {dates[-1]:%Y-%m-%d}"
+        figure.update_layout(
+            title=title,
+            xaxis_title="Date",
+            yaxis_title="Price (rebased to 100)" if normalize else "Price ($)",
+            width=self.width,
+            height=self.height,
+            xaxis_showgrid=True,
+            yaxis_showgrid=True,
+        )
+        return figure, points_in, points_out
+
+    def _prune(self, prefix, keep):
+        for name in os.listdir(self.chart_dir):
+            path = os.path.join(self.chart_dir, name)
+            if name.startswith(prefix) and path != keep and ".tmp." not in name:
+                try:
+                    os.remove(path)
+                except OSError as e:
+                    logging.warning(f"Could not remove stale chart {path}: {e}")
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+        stats["method"] = self.method
+        stats["max_points"] = self.max_points
+        return stats
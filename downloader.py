@@ -0,0 +1,112 @@
+import time
+import random
+import contextvars
+import logging
+import datetime as dt
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from tracing import span
+
+
+# Splits a list into consecutive chunks of at most size items
+def chunked(items, size):
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+# Business days a range needs before a download that returns no bars at all counts as failed;
+# shorter ranges may hold no session yet (today before the open) or only exchange holidays
+MIN_EXPECTED_SESSIONS = 5
+
+
+# Splits a yf.download frame into {ticker: OHLCV bars}, dropping tickers that returned nothing
+# (yfinance doesn't raise for unknown or delisted symbols, it returns all-NaN columns for them)
+def split_by_ticker(df, tickers):
+    if df is None or df.empty:
+        return {}
+
+    if not isinstance(df.columns, pd.MultiIndex):
+        df.columns = pd.MultiIndex.from_product([df.columns, tickers])
+
+    bars = {}
+    returned = set(df.columns.get_level_values(1))
+    for ticker in tickers:
+        if ticker not in returned:
+            continue
+        ticker_bars = df.xs(ticker, axis=1, level=1).dropna(how="all")
+        if not ticker_bars.empty:
+            bars[ticker] = ticker_bars
+    return bars
+
+
+# Downloads price bars for a large ticker universe in chunks with bounded parallelism
+# - at most max_workers chunks are in flight, each using threads_per_chunk yfinance threads
+# - a chunk that raises is retried with exponential backoff, then split in half until the
+#   bad symbol is isolated, so one failure never sinks the rest of the batch
+# - finished chunks are yielded one at a time so callers can store them and let them go
+class BatchDownloader():
+    def __init__(self, chunk_size=100, max_workers=4, threads_per_chunk=8, retries=3, backoff=1.0):
+        self.chunk_size = chunk_size
+        self.max_workers = max_workers
+        self.threads_per_chunk = threads_per_chunk
+        self.retries = retries
+        self.backoff = backoff
+
+    # Downloads one chunk, retrying on errors; returns {ticker: bars}
+    def _download_chunk(self, tickers, start, end):
+        import yfinance as yf
+
+        for attempt in range(self.retries + 1):
+            try:
+                # yfinance treats end as exclusive
+                with span("yfinance.download", tickers=len(tickers), attempt=attempt) as s:
+                    df = yf.download(tickers, start, end + dt.timedelta(days=1),
+                                     progress=False, threads=self.threads_per_chunk)
+                    s.set("rows", len(df))
+                return split_by_ticker(df, tickers)
+            except Exception as e:
+                if attempt == self.retries:
+                    raise
+                delay = self.backoff * (2 ** attempt) * (1 + random.random())
+                logging.warning(f"Download of {len(tickers)} tickers failed ({e}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+
+    # Downloads a chunk, bisecting it on failure; returns ({ticker: bars}, failed tickers)
+    def _download_isolated(self, tickers, start, end):
+        try:
+            return self._download_chunk(tickers, start, end), []
+        except Exception as e:
+            if len(tickers) == 1:
+                logging.error(f"Giving up on {tickers[0]} ({start} to {end}): {e}")
+                return {}, list(tickers)
+
+            mid = len(tickers) // 2
+            left, left_failed = self._download_isolated(tickers[:mid], start, end)
+            right, right_failed = self._download_isolated(tickers[mid:], start, end)
+            left.update(right)
+            return left, left_failed + right_failed
+
+    # Tickers of a chunk that returned no bars although there were bars to return: other tickers in
+    # the chunk got some, or the range is too long to hold no session at all
+    def _empty(self, chunk, bars, failed, start, end):
+        empty = [ticker for ticker in chunk if ticker not in bars and ticker not in failed]
+        if empty and (bars or len(pd.bdate_range(start, end)) >= MIN_EXPECTED_SESSIONS):
+            return empty
+        return []
+
+    # Runs a list of (tickers, start, end) jobs
+    # Yields (start, end, {ticker: bars}, failed tickers) as each chunk finishes; failed includes the
+    # tickers that returned no bars where bars were expected (see _empty)
+    def run(self, jobs):
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = {}
+            for tickers, start, end in jobs:
+                for chunk in chunked(tickers, self.chunk_size):
+                    # Run in a copy of the caller's context so download spans nest under it
+                    future = pool.submit(contextvars.copy_context().run, self._download_isolated, chunk, start, end)
+                    futures[future] = (chunk, start, end)
+
+            for future in as_completed(futures):
+                chunk, start, end = futures.pop(future)
+                bars, failed = future.result()
+                yield start, end, bars, failed + self._empty(chunk, bars, failed, start, end)
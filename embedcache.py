@@ -0,0 +1,152 @@
+import time
+import sqlite3
+import hashlib
+import threading
+import numpy as np
+from typing import List
+
+from pydantic import PrivateAttr
+from llama_index.core.base.embeddings.base import BaseEmbedding
+
+from tracing import span
+
+
+# Embedding model wrapper that caches vectors on disk by content hash
+# Yahoo headlines overlap heavily between tickers, so the same text is often embedded
+# many times across indexes and sessions. Vectors are stored in SQLite keyed by
+# sha256(model, kind, text); the least recently used entries are dropped past max_entries.
+# Works with any llama_index embedding model, including local/offline ones.
+class CachedEmbedding(BaseEmbedding):
+    _inner: BaseEmbedding = PrivateAttr()
+    _conn: sqlite3.Connection = PrivateAttr()
+    _lock: threading.Lock = PrivateAttr()
+    _max_entries: int = PrivateAttr()
+    _hits: int = PrivateAttr(default=0)
+    _misses: int = PrivateAttr(default=0)
+
+    def __init__(self, inner, cache_path, max_entries=100_000, **kwargs):
+        super().__init__(model_name=f"cached:{inner.model_name}", embed_batch_size=inner.embed_batch_size, **kwargs)
+        self._inner = inner
+        self._max_entries = max_entries
+        self._lock = threading.Lock()
+
+        # Index inserts can run on worker threads, so every access goes through the lock
+        self._conn = sqlite3.connect(cache_path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+        self._conn.commit()
+
+    @classmethod
+    def class_name(cls):
+        return "CachedEmbedding"
+
+    def _key(self, kind, text):
+        content = f"{self._inner.model_name}\0{kind}\0{text}"
+        return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+    # Returns {key: vector} for the keys already cached, marking them as recently used
+    def _lookup(self, keys):
+        found = {}
+        with self._lock:
+            for key in set(keys):
+                row = self._conn.execute("SELECT vector FROM embeddings WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    found[key] = np.frombuffer(row[0], dtype=np.float32).tolist()
+
+            if found:
+                now = time.time()
+                self._conn.executemany("UPDATE embeddings SET last_used = ? WHERE key = ?",
+                                       [(now, key) for key in found])
+                self._conn.commit()
+        return found
+
+    def _store(self, items):
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)",
+                [(key, np.asarray(vector, dtype=np.float32).tobytes(), now) for key, vector in items],
+            )
+
+            # Evict least recently used entries past the size cap
+            count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            if count > self._max_entries:
+                self._conn.execute(
+                    "DELETE FROM embeddings WHERE key IN "
+                    "(SELECT key FROM embeddings ORDER BY last_used LIMIT ?)",
+                    (count - self._max_entries,),
+                )
+            self._conn.commit()
+
+    # Looks texts up in the cache; returns their keys, the vectors found and {key: text} of the misses
+    def _lookup_texts(self, kind, texts, s):
+        keys = [self._key(kind, text) for text in texts]
+        found = self._lookup(keys)
+
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in found:
+                missing.setdefault(key, text)
+
+        hits = len(texts) - sum(1 for key in keys if key in missing)
+        self._hits += hits
+        self._misses += len(missing)
+        s.set("cache_hits", hits).set("embedded", len(missing))
+        return keys, found, missing
+
+    def _add_embedded(self, found, missing, vectors):
+        new = dict(zip(missing.keys(), vectors))
+        self._store(new.items())
+        found.update(new)
+
+    # Looks texts up in the cache and embeds only the misses, in one batch through embed_misses
+    def _embed_cached(self, kind, texts, embed_misses):
+        with span("embedding", kind=kind, texts=len(texts)) as s:
+            keys, found, missing = self._lookup_texts(kind, texts, s)
+            if missing:
+                self._add_embedded(found, missing, embed_misses(list(missing.values())))
+            return [found[key] for key in keys]
+
+    # Same, awaiting the inner model's async calls for the misses so the event loop keeps running
+    async def _aembed_cached(self, kind, texts, aembed_misses):
+        with span("embedding", kind=kind, texts=len(texts)) as s:
+            keys, found, missing = self._lookup_texts(kind, texts, s)
+            if missing:
+                self._add_embedded(found, missing, await aembed_misses(list(missing.values())))
+            return [found[key] for key in keys]
+
+    def _get_text_embeddings(self, texts: List[str]):
+        return self._embed_cached("text", texts, self._inner.get_text_embedding_batch)
+
+    def _get_text_embedding(self, text: str):
+        return self._get_text_embeddings([text])[0]
+
+    def _get_query_embedding(self, query: str):
+        return self._embed_cached("query", [query],
+                                  lambda queries: [self._inner.get_query_embedding(q) for q in queries])[0]
+
+    async def _aget_text_embeddings(self, texts: List[str]):
+        return await self._aembed_cached("text", texts, self._inner.aget_text_embedding_batch)
+
+    async def _aget_text_embedding(self, text: str):
+        return (await self._aget_text_embeddings([text]))[0]
+
+    async def _aget_query_embedding(self, query: str):
+        async def embed_queries(queries):
+            return [await self._inner.aget_query_embedding(q) for q in queries]
+        return (await self._aembed_cached("query", [query], embed_queries))[0]
+
+    # Hit/miss counters for this process plus the current cache size
+    def stats(self):
+        with self._lock:
+            size = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        total = self._hits + self._misses
+        return {
+            "hits": self._hits,
+            "misses": self._misses,
+            "hit_rate": self._hits / total if total else 0.0,
+            "entries": size,
+        }
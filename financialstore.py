@@ -0,0 +1,218 @@
+import os
+import threading
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+# Financial statements in long format - one row per (ticker, line item, period):
+#   Date (datetime64), Ticker, Financial, Statement_Type (categoricals), Value (float)
+# Line items are named "<statement prefix>_<yfinance name>", e.g. "IS_TotalRevenue".
+# The key columns are dictionary-encoded, so each distinct string is stored once and rows hold
+# small integer codes; Feather and Parquet keep that encoding on disk.
+
+COLUMNS = ["Date", "Ticker", "Financial", "Value", "Statement_Type"]
+KEY_COLUMNS = ["Ticker", "Financial", "Statement_Type"]
+INDEX_LEVELS = ["Ticker", "Financial", "Date"]
+
+# Prefix given to each statement's line items, in the order they are stacked
+STATEMENT_PREFIXES = {"income_stmt": "IS", "cashflow": "CF", "balance_sheet": "BS"}
+
+
+def empty_financials(value_dtype=np.float64):
+    return pd.DataFrame({
+        "Date": pd.Series(dtype="datetime64[ns]"),
+        "Ticker": pd.Categorical([]),
+        "Financial": pd.Categorical([]),
+        "Value": pd.Series(dtype=value_dtype),
+        "Statement_Type": pd.Categorical([]),
+    })
+
+
+# Statement prefix of every line item ("IS" for "IS_TotalRevenue")
+# The split runs once per distinct line item (the categories) and is broadcast to rows by code
+def statement_types(financial):
+    financial = pd.Categorical(financial)
+    prefixes = financial.categories.str.split("_", n=1).str[0]
+    prefix_codes, uniques = pd.factorize(prefixes)
+    codes = np.where(financial.codes >= 0, prefix_codes[financial.codes], -1)
+    return pd.Categorical.from_codes(codes, categories=uniques)
+
+
+# Builds a ticker's long table straight from yfinance statements (line items x periods)
+# statements maps a statement name from STATEMENT_PREFIXES to its frame. Periods missing
+# from one statement but present in another get NaN values.
+def build_financials(ticker, statements, value_dtype=np.float64):
+    frames = [(prefix, statements.get(name)) for name, prefix in STATEMENT_PREFIXES.items()]
+    frames = [(prefix, df) for prefix, df in frames if df is not None and not df.empty]
+    if not frames:
+        return empty_financials(value_dtype)
+
+    periods = frames[0][1].columns
+    for _, df in frames[1:]:
+        if not df.columns.equals(periods):
+            periods = periods.union(df.columns)
+    periods = pd.DatetimeIndex(periods)
+
+    items, values = [], []
+    for prefix, df in frames:
+        df = df.reindex(columns=periods)
+        items.append(prefix + "_" + df.index.astype(str))
+        values.append(df.to_numpy(dtype=np.float64, na_value=np.nan))
+
+    item_codes, item_names = pd.factorize(np.concatenate(items))
+    values = np.vstack(values)
+    n_items, n_periods = values.shape
+
+    financial = pd.Categorical.from_codes(np.repeat(item_codes, n_periods), categories=item_names)
+    return pd.DataFrame({
+        "Date": np.tile(periods.to_numpy(), n_items),
+        "Ticker": pd.Categorical.from_codes(np.zeros(n_items * n_periods, dtype=np.int8), categories=[ticker]),
+        "Financial": financial,
+        "Value": values.ravel().astype(value_dtype, copy=False),
+        "Statement_Type": statement_types(financial),
+    })
+
+
+# Brings a long table loaded from disk (e.g. CSV, or saved before the keys were categorical)
+# into the compact dtypes; a table that already has them is returned as is
+def compact(df, value_dtype=np.float64):
+    if df is None or df.empty or "Financial" not in df.columns:
+        return empty_financials(value_dtype)
+
+    df = df[[col for col in COLUMNS if col in df.columns]]
+    updates = {}
+    if not isinstance(df["Financial"].dtype, pd.CategoricalDtype):
+        updates["Financial"] = df["Financial"].astype("category")
+    if "Ticker" in df.columns and not isinstance(df["Ticker"].dtype, pd.CategoricalDtype):
+        updates["Ticker"] = df["Ticker"].astype("category")
+    if df["Value"].dtype != value_dtype:
+        updates["Value"] = pd.to_numeric(df["Value"], errors="coerce").astype(value_dtype)
+    if not pd.api.types.is_datetime64_any_dtype(df["Date"]):
+        updates["Date"] = pd.to_datetime(df["Date"], errors="coerce")
+    if "Statement_Type" not in df.columns or not isinstance(df["Statement_Type"].dtype, pd.CategoricalDtype):
+        updates["Statement_Type"] = statement_types(updates.get("Financial", df["Financial"]))
+
+    return df.assign(**updates)[COLUMNS] if updates else df
+
+
+# Stacks several tickers' tables, merging their categories instead of falling back to object columns
+def concat_financials(frames, value_dtype=np.float64):
+    frames = [df for df in frames if not df.empty]
+    if not frames:
+        return empty_financials(value_dtype)
+    if len(frames) == 1:
+        return frames[0]
+
+    columns = {col: union_categoricals([df[col] for df in frames]) for col in KEY_COLUMNS}
+    columns["Date"] = np.concatenate([df["Date"].to_numpy() for df in frames])
+    columns["Value"] = np.concatenate([df["Value"].to_numpy() for df in frames])
+    return pd.DataFrame(columns)[COLUMNS]
+
+
+# In-memory view of the financials StockDataService has stored, for all tickers
+# Each ticker's table is read once and reused until its file changes. index() stacks them
+# under a sorted (Ticker, Financial, Date) index, so one line item across tickers or one
+# ticker's history is a binary-search slice rather than a scan.
+class FinancialsStore():
+    def __init__(self, service, value_dtype=np.float64):
+        self.service = service
+        self.value_dtype = value_dtype
+        self._frames = {}  # ticker -> (version, table)
+        self._index = None  # ((ticker, version), ...) -> indexed table
+        self._lock = threading.Lock()
+
+    def version(self, ticker):
+        return self.service.ticker_store(ticker).version("financials")
+
+    # Tickers with financials on disk
+    def tickers(self):
+        tickers_dir = os.path.join(self.service.output_dir, "tickers")
+        if not os.path.isdir(tickers_dir):
+            return []
+        return sorted(ticker for ticker in os.listdir(tickers_dir) if self.version(ticker) is not None)
+
+    # Keeps a table that was just saved, so it isn't read straight back
+    def put(self, ticker, df):
+        ticker = ticker.upper()
+        with self._lock:
+            self._frames[ticker] = (self.version(ticker), compact(df, self.value_dtype))
+
+    # A ticker's long table (empty if nothing is stored)
+    def read(self, ticker):
+        ticker = ticker.upper()
+        version = self.version(ticker)
+        with self._lock:
+            cached = self._frames.get(ticker)
+            if cached is not None and cached[0] == version:
+                return cached[1]
+
+        if version is None:
+            df = empty_financials(self.value_dtype)
+        else:
+            df = compact(self.service.ticker_store(ticker).load("financials"), self.value_dtype)
+
+        with self._lock:
+            self._frames[ticker] = (version, df)
+        return df
+
+    # Tables of several tickers (all stored ones by default) stacked and indexed by (Ticker, Financial, Date)
+    # The index is rebuilt only when the set of tickers or one of their files changes
+    def index(self, tickers=None):
+        tickers = self.tickers() if tickers is None else sorted({ticker.upper() for ticker in tickers})
+        key = tuple((ticker, self.version(ticker)) for ticker in tickers)
+        with self._lock:
+            if self._index is not None and self._index[0] == key:
+                return self._index[1]
+
+        stacked = concat_financials([self.read(ticker) for ticker in tickers], self.value_dtype)
+        indexed = stacked.set_index(INDEX_LEVELS).sort_index()
+
+        with self._lock:
+            self._index = (key, indexed)
+        return indexed
+
+    # One line item for one ticker over time, oldest period first
+    def series(self, ticker, item):
+        table = self.read(ticker)
+        rows = table[table["Financial"] == item]
+        return rows.set_index("Date")["Value"].sort_index().rename(item)
+
+    # Line items (rows) by period (columns, most recent first) for one ticker
+    def table(self, ticker):
+        df = self.read(ticker)
+        if df.empty:
+            return pd.DataFrame()
+        table = df.pivot_table(index="Financial", columns="Date", values="Value", aggfunc="first", observed=True)
+        return table[sorted(table.columns, reverse=True)]
+
+    # One line item across tickers: the value for each ticker at `period`, or its latest reported one
+    def cross_section(self, item, tickers=None, period=None):
+        try:
+            values = self.index(tickers).xs(item, level="Financial")["Value"].dropna()
+        except KeyError:
+            return pd.Series(dtype=self.value_dtype, name=item)
+
+        if period is not None:
+            values = values[values.index.get_level_values("Date") == pd.Timestamp(period)]
+        else:
+            values = values.groupby(level="Ticker", observed=True).tail(1)  # Dates are sorted within a ticker
+        return values.droplevel("Date").rename(item)
+
+    # The `periods` most recent values of some line items for several tickers (all stored ones by default):
+    # one row per ticker and a (Financial, Period) column per value, Period 1 being the ticker's latest
+    # reported period (over all its line items) and 2 the one before. Missing values are NaN.
+    def latest(self, items, tickers=None, periods=2):
+        indexed = self.index(tickers)
+        columns = pd.MultiIndex.from_product([items, range(1, periods + 1)], names=["Financial", "Period"])
+        if indexed.empty:
+            return pd.DataFrame(columns=columns, index=pd.Index([], name="Ticker"), dtype=self.value_dtype)
+
+        rows = indexed.reset_index()
+        rows["Period"] = rows.groupby("Ticker", observed=True)["Date"].rank(method="dense", ascending=False)
+        rows = rows[(rows["Period"] <= periods) & rows["Financial"].isin(items)]
+        wide = rows.pivot_table(index="Ticker", columns=["Financial", "Period"], values="Value",
+                                aggfunc="first", observed=True)
+        wide.columns = pd.MultiIndex.from_tuples([(str(item), int(period)) for item, period in wide.columns],
+                                                 names=["Financial", "Period"])
+        wide.index = wide.index.astype(str)
+        return wide.reindex(columns=columns).astype(self.value_dtype)
@@ -0,0 +1,250 @@
+import os
+import json
+import hashlib
+import datetime as dt
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+import yfinance as yf
+
+from downloader import split_by_ticker
+
+# Offline stand-ins for the yfinance calls the pipeline makes, so it can run and be
+# benchmarked without network access. A fixture directory looks like:
+#   prices/<TICKER>.pkl           OHLCV bars (Date index)
+#   tickers/<TICKER>/info.json    Ticker.info
+#   tickers/<TICKER>/news.json    Ticker.news
+#   tickers/<TICKER>/<statement>.pkl for income_stmt, balance_sheet and cashflow
+# record_fixtures fills one from Yahoo Finance, synthetic_fixtures generates a deterministic
+# one, and use_fixtures replays it in place of yf.download and yf.Ticker.
+
+STATEMENTS = ("income_stmt", "balance_sheet", "cashflow")
+
+# More of the numeric fields a real Ticker.info has, so synthetic info is as wide as the real one
+INFO_NUMBERS = [
+    "previousClose", "open", "dayLow", "dayHigh", "dividendRate", "dividendYield", "exDividendDate",
+    "payoutRatio", "fiveYearAvgDividendYield", "volume", "averageVolume", "averageVolume10days",
+    "averageDailyVolume10Day", "fiftyTwoWeekLow", "fiftyTwoWeekHigh", "priceToSalesTrailing12Months",
+    "fiftyDayAverage", "twoHundredDayAverage", "trailingAnnualDividendRate", "trailingAnnualDividendYield",
+    "enterpriseValue", "floatShares", "sharesOutstanding", "sharesShort", "sharesShortPriorMonth",
+    "sharesPercentSharesOut", "heldPercentInsiders", "heldPercentInstitutions", "shortRatio",
+    "shortPercentOfFloat", "impliedSharesOutstanding", "bookValue", "lastFiscalYearEnd", "nextFiscalYearEnd",
+    "mostRecentQuarter", "earningsQuarterlyGrowth", "netIncomeToCommon", "trailingEps", "forwardEps",
+    "enterpriseToRevenue", "enterpriseToEbitda", "52WeekChange", "SandP52WeekChange", "lastDividendValue",
+    "targetHighPrice", "targetLowPrice", "targetMeanPrice", "targetMedianPrice", "recommendationMean",
+    "numberOfAnalystOpinions", "totalCash", "totalCashPerShare", "ebitda", "totalDebt", "quickRatio",
+    "currentRatio", "totalRevenue", "revenuePerShare", "returnOnAssets", "grossProfits", "freeCashflow",
+    "operatingCashflow", "earningsGrowth", "revenueGrowth", "grossMargins", "ebitdaMargins",
+    "operatingMargins", "fullTimeEmployees", "auditRisk", "boardRisk", "compensationRisk",
+    "shareHolderRightsRisk", "overallRisk", "fiftyDayAverageChange", "fiftyDayAverageChangePercent",
+    "twoHundredDayAverageChange", "twoHundredDayAverageChangePercent", "epsTrailingTwelveMonths",
+    "epsForward", "epsCurrentYear", "priceEpsCurrentYear", "regularMarketChange",
+    "regularMarketChangePercent", "regularMarketPrice", "averageAnalystRating",
+]
+INFO_TEXT = {"currency": "USD", "exchange": "NMS", "financialCurrency": "USD", "recommendationKey": "buy",
+             "longName": None, "quoteType": "EQUITY", "country": "United States"}
+
+
+def _prices_path(fixture_dir, ticker):
+    return os.path.join(fixture_dir, "prices", f"{ticker}.pkl")
+
+
+def _ticker_dir(fixture_dir, ticker):
+    return os.path.join(fixture_dir, "tickers", ticker)
+
+
+def _write_ticker(fixture_dir, ticker, info, news, statements):
+    ticker_dir = _ticker_dir(fixture_dir, ticker)
+    os.makedirs(ticker_dir, exist_ok=True)
+    with open(os.path.join(ticker_dir, "info.json"), "w") as f:
+        json.dump(info, f, default=str)
+    with open(os.path.join(ticker_dir, "news.json"), "w") as f:
+        json.dump(news, f, default=str)
+    for name, df in statements.items():
+        df.to_pickle(os.path.join(ticker_dir, f"{name}.pkl"))
+
+
+def _write_prices(fixture_dir, ticker, bars):
+    os.makedirs(os.path.join(fixture_dir, "prices"), exist_ok=True)
+    bars.to_pickle(_prices_path(fixture_dir, ticker))
+
+
+# Saves live yfinance responses for tickers into fixture_dir
+def record_fixtures(fixture_dir, tickers, years=5):
+    end = dt.date.today() + dt.timedelta(days=1)
+    start = end - dt.timedelta(days=years * 365 + 1)
+
+    bars = split_by_ticker(yf.download(tickers, start, end, progress=False), tickers)
+    for ticker, df in bars.items():
+        _write_prices(fixture_dir, ticker, df)
+
+    for ticker in tickers:
+        stock = yf.Ticker(ticker)
+        statements = {name: getattr(stock, name) for name in STATEMENTS}
+        _write_ticker(fixture_dir, ticker, stock.info, stock.news, statements)
+
+
+# Stable per-ticker seed, so the same ticker always gets the same synthetic data
+def _seed(ticker, seed):
+    return int(hashlib.sha256(f"{seed}:{ticker}".encode()).hexdigest()[:8], 16)
+
+
+# Writes deterministic synthetic fixtures: a random-walk price history ending yesterday
+# (as_of - 1 day), four annual statements, an info dict with the usual ratios and a few headlines
+def synthetic_fixtures(fixture_dir, tickers, years=5, seed=0, as_of=None, news_per_ticker=10):
+    as_of = pd.Timestamp(as_of or dt.date.today())
+    dates = pd.bdate_range(end=as_of - pd.Timedelta(days=1), periods=years * 252, name="Date")
+
+    for ticker in tickers:
+        rng = np.random.default_rng(_seed(ticker, seed))
+
+        close = 50 * np.exp(np.cumsum(rng.normal(0.0004, 0.02, len(dates))))
+        spread = np.abs(rng.normal(0, 0.01, len(dates)))
+        bars = pd.DataFrame({
+            "Close": close,
+            "High": close * (1 + spread),
+            "Low": close * (1 - spread),
+            "Open": close * (1 + rng.normal(0, 0.005, len(dates))),
+            "Volume": rng.integers(1_000_000, 50_000_000, len(dates)).astype(float),
+        }, index=dates)
+        _write_prices(fixture_dir, ticker, bars)
+
+        periods = [pd.Timestamp(as_of.year - i, 12, 31) for i in range(1, 5)]
+        revenue = 1e10 * rng.uniform(1, 10) * np.cumprod([1.0] + list(rng.uniform(0.85, 0.98, 3)))
+        income_stmt = pd.DataFrame({
+            "TotalRevenue": revenue,
+            "GrossProfit": revenue * rng.uniform(0.4, 0.7),
+            "OperatingIncome": revenue * rng.uniform(0.1, 0.35),
+            "NetIncome": revenue * rng.uniform(0.05, 0.25),
+            "DilutedEPS": rng.uniform(1, 10, 4),
+        }, index=periods).T
+        cashflow = pd.DataFrame({
+            "OperatingCashFlow": revenue * rng.uniform(0.15, 0.35),
+            "CapitalExpenditure": -revenue * rng.uniform(0.02, 0.1),
+            "FreeCashFlow": revenue * rng.uniform(0.05, 0.25),
+        }, index=periods).T
+        balance_sheet = pd.DataFrame({
+            "TotalAssets": revenue * rng.uniform(1, 3),
+            "TotalDebt": revenue * rng.uniform(0.1, 1),
+            "StockholdersEquity": revenue * rng.uniform(0.5, 1.5),
+            "CashAndCashEquivalents": revenue * rng.uniform(0.05, 0.5),
+        }, index=periods).T
+
+        info = {
+            "symbol": ticker,
+            "shortName": f"{ticker} Inc.",
+            "sector": "Technology",
+            "industry": "Software",
+            "currentPrice": round(float(close[-1]), 2),
+            "marketCap": float(close[-1] * rng.uniform(1e8, 1e10)),
+            "trailingPE": round(rng.uniform(10, 60), 2),
+            "forwardPE": round(rng.uniform(10, 50), 2),
+            "pegRatio": round(rng.uniform(0.5, 3), 2),
+            "priceToBook": round(rng.uniform(1, 20), 2),
+            "returnOnEquity": round(rng.uniform(0.05, 0.5), 4),
+            "profitMargins": round(rng.uniform(0.05, 0.4), 4),
+            "debtToEquity": round(rng.uniform(10, 200), 2),
+            "beta": round(rng.uniform(0.5, 2), 2),
+            "longBusinessSummary": f"{ticker} makes software.",
+            "city": "Cupertino",
+            "maxAge": 86400,
+        }
+        for key in INFO_NUMBERS:
+            info[key] = round(float(rng.lognormal(0, 2)), 4)
+        for key, value in INFO_TEXT.items():
+            info[key] = value or f"{ticker} Incorporated"
+
+        news = []
+        for i in range(news_per_ticker):
+            published = as_of - pd.Timedelta(hours=12 * i + 1)
+            news.append({
+                "uuid": f"{ticker}-{seed}-{i}",
+                "publisher": "Synthetic Wire",
+                "content": {
+                    "title": f"{ticker} headline {i}: {rng.choice(['beats', 'misses', 'meets'])} expectations",
+                    "pubDate": published.strftime("%Y-%m-%dT%H:%M:%SZ"),
+                    "canonicalUrl": {"url": f"https://example.com/{ticker.lower()}/{i}"},
+                },
+            })
+
+        _write_ticker(fixture_dir, ticker, info, news,
+                      {"income_stmt": income_stmt, "balance_sheet": balance_sheet, "cashflow": cashflow})
+
+
+# Replays a fixture directory's responses with the same interface as yf.Ticker
+# Unknown tickers return empty data, like yfinance does for symbols it can't find
+class FixtureTicker():
+    def __init__(self, fixture_dir, ticker):
+        self.ticker = ticker.upper()
+        self._dir = _ticker_dir(fixture_dir, self.ticker)
+
+    def _json(self, name, default):
+        path = os.path.join(self._dir, f"{name}.json")
+        if not os.path.exists(path):
+            return default
+        with open(path) as f:
+            return json.load(f)
+
+    def _frame(self, name):
+        path = os.path.join(self._dir, f"{name}.pkl")
+        return pd.read_pickle(path) if os.path.exists(path) else pd.DataFrame()
+
+    @property
+    def info(self):
+        return self._json("info", {})
+
+    @property
+    def news(self):
+        return self._json("news", [])
+
+    @property
+    def income_stmt(self):
+        return self._frame("income_stmt")
+
+    @property
+    def balance_sheet(self):
+        return self._frame("balance_sheet")
+
+    @property
+    def cashflow(self):
+        return self._frame("cashflow")
+
+
+# Returns a replacement for yf.download that serves bars from a fixture directory
+# The result has yfinance's (Price, Ticker) columns, and end is exclusive like yfinance's
+def fixture_download(fixture_dir):
+    def download(tickers, start=None, end=None, **kwargs):
+        tickers = tickers.split() if isinstance(tickers, str) else list(tickers)
+
+        frames = {}
+        for ticker in tickers:
+            path = _prices_path(fixture_dir, ticker.upper())
+            if not os.path.exists(path):
+                continue
+            bars = pd.read_pickle(path)
+            if start is not None:
+                bars = bars[bars.index >= pd.Timestamp(start)]
+            if end is not None:
+                bars = bars[bars.index < pd.Timestamp(end)]
+            frames[ticker] = bars
+
+        if not frames:
+            return pd.DataFrame()
+        df = pd.concat(frames, axis=1, names=["Ticker", "Price"]).swaplevel(axis=1).sort_index(axis=1)
+        df.index.name = "Date"
+        return df
+
+    return download
+
+
+# Replaces yf.download and yf.Ticker with fixture replays for the duration of the block
+@contextmanager
+def use_fixtures(fixture_dir):
+    original = yf.download, yf.Ticker
+    yf.download = fixture_download(fixture_dir)
+    yf.Ticker = lambda ticker, *args, **kwargs: FixtureTicker(fixture_dir, ticker)
+    try:
+        yield fixture_dir
+    finally:
+        yf.download, yf.Ticker = original
@@ -0,0 +1,238 @@
+import re
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+# Compact descriptions of a DataFrame for the PandasQueryEngine prompt, in place of print(df.head())
+# A summary lists the shape, the index, and each column's dtype and range (or its distinct values),
+# then a few rows. Per-column statistics are computed once per frame. When the frame is wide, only
+# the columns that match the query's words get full detail; the rest are listed by name.
+#
+#   summary = FrameSummary(metrics_df)
+#   summary.describe("What's the P/E ratio?")
+
+# Words that say nothing about which columns a query needs
+# (including generic ones like "ratio" or "current" that appear in many column names)
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "calculate", "compare", "compared", "current", "data", "did",
+    "do", "does", "for", "from", "get", "has", "have", "how", "in", "is", "it", "its", "last", "latest", "me",
+    "now", "of", "on", "or", "over", "rate", "ratio", "ratios", "recent", "show", "stock", "than", "that", "the",
+    "this", "to", "total", "value", "values", "was", "what", "when", "which", "with", "year", "years",
+}
+
+# Query words that should also match differently named columns or values
+SYNONYMS = {
+    "pe": ["pe"],
+    "price": ["price", "close"],
+    "prices": ["price", "close"],
+    "sales": ["revenue"],
+    "earnings": ["income", "eps", "earnings"],
+    "profit": ["income", "profit", "margins"],
+    "margin": ["margin", "margins", "profit"],
+    "debt": ["debt", "liabilities"],
+    "leverage": ["debt", "equity"],
+    "valuation": ["pe", "book", "peg", "enterprise", "value", "cap"],
+    "volatility": ["close", "volatility", "beta"],
+    "risk": ["beta", "volatility", "drawdown"],
+    "dividend": ["dividend", "yield", "payout"],
+    "cash": ["cash", "flow"],
+    "growth": ["growth", "revenue", "income"],
+    "momentum": ["rsi", "macd", "return"],
+    "trend": ["sma", "ema", "close"],
+}
+
+
+# Splits a name like "trailingPE", "IS_TotalRevenue" or "52WeekChange" into lowercase words
+def name_words(name):
+    name = re.sub(r"([a-z0-9])([A-Z])", r"\1 \2", str(name))
+    name = re.sub(r"([A-Z]+)([A-Z][a-z])", r"\1 \2", name)
+    return set(re.findall(r"[a-z0-9]+", name.lower()))
+
+
+# The words of a query worth matching against column names and values, with their synonyms
+def query_words(query):
+    query = (query or "").lower().replace("p/e", "pe").replace("p/b", "price book")
+    words = set()
+    for word in re.findall(r"[a-z0-9]+", query):
+        if word in STOPWORDS or len(word) < 2:
+            continue
+        words.add(word)
+        words.update(SYNONYMS.get(word, ()))
+    return words
+
+
+# How well a name matches the query words: exact word matches, plus prefixes like "margin" ~ "margins"
+def relevance(words, name):
+    score = 0
+    for part in name_words(name):
+        if part in words:
+            score += 2
+        elif len(part) >= 4 and any(len(word) >= 4 and (part.startswith(word) or word.startswith(part))
+                                    for word in words):
+            score += 1
+    return score
+
+
+def _format_value(value):
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return "NaN"
+    if isinstance(value, (float, np.floating)):
+        return f"{value:.6g}"
+    if isinstance(value, pd.Timestamp):
+        return value.strftime("%Y-%m-%d") if value == value.normalize() else str(value)
+    text = str(value)
+    return text if len(text) <= 40 else text[:37] + "..."
+
+
+# Describes one frame; statistics are computed on first use and reused for every query
+class FrameSummary():
+    # max_columns is how many columns get full detail, max_values how many distinct values of a text
+    # column are listed, rows how many example rows are shown
+    def __init__(self, df, max_columns=12, max_values=25, rows=3, max_other_chars=600, cache_size=64):
+        self.df = df
+        self.max_columns = max_columns
+        self.max_values = max_values
+        self.rows = rows
+        self.max_other_chars = max_other_chars
+        self.cache_size = cache_size
+
+        self._columns = None  # column -> (description line, distinct values or None)
+        self._descriptions = OrderedDict()  # query words -> text, most recently used last
+        self._lock = threading.Lock()
+
+    def _column_stats(self):
+        if self._columns is not None:
+            return self._columns
+
+        columns = {}
+        for name in self.df.columns:
+            series = self.df[name]
+            dtype = str(series.dtype)
+            present = series.dropna()
+            values = None
+
+            if present.empty:
+                detail = "all missing"
+            elif len(self.df) == 1:
+                detail = f"= {_format_value(present.iloc[0])}"
+            elif pd.api.types.is_bool_dtype(series):
+                detail = f"{int(present.sum())} true of {len(present)}"
+            elif pd.api.types.is_numeric_dtype(series) or pd.api.types.is_datetime64_any_dtype(series):
+                detail = f"{_format_value(present.min())} to {_format_value(present.max())}"
+            else:
+                counts = present.astype(str).value_counts(sort=False)
+                values = list(counts.index)
+                detail = f"{len(values)} distinct"
+
+            missing = len(series) - len(present)
+            if missing and len(self.df) > 1:
+                detail += f", {missing} missing"
+            columns[name] = (f"{name} ({dtype}): {detail}", values)
+
+        self._columns = columns
+        return columns
+
+    def _index_line(self):
+        index = self.df.index
+        if isinstance(index, pd.RangeIndex):
+            return None
+        name = index.name or "index"
+        if isinstance(index, pd.DatetimeIndex) and len(index):
+            return f"Index: {name} (datetime), {_format_value(index.min())} to {_format_value(index.max())}"
+        return f"Index: {name} ({index.dtype})"
+
+    # Columns worth full detail for the query: the best matches, plus two text columns that identify
+    # rows (e.g. symbol). Narrow frames keep every column, and wide ones with no match their first ones.
+    def select_columns(self, words):
+        columns = list(self.df.columns)
+        if len(columns) <= self.max_columns:
+            return columns
+
+        scores = {name: relevance(words, name) for name in columns}
+        matched = sorted((name for name in columns if scores[name]), key=lambda name: -scores[name])
+        if not matched:
+            return columns[:self.max_columns]
+
+        # A couple of identifying columns (e.g. symbol, shortName) help read any answer
+        keys = [name for name in columns if not scores[name] and not pd.api.types.is_numeric_dtype(self.df[name])]
+        keys = keys[:2]
+        return matched[:self.max_columns - len(keys)] + keys
+
+    # Distinct values of a text column that match the query, then others, up to max_values
+    def _select_values(self, values, words):
+        scored = [(relevance(words, value), i) for i, value in enumerate(values)]
+        matched = [values[i] for score, i in sorted(scored, key=lambda item: (-item[0], item[1])) if score]
+        matched_set = set(matched)
+        rest = [value for value in values if value not in matched_set]
+        return (matched + rest)[:self.max_values], matched
+
+    def _example_rows(self, columns, filters):
+        df = self.df[columns]
+        for name, values in filters.items():
+            subset = df[df[name].astype(str).isin(values)]
+            if not subset.empty:
+                df = subset
+                break
+
+        if isinstance(df.index, pd.DatetimeIndex) or "Date" in df.columns:
+            df = df.sort_index() if "Date" not in df.columns else df.sort_values("Date", kind="stable")
+            rows = df.tail(self.rows)
+        else:
+            rows = df.head(self.rows)
+
+        with pd.option_context("display.max_columns", None, "display.width", None, "display.max_colwidth", 40):
+            return rows.to_string(float_format=lambda value: f"{value:.6g}")
+
+    def _render(self, words):
+        columns = self.select_columns(words)
+        stats = self._column_stats()
+
+        lines = [f"{len(self.df)} rows x {len(self.df.columns)} columns"]
+        index_line = self._index_line()
+        if index_line:
+            lines.append(index_line)
+
+        lines.append("Columns:")
+        filters = {}
+        for name in columns:
+            line, values = stats[name]
+            if values is not None:
+                shown, matched = self._select_values(values, words)
+                more = f", +{len(values) - len(shown)} more" if len(values) > len(shown) else ""
+                line += f": {', '.join(shown)}{more}"
+                if matched:
+                    filters[name] = matched[:self.max_values]
+            lines.append(f"- {line}")
+
+        selected = set(columns)
+        others = [str(name) for name in self.df.columns if name not in selected]
+        if others:
+            listed = ", ".join(others)
+            if len(listed) > self.max_other_chars:
+                listed = listed[:self.max_other_chars].rsplit(", ", 1)[0] + ", ..."
+            lines.append(f"Other columns ({len(others)}): {listed}")
+
+        if len(self.df) > 1:
+            label = "Matching rows" if filters else "Example rows"
+            lines.append(f"{label}:")
+            lines.append(self._example_rows(columns, filters))
+
+        return "\n".join(lines)
+
+    # The summary for a query; queries with the same relevant words share one cached text
+    def describe(self, query=""):
+        words = frozenset(query_words(query))
+        with self._lock:
+            cached = self._descriptions.get(words)
+            if cached is not None:
+                self._descriptions.move_to_end(words)
+                return cached
+
+        text = self._render(words)
+        with self._lock:
+            self._descriptions[words] = text
+            while len(self._descriptions) > self.cache_size:
+                self._descriptions.popitem(last=False)
+        return text
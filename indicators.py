@@ -0,0 +1,264 @@
+import numpy as np
+import pandas as pd
+
+# Rolling window lengths used by the indicators below
+SMA_WINDOWS = (20, 50, 200)
+BOLLINGER_WINDOW = 20
+BOLLINGER_WIDTH = 2
+RSI_PERIOD = 14
+ATR_PERIOD = 14
+MACD_FAST, MACD_SLOW, MACD_SIGNAL = 12, 26, 9
+BETA_WINDOW = 60
+
+# Longest lookback any rolling indicator needs, plus one row for the previous close
+LOOKBACK = max(SMA_WINDOWS + (BOLLINGER_WINDOW, BETA_WINDOW)) + 1
+
+# Recent bars whose revision (e.g. the session in progress, or the days a price refresh downloads
+# again) is recomputed from the revised bar on; older revisions recompute everything
+REVISABLE_BARS = 20
+
+INDICATORS = [
+    "sma_20", "sma_50", "sma_200", "ema_12", "ema_26",
+    "macd", "macd_signal", "macd_hist", "rsi_14",
+    "bb_upper", "bb_lower", "atr_14", "drawdown",
+    f"beta_{BETA_WINDOW}", f"corr_{BETA_WINDOW}",
+]
+
+
+# Exponential moving average down the rows of a (dates x tickers) array, all tickers at once
+# prev seeds the recursion with the last EMA row so new bars can be added without recomputing
+# history; tickers with no value yet start from their first observation, and NaN bars carry
+# the previous EMA forward.
+def ema(values, alpha, prev=None):
+    out = np.empty_like(values)
+    current = np.full(values.shape[1], np.nan) if prev is None else prev.copy()
+
+    for i, row in enumerate(values):
+        updated = alpha * row + (1 - alpha) * current
+        current = np.where(np.isnan(current), row, np.where(np.isnan(row), current, updated))
+        out[i] = current
+
+    return out
+
+
+# Rolling sum over the rows of a 2-D array from cumulative sums, NaN if the window has a gap
+def rolling_sum(values, window):
+    valid = ~np.isnan(values)
+    zero = np.zeros((1, values.shape[1]))
+    sums = np.vstack([zero, np.cumsum(np.where(valid, values, 0.0), axis=0)])
+    counts = np.vstack([zero, np.cumsum(valid, axis=0)])
+
+    out = np.full(values.shape, np.nan)
+    window_sums = sums[window:] - sums[:-window]
+    full = (counts[window:] - counts[:-window]) == window
+    out[window - 1:] = np.where(full, window_sums, np.nan)
+    return out
+
+
+def rolling_mean(values, window):
+    return rolling_sum(values, window) / window
+
+
+# Sample variance over a rolling window
+def rolling_var(values, window):
+    # Centring each column first keeps the sum-of-squares formula numerically stable
+    with np.errstate(invalid="ignore"):
+        centred = values - np.nanmean(values, axis=0)
+    mean = rolling_mean(centred, window)
+    return (rolling_mean(centred ** 2, window) - mean ** 2) * window / (window - 1)
+
+
+# Vectorized technical indicators over a (Price, Ticker) panel such as get_historical_prices returns
+# Every indicator is a (dates x tickers) frame computed with whole-array operations, so
+# the cost does not grow with a Python loop per ticker. update() only computes the bars
+# that were appended or revised since the last call, reusing the EMA state and a short lookback tail.
+class IndicatorEngine():
+    # benchmark is the ticker beta/correlation are measured against; if it is not in the
+    # panel, the equal-weighted average return of the panel is used instead
+    def __init__(self, benchmark="SPY"):
+        self.benchmark = benchmark
+        self._chunks = {}  # indicator name -> DataFrames (Date x Ticker) appended by each update
+        self._tail = None  # last LOOKBACK + REVISABLE_BARS rows of (close, high, low)
+        self._state = {}   # EMA rows and running peak from the last computed bar
+        self._state_rows = {}  # The same for every row of the tail, to resume from before a revised bar
+
+    @property
+    def tickers(self):
+        return list(self._chunks["drawdown"][-1].columns) if self._chunks else []
+
+    @property
+    def first_date(self):
+        return self._chunks["drawdown"][0].index[0] if self._chunks else None
+
+    @property
+    def last_date(self):
+        return self._chunks["drawdown"][-1].index[-1] if self._chunks else None
+
+    # Returns one indicator as a (Date x Ticker) frame
+    # Appended chunks are only concatenated when read, so small updates stay cheap
+    def result(self, name):
+        chunks = self._chunks[name]
+        if len(chunks) > 1:
+            chunks[:] = [pd.concat(chunks)]
+        return chunks[0]
+
+    @property
+    def results(self):
+        return {name: self.result(name) for name in self._chunks}
+
+    # Brings the indicators up to date with a panel
+    # Recomputes everything when the tickers change or history was added before the first
+    # computed bar. Recent bars the panel has revised (or added or dropped) are computed again from
+    # the first revised one, then the new bars are computed and appended.
+    def update(self, panel):
+        close, high, low = panel["Close"], panel["High"], panel["Low"]
+
+        if self._chunks and list(close.columns) == self.tickers and close.index[0] >= self.first_date:
+            revised = self._first_revised(close, high, low)
+            if revised is not None and not self._rewind(revised):
+                self._reset()
+        else:
+            self._reset()
+
+        new = close.index if not self._chunks else close.index[close.index > self.last_date]
+
+        if len(new) == 0:
+            return self
+
+        rows = self._compute(close.loc[new], high.loc[new], low.loc[new])
+
+        for name, frame in rows.items():
+            self._chunks.setdefault(name, []).append(frame)
+        return self
+
+    def _reset(self):
+        self._chunks, self._tail, self._state, self._state_rows = {}, None, {}, {}
+
+    # The first date in the tail's span where the panel's bars differ from the ones computed from,
+    # or None if the panel only adds bars after the last computed one
+    def _first_revised(self, close, high, low):
+        start = max(self._tail[0].index[0], close.index[0])
+        cached_dates = self._tail[0].index[self._tail[0].index >= start]
+        current_dates = close.index[(close.index >= start) & (close.index <= self.last_date)]
+        dates = cached_dates if cached_dates.equals(current_dates) else cached_dates.union(current_dates)
+
+        differs = np.zeros(len(dates), dtype=bool)
+        for cached, current in zip(self._tail, (close, high, low)):
+            a = cached.reindex(dates).to_numpy(dtype=np.float64)
+            b = current.reindex(dates).to_numpy(dtype=np.float64)
+            differs |= ~((a == b) | (np.isnan(a) & np.isnan(b))).all(axis=1)
+        return dates[differs][0] if differs.any() else None
+
+    # Drops the results from date on and restores the state of the bar before it
+    # Returns False if the tail doesn't reach far enough back to resume from there
+    def _rewind(self, date):
+        keep = self._tail[0].index.searchsorted(date)
+        if keep < LOOKBACK:
+            return False
+
+        for name in self._chunks:
+            frame = self.result(name)
+            self._chunks[name] = [frame[frame.index < date]]
+        self._tail = tuple(frame.iloc[:keep] for frame in self._tail)
+        self._state_rows = {key: rows[:keep] for key, rows in self._state_rows.items()}
+        self._state = {key: rows[-1] for key, rows in self._state_rows.items()}
+        return True
+
+    def _compute(self, close, high, low):
+        tickers, dates = close.columns, close.index
+        n_new = len(dates)
+
+        # Prepend the lookback tail so rolling windows and the previous close span the boundary
+        if self._tail is not None:
+            close_all = pd.concat([self._tail[0], close])
+            high_all = pd.concat([self._tail[1], high])
+            low_all = pd.concat([self._tail[2], low])
+        else:
+            close_all, high_all, low_all = close, high, low
+        tail_rows = LOOKBACK + REVISABLE_BARS
+        self._tail = (close_all.iloc[-tail_rows:], high_all.iloc[-tail_rows:], low_all.iloc[-tail_rows:])
+
+        c = close_all.to_numpy(dtype=np.float64)
+        h = high_all.to_numpy(dtype=np.float64)
+        l = low_all.to_numpy(dtype=np.float64)
+        prev_c = np.vstack([np.full((1, c.shape[1]), np.nan), c[:-1]])
+        new_c = c[-n_new:]
+
+        out = {}
+
+        def frame(values):
+            return pd.DataFrame(values[-n_new:], index=dates, columns=tickers)
+
+        # Simple moving averages and Bollinger bands
+        for window in SMA_WINDOWS:
+            out[f"sma_{window}"] = frame(rolling_mean(c, window))
+        middle = out[f"sma_{BOLLINGER_WINDOW}"].to_numpy()
+        std = np.sqrt(np.fmax(rolling_var(c, BOLLINGER_WINDOW), 0))[-n_new:]
+        out["bb_upper"] = frame(middle + BOLLINGER_WIDTH * std)
+        out["bb_lower"] = frame(middle - BOLLINGER_WIDTH * std)
+
+        # EMAs and MACD, continuing from the previous EMA rows
+        state = self._state
+        ema_fast = ema(new_c, 2 / (MACD_FAST + 1), state.get("ema_fast"))
+        ema_slow = ema(new_c, 2 / (MACD_SLOW + 1), state.get("ema_slow"))
+        macd = ema_fast - ema_slow
+        signal = ema(macd, 2 / (MACD_SIGNAL + 1), state.get("macd_signal"))
+        out["ema_12"], out["ema_26"] = frame(ema_fast), frame(ema_slow)
+        out["macd"], out["macd_signal"], out["macd_hist"] = frame(macd), frame(signal), frame(macd - signal)
+
+        # RSI with Wilder smoothing
+        change = (c - prev_c)[-n_new:]
+        gain = ema(np.where(np.isnan(change), np.nan, np.fmax(change, 0)), 1 / RSI_PERIOD, state.get("avg_gain"))
+        loss = ema(np.where(np.isnan(change), np.nan, np.fmax(-change, 0)), 1 / RSI_PERIOD, state.get("avg_loss"))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            rsi = np.where(loss == 0, 100.0, 100 - 100 / (1 + gain / loss))
+        out["rsi_14"] = frame(np.where(np.isnan(gain), np.nan, rsi))
+
+        # Average true range with Wilder smoothing
+        true_range = np.fmax(h - l, np.fmax(np.abs(h - prev_c), np.abs(l - prev_c)))[-n_new:]
+        atr = ema(true_range, 1 / ATR_PERIOD, state.get("atr"))
+        out["atr_14"] = frame(atr)
+
+        # Drawdown from the running peak
+        peak_start = state.get("peak", np.full(c.shape[1], np.nan))
+        peak = np.fmax.accumulate(np.vstack([peak_start, new_c]), axis=0)[1:]
+        out["drawdown"] = frame(new_c / peak - 1)
+
+        # Rolling beta and correlation of daily returns against the benchmark
+        with np.errstate(divide="ignore", invalid="ignore"):
+            returns = c / prev_c - 1
+            if self.benchmark in tickers:
+                market = returns[:, tickers.get_loc(self.benchmark)]
+            else:
+                market = np.nanmean(returns, axis=1)
+
+        # Only days where both the ticker and the market have a return count
+        both = ~np.isnan(returns) & ~np.isnan(market)[:, None]
+        r = np.where(both, returns, np.nan)
+        m = np.where(both, market[:, None], np.nan)
+
+        w = BETA_WINDOW
+        cov = (rolling_mean(r * m, w) - rolling_mean(r, w) * rolling_mean(m, w)) * w / (w - 1)
+        var_r, var_m = rolling_var(r, w), rolling_var(m, w)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            out[f"beta_{BETA_WINDOW}"] = frame(cov / var_m)
+            out[f"corr_{BETA_WINDOW}"] = frame(cov / np.sqrt(var_r * var_m))
+
+        rows = {"ema_fast": ema_fast, "ema_slow": ema_slow, "macd_signal": signal,
+                "avg_gain": gain, "avg_loss": loss, "atr": atr, "peak": peak}
+        for key, values in rows.items():
+            if key in self._state_rows:
+                values = np.vstack([self._state_rows[key], values])
+            self._state_rows[key] = values[-len(self._tail[0]):]
+        self._state = {key: values[-1] for key, values in self._state_rows.items()}
+        return out
+
+    # Returns all indicators for one ticker as a (Date x indicator) frame
+    def for_ticker(self, ticker):
+        if ticker not in self.tickers:
+            raise KeyError(f"No indicators computed for {ticker}")
+        return pd.DataFrame({name: self.result(name)[ticker] for name in INDICATORS})
+
+    # Returns the latest value of every indicator as a (Ticker x indicator) frame
+    def latest(self):
+        return pd.DataFrame({name: self._chunks[name][-1].iloc[-1] for name in INDICATORS})
@@ -0,0 +1,627 @@
+import json
+import time
+import random
+import asyncio
+import hashlib
+import logging
+import itertools
+import threading
+import contextlib
+import concurrent.futures
+from collections import deque
+from typing import Any
+
+import numpy as np
+
+from llama_index.core.llms.function_calling import FunctionCallingLLM
+
+from tracing import current_span
+
+# One gateway per LLM provider, shared by every agent in the process (gateway_for), between the
+# agents' LLM calls and the provider:
+#   - one pooled HTTP client per provider, so connections are kept alive and reused across agents
+#   - at most max_concurrency requests in flight; the rest wait their turn in arrival order
+#   - token buckets sized to the provider's requests and input tokens per minute, so bursts wait
+#     here instead of coming back as 429s
+#   - identical concurrent requests (same messages, tools and options) share one provider call
+#   - rate limits, overloads, 5xx and connection errors are retried with exponential backoff and
+#     full jitter; a Retry-After from the provider pauses the whole bucket, not just that request
+#   - stats(): requests, provider calls, coalesced, retries, queue depth and latency percentiles
+#
+#   llm = gateway_for("anthropic").llm("claude-sonnet-4-5-20250929")   # a LlamaIndex LLM
+#   llm.gateway.stats()
+
+# Default limits per provider - the lowest paid tiers; configure() them to your account's limits
+# Requests are charged their estimated input tokens (output tokens aren't modelled)
+PROVIDER_LIMITS = {
+    "anthropic": {"max_concurrency": 8, "requests_per_minute": 50, "tokens_per_minute": 30000},
+    "openai": {"max_concurrency": 16, "requests_per_minute": 500, "tokens_per_minute": 30000},
+}
+
+# Provider responses worth retrying: timeouts, conflicts, rate limits, server errors and overloads
+RETRY_STATUSES = {408, 409, 429, 500, 502, 503, 504, 529}
+
+# Connection-level errors of the provider SDKs and their HTTP clients, by class name
+RETRY_ERRORS = {"APIConnectionError", "TransportError"}
+
+# Requests kept for the latency percentiles
+STATS_WINDOW = 1000
+
+# Attributes of a provider LLM that change its answers; requests only share a call if these match
+SETTINGS = ("base_url", "api_base", "temperature", "max_tokens", "top_p", "top_k", "additional_kwargs",
+            "reasoning_effort", "thinking_dict", "system_prompt")
+
+
+def provider_for(model):
+    return "anthropic" if model.startswith("claude") else "openai"
+
+
+# Refills at rate_per_minute units a minute up to capacity (a minute's worth by default)
+class TokenBucket():
+    def __init__(self, rate_per_minute, capacity=None):
+        self.rate_per_minute = rate_per_minute
+        self.rate = rate_per_minute / 60
+        self.capacity = capacity or rate_per_minute
+        self._level = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._level = min(self.capacity, self._level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    # Takes amount units and returns the seconds to wait before using them
+    # The level can go below zero, so later callers also wait for what earlier ones took, in order
+    def reserve(self, amount):
+        with self._lock:
+            self._refill(time.monotonic())
+            self._level -= amount
+            return max(0.0, -self._level / self.rate)
+
+    # Lets nothing through for the next `seconds`
+    def pause(self, seconds):
+        with self._lock:
+            self._refill(time.monotonic())
+            self._level = min(self._level, -seconds * self.rate)
+
+
+# Counting semaphore usable from threads and event loops alike, handed out in arrival order
+class Slots():
+    def __init__(self, limit):
+        self.limit = limit
+        self.used = 0
+        self._waiters = deque()  # A concurrent.futures.Future per caller waiting for a slot
+        self._lock = threading.Lock()
+
+    @property
+    def waiting(self):
+        return len(self._waiters)
+
+    # Takes a free slot, or returns a future that is resolved when one is handed over
+    def _take(self):
+        with self._lock:
+            if self.used < self.limit and not self._waiters:
+                self.used += 1
+                return None
+            waiter = concurrent.futures.Future()
+            self._waiters.append(waiter)
+            return waiter
+
+    def acquire(self):
+        waiter = self._take()
+        if waiter is not None:
+            waiter.result()
+
+    async def aacquire(self):
+        waiter = self._take()
+        if waiter is None:
+            return
+        try:
+            await asyncio.wrap_future(waiter)
+        except asyncio.CancelledError:
+            with self._lock:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                    raise
+            self.release()  # The slot was handed over just as the caller was cancelled
+            raise
+
+    def release(self):
+        with self._lock:
+            while self._waiters:
+                waiter = self._waiters.popleft()
+                if waiter.set_running_or_notify_cancel():
+                    waiter.set_result(None)  # The slot passes straight to the next caller
+                    return
+            self.used -= 1
+
+
+# Raised to the callers sharing a request whose caller went away before it finished; they send their own
+class _Abandoned(Exception):
+    pass
+
+
+def _status(error):
+    status = getattr(error, "status_code", None)
+    return status if status is not None else getattr(getattr(error, "response", None), "status_code", None)
+
+
+def _retry_after(error):
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    try:
+        return float(headers.get("retry-after")) if headers is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _retryable(error):
+    if isinstance(error, (TimeoutError, ConnectionError)) or _status(error) in RETRY_STATUSES:
+        return True
+    return any(cls.__name__ in RETRY_ERRORS for cls in type(error).__mro__)
+
+
+# A response handed to a caller that shared another's request, so callers never share a mutable message
+def _copy(response):
+    message = getattr(response, "message", None)
+    if message is not None:
+        return response.model_copy(update={"message": message.model_copy(deep=True)})
+    return response.model_copy()
+
+
+class LLMGateway():
+    # provider is "anthropic" or "openai"; limits left out default to PROVIDER_LIMITS[provider]
+    # retries is how many times a failed request is retried; the n-th retry waits a random time of
+    # up to backoff * 2**n seconds (at most max_backoff), or the provider's Retry-After if longer
+    def __init__(self, provider, max_concurrency=None, requests_per_minute=None, tokens_per_minute=None,
+                 retries=4, backoff=1.0, max_backoff=30.0):
+        limits = PROVIDER_LIMITS.get(provider, {})
+        self.provider = provider
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self._slots = Slots(max_concurrency or limits.get("max_concurrency", 8))
+        self._requests = self._tokens = None
+        self.configure(requests_per_minute=requests_per_minute or limits.get("requests_per_minute"),
+                       tokens_per_minute=tokens_per_minute or limits.get("tokens_per_minute"))
+
+        self._clients = None  # (sync, async) pooled HTTP clients, created with the first LLM
+        self._inflight = {}  # Request key -> concurrent.futures.Future of the response, while it runs
+        self._lock = threading.Lock()
+        self._counters = {"requests": 0, "provider_calls": 0, "coalesced": 0, "retries": 0, "rate_limited": 0,
+                          "failed": 0, "throttled_seconds": 0.0}
+        self._queued = 0
+        self._max_queued = 0
+        self._in_flight = 0
+        self._latency = deque(maxlen=STATS_WINDOW)
+        self._queue_wait = deque(maxlen=STATS_WINDOW)
+
+    # Changes the limits of a running gateway (e.g. to the account's tier); options left out are unchanged
+    def configure(self, max_concurrency=None, requests_per_minute=None, tokens_per_minute=None):
+        if max_concurrency:
+            self._slots.limit = max_concurrency
+        if requests_per_minute:
+            self._requests = TokenBucket(requests_per_minute)
+        if tokens_per_minute:
+            self._tokens = TokenBucket(tokens_per_minute)
+        return self
+
+    @property
+    def max_concurrency(self):
+        return self._slots.limit
+
+    # A LlamaIndex LLM for `model` on this gateway's provider, using the shared connection pool
+    # base_url points the client at another endpoint (e.g. stubs.FakeProvider); kwargs go to the LLM class
+    def llm(self, model, base_url=None, **kwargs):
+        if self.provider == "anthropic":
+            import anthropic as sdk
+            from llama_index.llms.anthropic import Anthropic
+
+            client, aclient = self._http_clients(sdk)
+            llm = Anthropic(model=model, base_url=base_url, max_retries=0, **kwargs)
+            # LlamaIndex's Anthropic has no http_client option, so its SDK clients are copied onto the pool
+            llm._client = llm._client.with_options(http_client=client)
+            llm._aclient = llm._aclient.with_options(http_client=aclient)
+        elif self.provider == "openai":
+            import openai as sdk
+            from llama_index.llms.openai import OpenAI
+
+            client, aclient = self._http_clients(sdk)
+            llm = OpenAI(model=model, api_base=base_url, max_retries=0, http_client=client,
+                         async_http_client=aclient, **kwargs)
+        else:
+            raise ValueError(f"Unknown LLM provider {self.provider!r}; choose from {', '.join(PROVIDER_LIMITS)}")
+        return GatewayLLM(llm=llm, gateway=self)
+
+    # The provider SDK's own HTTP client classes (its default timeouts and headers), keeping max_concurrency
+    # connections alive instead of the SDK's 1000-connection pool. The slack lets a new request go
+    # out while the connection of a stream its caller abandoned is still being closed.
+    def _http_clients(self, sdk):
+        with self._lock:
+            if self._clients is None:
+                size = self.max_concurrency
+                limits = type(sdk.DEFAULT_CONNECTION_LIMITS)(max_connections=size * 2, max_keepalive_connections=size)
+                self._clients = (sdk.DefaultHttpxClient(limits=limits), sdk.DefaultAsyncHttpxClient(limits=limits))
+            return self._clients
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._counters[name] += amount
+
+    # Seconds to wait before a request of `tokens` estimated input tokens may be sent
+    def _reserve(self, tokens):
+        delay = 0.0
+        if self._requests is not None:
+            delay = self._requests.reserve(1)
+        if self._tokens is not None:
+            delay = max(delay, self._tokens.reserve(tokens))
+        if delay:
+            self._count("throttled_seconds", delay)
+        return delay
+
+    def _enqueue(self, amount=1):
+        with self._lock:
+            self._queued += amount
+            self._max_queued = max(self._max_queued, self._queued)
+        return time.monotonic()
+
+    # Called once a request has its slot and rate budget; returns when the provider call starts
+    def _start(self, queued_at):
+        with self._lock:
+            self._queued -= 1
+            self._in_flight += 1
+            self._counters["provider_calls"] += 1
+            self._queue_wait.append(time.monotonic() - queued_at)
+            current_span().set("llm_queue_seconds", round(time.monotonic() - queued_at, 3))
+        return time.monotonic()
+
+    # Waits in line for a slot and for the rate budget; returns when the provider call starts
+    def _acquire(self, tokens):
+        queued_at = self._enqueue()
+        self._slots.acquire()
+        time.sleep(self._reserve(tokens))
+        return self._start(queued_at)
+
+    async def _aacquire(self, tokens):
+        queued_at = self._enqueue()
+        try:
+            await self._slots.aacquire()
+        except BaseException:
+            self._enqueue(-1)
+            raise
+        try:
+            await asyncio.sleep(self._reserve(tokens))
+        except BaseException:
+            self._enqueue(-1)
+            self._slots.release()
+            raise
+        return self._start(queued_at)
+
+    def _end(self, started=None):
+        with self._lock:
+            self._in_flight -= 1
+            if started is not None:
+                self._latency.append(time.monotonic() - started)
+        self._slots.release()
+
+    # Decides what to do about a failed provider call: returns the seconds to wait before retrying,
+    # or None to give up
+    def _failed(self, error, attempt):
+        status = _status(error)
+        retry_after = _retry_after(error)
+        if status == 429:
+            self._count("rate_limited")
+            if retry_after and self._requests is not None:
+                self._requests.pause(retry_after)
+        if attempt is None or attempt >= self.retries or not _retryable(error):
+            self._count("failed")
+            return None
+
+        self._count("retries")
+        delay = max(random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt)), retry_after or 0)
+        logging.warning(f"LLM request failed ({status or type(error).__name__}), retry {attempt + 1} "
+                        f"of {self.retries} in {delay:.1f}s")
+        return delay
+
+    # Joins the request already running under `key`, or registers this caller to run it
+    # Returns (future of the response, whether this caller runs it)
+    def _join(self, key):
+        with self._lock:
+            self._counters["requests"] += 1
+            future = self._inflight.get(key)
+            if future is not None:
+                self._counters["coalesced"] += 1
+                return future, False
+            future = self._inflight[key] = concurrent.futures.Future()
+            return future, True
+
+    def _finish(self, key, future, result=None, error=None):
+        with self._lock:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+        if error is not None:
+            future.set_exception(error if isinstance(error, Exception) else _Abandoned())
+        else:
+            future.set_result(result)
+
+    # Sends call() (a provider request) through the gateway, or shares the response of an identical one
+    # already running; key identifies the request and tokens is its estimated input size
+    def call(self, key, tokens, call):
+        while True:
+            future, leader = self._join(key)
+            if leader:
+                break
+            try:
+                return _copy(future.result())
+            except _Abandoned:
+                continue
+
+        try:
+            result = self._send(tokens, call)
+        except BaseException as e:
+            self._finish(key, future, error=e)
+            raise
+        self._finish(key, future, result)
+        return result
+
+    def _send(self, tokens, call):
+        for attempt in itertools.count():
+            started = self._acquire(tokens)
+            try:
+                result = call()
+            except Exception as e:
+                self._end()
+                delay = self._failed(e, attempt)
+                if delay is None:
+                    raise
+            except BaseException:
+                self._end()
+                raise
+            else:
+                self._end(started)
+                return result
+            time.sleep(delay)
+
+    # call() as a coroutine function
+    async def acall(self, key, tokens, call):
+        while True:
+            future, leader = self._join(key)
+            if leader:
+                break
+            try:
+                # Shielded, so a follower that is cancelled doesn't cancel the shared future
+                return _copy(await asyncio.shield(asyncio.wrap_future(future)))
+            except _Abandoned:
+                continue
+
+        try:
+            result = await self._asend(tokens, call)
+        except BaseException as e:
+            self._finish(key, future, error=e)
+            raise
+        self._finish(key, future, result)
+        return result
+
+    async def _asend(self, tokens, call):
+        for attempt in itertools.count():
+            started = await self._aacquire(tokens)
+            try:
+                result = await call()
+            except Exception as e:
+                self._end()
+                delay = self._failed(e, attempt)
+                if delay is None:
+                    raise
+            except BaseException:
+                self._end()
+                raise
+            else:
+                self._end(started)
+                return result
+            await asyncio.sleep(delay)
+
+    # Streams the chunks of call() (which returns a generator), or replays those of an identical
+    # streamed request once it finishes. The slot is held until the stream ends; a request is only
+    # retried if it fails before its first chunk.
+    def stream(self, key, tokens, call):
+        while True:
+            future, leader = self._join(key)
+            if leader:
+                break
+            try:
+                chunks = future.result()
+            except _Abandoned:
+                continue
+            yield from (_copy(chunk) for chunk in chunks)
+            return
+
+        chunks = []
+        try:
+            with contextlib.closing(self._send_stream(tokens, call)) as stream:
+                for chunk in stream:
+                    chunks.append(chunk)
+                    yield chunk
+        except BaseException as e:
+            self._finish(key, future, error=e)
+            raise
+        self._finish(key, future, chunks)
+
+    def _send_stream(self, tokens, call):
+        for attempt in itertools.count():
+            started = self._acquire(tokens)
+            streamed = False
+            try:
+                with contextlib.closing(call()) as stream:
+                    for chunk in stream:
+                        streamed = True
+                        yield chunk
+            except Exception as e:
+                self._end()
+                delay = self._failed(e, None if streamed else attempt)
+                if delay is None:
+                    raise
+            except BaseException:
+                self._end()
+                raise
+            else:
+                self._end(started)
+                return
+            time.sleep(delay)
+
+    # stream() for an async generator
+    async def astream(self, key, tokens, call):
+        while True:
+            future, leader = self._join(key)
+            if leader:
+                break
+            try:
+                chunks = await asyncio.shield(asyncio.wrap_future(future))
+            except _Abandoned:
+                continue
+            for chunk in chunks:
+                yield _copy(chunk)
+            return
+
+        chunks = []
+        try:
+            # Closed explicitly, so a caller that stops reading early frees the slot at once
+            async with contextlib.aclosing(self._asend_stream(tokens, call)) as stream:
+                async for chunk in stream:
+                    chunks.append(chunk)
+                    yield chunk
+        except BaseException as e:
+            self._finish(key, future, error=e)
+            raise
+        self._finish(key, future, chunks)
+
+    async def _asend_stream(self, tokens, call):
+        for attempt in itertools.count():
+            started = await self._aacquire(tokens)
+            streamed = False
+            try:
+                async with contextlib.aclosing(await call()) as stream:
+                    async for chunk in stream:
+                        streamed = True
+                        yield chunk
+            except Exception as e:
+                self._end()
+                delay = self._failed(e, None if streamed else attempt)
+                if delay is None:
+                    raise
+            except BaseException:
+                self._end()
+                raise
+            else:
+                self._end(started)
+                return
+            await asyncio.sleep(delay)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats["throttled_seconds"] = round(stats["throttled_seconds"], 3)
+            stats.update(queued=self._queued, max_queued=self._max_queued, in_flight=self._in_flight)
+            latency, queue_wait = list(self._latency), list(self._queue_wait)
+        stats["max_concurrency"] = self.max_concurrency
+        stats["requests_per_minute"] = self._requests.rate_per_minute if self._requests is not None else None
+        stats["tokens_per_minute"] = self._tokens.rate_per_minute if self._tokens is not None else None
+        for name, values in (("latency_seconds", latency), ("queue_wait_seconds", queue_wait)):
+            points = np.percentile(values, [50, 95, 99]).round(3).tolist() if values else [None] * 3
+            stats[name] = dict(zip(("p50", "p95", "p99"), points))
+        return stats
+
+
+# A LlamaIndex LLM that sends every request of the provider LLM it wraps through an LLMGateway
+# Tool-calling helpers are the wrapped LLM's own, so it works with FunctionAgent and ReActAgent alike.
+class GatewayLLM(FunctionCallingLLM):
+    llm: Any
+    gateway: Any
+
+    def __init__(self, llm, gateway, **kwargs):
+        super().__init__(llm=llm, gateway=gateway, system_prompt=llm.system_prompt,
+                         messages_to_prompt=llm.messages_to_prompt, completion_to_prompt=llm.completion_to_prompt,
+                         pydantic_program_mode=llm.pydantic_program_mode, output_parser=llm.output_parser, **kwargs)
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "GatewayLLM"
+
+    @property
+    def metadata(self):
+        return self.llm.metadata
+
+    # The model, endpoint and generation settings a request goes out with; read per request, as callers
+    # may change e.g. llm.temperature after creating it
+    def _settings(self):
+        settings = {name: getattr(self.llm, name) for name in SETTINGS if hasattr(self.llm, name)}
+        settings["model"] = self.llm.metadata.model_name
+        return settings
+
+    # (key, estimated input tokens) of a request; tools are keyed by name, other objects by repr()
+    # Only requests to the same model and endpoint with the same settings share a key
+    def _request(self, method, payload, kwargs):
+        def encode(value):
+            if hasattr(value, "metadata") and hasattr(value.metadata, "name"):
+                return value.metadata.name
+            if hasattr(value, "model_dump"):
+                return value.model_dump(mode="json")
+            return repr(value)
+
+        data = json.dumps([method, payload, kwargs], sort_keys=True, default=encode)
+        settings = json.dumps(self._settings(), sort_keys=True, default=encode)
+        return hashlib.sha1((settings + data).encode()).hexdigest(), len(data) // 4  # ~4 characters a token
+
+    def _messages(self, messages):
+        return [message.model_dump(mode="json") for message in messages]
+
+    def chat(self, messages, **kwargs):
+        return self.gateway.call(*self._request("chat", self._messages(messages), kwargs),
+                                 lambda: self.llm.chat(messages, **kwargs))
+
+    def complete(self, prompt, formatted=False, **kwargs):
+        return self.gateway.call(*self._request("complete", [prompt, formatted], kwargs),
+                                 lambda: self.llm.complete(prompt, formatted=formatted, **kwargs))
+
+    def stream_chat(self, messages, **kwargs):
+        return self.gateway.stream(*self._request("stream_chat", self._messages(messages), kwargs),
+                                   lambda: self.llm.stream_chat(messages, **kwargs))
+
+    def stream_complete(self, prompt, formatted=False, **kwargs):
+        return self.gateway.stream(*self._request("stream_complete", [prompt, formatted], kwargs),
+                                   lambda: self.llm.stream_complete(prompt, formatted=formatted, **kwargs))
+
+    async def achat(self, messages, **kwargs):
+        return await self.gateway.acall(*self._request("chat", self._messages(messages), kwargs),
+                                        lambda: self.llm.achat(messages, **kwargs))
+
+    async def acomplete(self, prompt, formatted=False, **kwargs):
+        return await self.gateway.acall(*self._request("complete", [prompt, formatted], kwargs),
+                                        lambda: self.llm.acomplete(prompt, formatted=formatted, **kwargs))
+
+    async def astream_chat(self, messages, **kwargs):
+        return self.gateway.astream(*self._request("stream_chat", self._messages(messages), kwargs),
+                                    lambda: self.llm.astream_chat(messages, **kwargs))
+
+    async def astream_complete(self, prompt, formatted=False, **kwargs):
+        return self.gateway.astream(*self._request("stream_complete", [prompt, formatted], kwargs),
+                                    lambda: self.llm.astream_complete(prompt, formatted=formatted, **kwargs))
+
+    def _prepare_chat_with_tools(self, *args, **kwargs):
+        return self.llm._prepare_chat_with_tools(*args, **kwargs)
+
+    def _validate_chat_with_tools_response(self, *args, **kwargs):
+        return self.llm._validate_chat_with_tools_response(*args, **kwargs)
+
+    def get_tool_calls_from_response(self, *args, **kwargs):
+        return self.llm.get_tool_calls_from_response(*args, **kwargs)
+
+
+_gateways = {}
+_gateways_lock = threading.Lock()
+
+
+# The process-wide gateway for a provider, created on first use with PROVIDER_LIMITS
+def gateway_for(provider):
+    with _gateways_lock:
+        if provider not in _gateways:
+            _gateways[provider] = LLMGateway(provider)
+        return _gateways[provider]
@@ -3,32 +3,57 @@ import asyncio
 from rag import StockAnalyzerAgent
 from stockdata import StockDataService
 
+# Longest tool observation shown while streaming; the agent still sees all of it
+MAX_OBSERVATION_CHARS = 500
+
+
+# Prints the agent's events as they arrive: reasoning tokens, tool calls and their results
+async def render_stream(agent, prompt):
+    streamed = False  # Whether tokens were printed since the last tool result
+    async for event in agent.analyze_stream(prompt):
+        if event["type"] == "token":
+            print(event["delta"], end="", flush=True)
+            streamed = True
+        elif event["type"] == "tool_call":
+            args = ", ".join(f"{key}={value!r}" for key, value in event["kwargs"].items())
+            print(f"\n-> {event['tool']}({args})", flush=True)
+            streamed = False
+        elif event["type"] == "tool_result":
+            output = event["output"]
+            if len(output) > MAX_OBSERVATION_CHARS:
+                output = output[:MAX_OBSERVATION_CHARS] + "..."
+            print(f"<- {event['tool']}: {output}\n", flush=True)
+            streamed = False
+        elif event["type"] == "answer":
+            # The final answer has usually been streamed already as tokens
+            print(f"\n{event['text']}" if not streamed else "")
+
+
 async def main():
     service = StockDataService("data/")
 
     years = int(input("Enter number of years to look back: "))
     ticker = input("Enter stock ticker: ")
 
-    all_stocks = service.get_historical_prices(years)
+    all_stocks, documents, df_financials, df_info, df_metrics = await service.fetch_all(years, ticker)
 
     single_stock_prices = service.get_single_stock_prices(all_stocks, ticker)
-    service.create_price_chart(single_stock_prices, ticker, years)
-
-    documents = service.get_news(ticker)
-    df_financials = service.get_financials(ticker)
-    df_info = service.get_info(ticker)
-    df_metrics = service.get_metrics(df_info)
+    print(f"Price chart saved to {service.create_price_chart(single_stock_prices, ticker, years)}")
 
     model = "claude-sonnet-4-5-20250929"
-    agent = StockAnalyzerAgent(model)
+    agent = StockAnalyzerAgent(model, ticker=ticker, parallel_tools=True)
     agent.initialize()
 
+    # Keeps prices, news, financials and info current while the session runs (see refresh.py)
+    refresh = agent.service.start_refresh(tickers=[ticker])
+
     while True:
         prompt = input("Enter a prompt (or q to quit): ")
         if prompt.lower() == 'q':
             break
-        result = await agent.analyze(prompt)
-        print(result)
+        await render_stream(agent, prompt)
+
+    refresh.stop(timeout=5)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,124 @@
+import os
+import json
+import time
+import logging
+import threading
+import pandas as pd
+
+from llama_index.core import VectorStoreIndex, StorageContext, load_index_from_storage
+
+from tracing import traced, current_span
+
+
+# Persistent news vector indexes, one directory per ticker
+# Articles are inserted by their stable doc id (the Yahoo uuid), so anything already
+# embedded is skipped, and articles older than max_age_days are evicted. A restart
+# within refresh_interval seconds loads the index from disk without touching the network.
+# embed_model defaults to Settings.embed_model when None.
+class NewsIndexStore():
+    def __init__(self, persist_dir, embed_model=None, max_age_days=30, refresh_interval=3600):
+        self.persist_dir = persist_dir
+        self.embed_model = embed_model
+        self.max_age_days = max_age_days
+        self.refresh_interval = refresh_interval
+        os.makedirs(persist_dir, exist_ok=True)
+
+        self._locks = {}  # ticker -> lock, so a background update and a query don't write one index at once
+        self._locks_lock = threading.Lock()
+
+    def _lock(self, ticker):
+        with self._locks_lock:
+            return self._locks.setdefault(ticker, threading.Lock())
+
+    def _ticker_dir(self, ticker):
+        return os.path.join(self.persist_dir, ticker)
+
+    def _meta_path(self, ticker):
+        return os.path.join(self._ticker_dir(ticker), "refresh.json")
+
+    def _last_refreshed(self, ticker):
+        path = self._meta_path(ticker)
+        if not os.path.exists(path):
+            return 0
+        with open(path) as f:
+            return json.load(f).get("last_refreshed", 0)
+
+    # Changes whenever articles are added to or evicted from the ticker's index; None if it has never been built
+    # A refresh that finds nothing new leaves it alone, so the engine built on the index is kept
+    def version(self, ticker):
+        path = os.path.join(self._ticker_dir(ticker), "docstore.json")
+        return os.stat(path).st_mtime_ns if os.path.exists(path) else None
+
+    def _load(self, ticker):
+        ticker_dir = self._ticker_dir(ticker)
+        if not os.path.exists(os.path.join(ticker_dir, "docstore.json")):
+            return None
+        storage_context = StorageContext.from_defaults(persist_dir=ticker_dir)
+        return load_index_from_storage(storage_context, embed_model=self.embed_model)
+
+    # Writes the index only if its articles changed (or it is new); the refresh time is always recorded
+    def _persist(self, ticker, index, changed=True):
+        if changed:
+            index.storage_context.persist(persist_dir=self._ticker_dir(ticker))
+        else:
+            os.makedirs(self._ticker_dir(ticker), exist_ok=True)
+        with open(self._meta_path(ticker), "w") as f:
+            json.dump({"last_refreshed": time.time()}, f)
+
+    # Adds new articles to the ticker's index (loaded from disk, or created) and evicts stale ones
+    def _update(self, ticker, index, documents):
+        created = index is None
+        if created:
+            index = VectorStoreIndex([], embed_model=self.embed_model)
+
+        inserted = self._insert_new(index, documents)
+        evicted = self._evict_stale(index)
+        logging.info(f"News index for {ticker}: {inserted} new, {evicted} evicted, {len(index.ref_doc_info)} total")
+        current_span().set("inserted", inserted).set("evicted", evicted)
+
+        self._persist(ticker, index, changed=created or inserted > 0 or evicted > 0)
+        return index
+
+    # Loads the ticker's index and, if it is due for a refresh, pulls news through fetch_documents()
+    # Returns None when there are no articles for the ticker
+    @traced("news_index.get_index", args=("ticker",))
+    def get_index(self, ticker, fetch_documents):
+        with self._lock(ticker):
+            index = self._load(ticker)
+
+            if index is not None and time.time() - self._last_refreshed(ticker) < self.refresh_interval:
+                return index if index.ref_doc_info else None
+
+            index = self._update(ticker, index, fetch_documents())
+        return index if index.ref_doc_info else None
+
+    # Adds already fetched articles (e.g. from a background refresh) to the ticker's index right away
+    @traced("news_index.update", args=("ticker",))
+    def update(self, ticker, documents):
+        with self._lock(ticker):
+            return self._update(ticker, self._load(ticker), documents)
+
+    # Embeds only the documents whose id is not in the index yet
+    def _insert_new(self, index, documents):
+        known = set(index.ref_doc_info)
+        inserted = 0
+        for doc in documents:
+            if doc.id_ in known or self._is_stale(doc.metadata):
+                continue
+            index.insert(doc)
+            known.add(doc.id_)
+            inserted += 1
+        return inserted
+
+    # Drops articles published more than max_age_days ago
+    def _evict_stale(self, index):
+        stale = [doc_id for doc_id, info in index.ref_doc_info.items() if self._is_stale(info.metadata)]
+        for doc_id in stale:
+            index.delete_ref_doc(doc_id, delete_from_docstore=True)
+        return len(stale)
+
+    def _is_stale(self, metadata):
+        published = pd.to_datetime(metadata.get("published_at"), utc=True, errors="coerce")
+        if pd.isna(published):
+            return False  # Keep articles with unknown dates
+        return pd.Timestamp.now(tz="UTC") - published > pd.Timedelta(days=self.max_age_days)
@@ -0,0 +1,149 @@
+import os
+import json
+import threading
+import datetime as dt
+import pandas as pd
+
+from storage import DataStore
+from refresh import last_close
+
+
+# The date of the last session that has closed; a bar of the session in progress is still changing,
+# so coverage never extends past this date and the next sync downloads that day again
+def last_completed_session():
+    return last_close(dt.datetime.now(dt.timezone.utc)).date()
+
+
+# Local on-disk price store keyed by (ticker, date)
+# Each ticker's OHLCV bars live in their own file, and a manifest records the
+# date range that has already been requested for each ticker, so weekends and
+# holidays inside a covered range are not re-fetched.
+class PriceStore():
+    def __init__(self, store_dir, backend="feather"):
+        self.store_dir = store_dir
+        self.manifest_path = os.path.join(store_dir, "manifest.json")
+        self.store = DataStore(store_dir, backend=backend)
+
+        self.manifest = self._load_manifest()
+        self._frames = {}  # ticker -> (version, bars) once read back
+        self._lock = threading.Lock()  # A background refresh updates the manifest while queries read it
+        self._merge_locks = {}  # ticker -> lock held while its bars are read, merged and written back
+
+    def _load_manifest(self):
+        if not os.path.exists(self.manifest_path):
+            return {}
+        with open(self.manifest_path) as f:
+            return json.load(f)
+
+    def save_manifest(self):
+        tmp_path = self.manifest_path + ".tmp"
+        with self._lock:
+            with open(tmp_path, "w") as f:
+                json.dump(self.manifest, f, indent=2, sort_keys=True)
+            os.replace(tmp_path, self.manifest_path)
+
+    # Returns the (start, end) dates already covered for a ticker, or None
+    def coverage(self, ticker):
+        entry = self.manifest.get(ticker)
+        if entry is None:
+            return None
+        return dt.date.fromisoformat(entry["start"]), dt.date.fromisoformat(entry["end"])
+
+    # Returns the inclusive date ranges in [start, end] that are not stored yet
+    # Ranges without a single business day (e.g. a weekend gap) are skipped
+    def missing_ranges(self, ticker, start, end):
+        covered = self.coverage(ticker)
+        if covered is None:
+            ranges = [(start, end)]
+        else:
+            covered_start, covered_end = covered
+            ranges = []
+            if start < covered_start:
+                ranges.append((start, covered_start - dt.timedelta(days=1)))
+            if end > covered_end:
+                ranges.append((covered_end + dt.timedelta(days=1), end))
+
+        return [(a, b) for a, b in ranges if a <= b and len(pd.bdate_range(a, b)) > 0]
+
+    # Extends a ticker's covered range without writing any bars, through the last completed session at most
+    def mark_covered(self, ticker, start, end, save_manifest=True):
+        end = min(end, last_completed_session())
+        with self._lock:
+            covered = self.coverage(ticker)
+            if covered is None and end < start:
+                return  # Only the session in progress was fetched
+            if covered is not None:
+                start = min(start, covered[0])
+                end = max(end, covered[1])
+            self.manifest[ticker] = {"start": start.isoformat(), "end": end.isoformat()}
+        if save_manifest:
+            self.save_manifest()
+
+    # Changes whenever merged bars change the ticker's stored bars (a hash of them); None if nothing is stored
+    def version(self, ticker):
+        return self.store.version(ticker)
+
+    def _merge_lock(self, ticker):
+        with self._lock:
+            return self._merge_locks.setdefault(ticker, threading.Lock())
+
+    # Reads all stored bars for a ticker (empty frame if nothing is stored)
+    # The in-memory copy is reused until the file changes (e.g. another service merged new bars)
+    def read(self, ticker):
+        version = self.version(ticker)
+        cached = self._frames.get(ticker)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+
+        if version is not None:
+            df = self.store.load(ticker)
+        else:
+            df = pd.DataFrame()
+            df.index.name = "Date"
+
+        self._frames[ticker] = (version, df)
+        return df
+
+    # Merges newly fetched bars for a ticker into the store and extends its coverage
+    # Pass save_manifest=False when merging many tickers and call save_manifest() once at the end
+    # Bars that match what is stored (e.g. the last few days downloaded again) leave the file and its
+    # version alone. Merges of one ticker run one at a time (e.g. a sync and a background refresh), so
+    # neither writes back bars without the other's; the file itself is replaced atomically.
+    def merge(self, ticker, new_bars, start, end, save_manifest=True):
+        with self._merge_lock(ticker):
+            existing = self.read(ticker)
+            new_bars = new_bars.dropna(how="all")
+
+            if existing.empty:
+                merged = new_bars
+            elif new_bars.empty:
+                merged = existing
+            else:
+                merged = pd.concat([existing, new_bars])
+                merged = merged[~merged.index.duplicated(keep="last")]
+
+            merged = merged.sort_index()
+            merged.index.name = "Date"
+            self.store.save(ticker, merged, if_changed=True)
+
+            # Don't keep merged bars around - large universes would otherwise pile up in memory
+            self._frames.pop(ticker, None)
+        self.mark_covered(ticker, start, end, save_manifest=save_manifest)
+        return merged
+
+    # Builds a yfinance-style (Price, Ticker) column panel for [start, end]
+    def load_panel(self, tickers, start, end):
+        frames = {}
+        for ticker in tickers:
+            df = self.read(ticker)
+            if not df.empty:
+                frames[ticker] = df.loc[pd.Timestamp(start):pd.Timestamp(end)]
+
+        if not frames:
+            return pd.DataFrame()
+
+        panel = pd.concat(frames, axis=1)  # Columns: (Ticker, Price)
+        panel = panel.swaplevel(0, 1, axis=1).sort_index(axis=1)
+        panel.columns.names = ["Price", "Ticker"]
+        panel.index.name = "Date"
+        return panel
@@ -1,5 +1,3 @@
-from llama_index.core import PromptTemplate
-
 # Tells agent what do with pandas df and how to respond
 INSTRUCTION_PROMPT = """\
     1. Convert the query to executable Python code using Pandas.
@@ -12,11 +10,12 @@ INSTRUCTION_PROMPT = """\
     8. ALWAYS use .iloc[] for positional indexing or .loc[] for label-based indexing. NEVER use direct bracket notation like df['col'][-1]."""
 
 # Specify context for agent to know what data it is working with - templating what we want prompt to look like
-NEW_PROMPT = PromptTemplate(
+# Kept as a plain string so importing prompts doesn't load llama_index; rag.py wraps it in a PromptTemplate
+NEW_PROMPT = (
     """\
     You are working with a pandas dataframe in Python.
     The name of the dataframe is `df`.
-    This is the result of `print(df.head())`:
+    This is a summary of `df` (columns with their types and ranges or values, then a few rows):
     {df_str}
 
     Follow these instructions:
@@ -41,10 +40,13 @@ CONTEXT = """You are a quantitative stock analyst AI assistant. Your role is to
 
 ANALYSIS METHODOLOGY:
 1. ALWAYS use multiple tools to get a complete picture:
+   - Use quick_metrics for headline numbers (returns, volatility, 52-week range, growth, margins)
    - Use parse_stock_data for price trends and volatility
    - Use parse_financial_data for fundamentals (revenue growth, margins, debt levels)
    - Use parse_metrics for valuation ratios (P/E, PEG, Price-to-Book)
    - Use parse_news for recent sentiment and catalysts
+   - Use parse_technical_indicators for trend, momentum and risk signals (RSI, MACD, moving averages, beta)
+   - Use screen_stocks to find, filter or rank stocks across every stored ticker at once
 
 2. SYNTHESIZE data across tools to provide insights:
    - Connect price movements to news events
@@ -136,9 +138,82 @@ TOOL_DESCRIPTIONS = {
     - "Recent headlines suggest concerns about [issue]"
 
     "When referencing news sentiment, you MUST cite the specific headline and publisher. Do not make general statements like 'news is positive' without proof."
+    """,
+
+    "parse_technical_indicators": """Analyzes precomputed technical indicators for a stock (one row per trading day).
+    Available data: sma_20, sma_50, sma_200, ema_12, ema_26, macd, macd_signal, macd_hist, rsi_14,
+    bb_upper, bb_lower (20-day Bollinger bands), atr_14, drawdown (from running peak),
+    beta_60, corr_60 (60-day rolling beta/correlation against the market)
+
+    Use this to assess:
+    - Trend (price vs moving averages, golden/death crosses, MACD crossovers)
+    - Momentum (RSI overbought > 70 / oversold < 30)
+    - Volatility and risk (ATR, Bollinger band width, drawdowns, beta)
+
+    Example queries to run:
+    - "What is the latest RSI?"
+    - "When did sma_50 last cross above sma_200?"
+    - "What was the deepest drawdown in the last year?"
     """
 }
 
+QUICK_METRICS_DESCRIPTION = """Returns precomputed headline metrics for a stock instantly, without running a query.
+    Available metrics: latest close, 52-week high/low, 50/200-day moving averages, 1M/3M/1Y/YTD returns,
+    30-day and 1-year annualized volatility, 1-year max drawdown, 30-day average volume,
+    YoY revenue/net income/free cash flow growth, gross/operating/net margins.
+
+    Use this FIRST for any of these numbers, and use the other tools for anything it doesn't cover.
+
+    Arguments:
+    - ticker: the stock ticker symbol (e.g. "AAPL"). Leave empty to use the current ticker.
+    """
+
+SCREEN_DESCRIPTION = """Filters and ranks every stored stock at once by price, valuation and fundamental fields.
+    Use this for questions across many stocks ("which stocks have PEG < 1 and growing free cash flow?",
+    "top 10 tech stocks by 1-year return") instead of calling the other tools once per ticker.
+
+    Fields: latest_close, high_52w, low_52w, sma_50, sma_200, return_1m, return_3m, return_1y, ytd_return,
+    volatility_30d, volatility_1y, max_drawdown_1y, avg_volume_30d, revenue_growth (revenue_growth_yoy),
+    earnings_growth (net_income_growth_yoy), fcf_growth (free_cash_flow_growth_yoy), gross_margin,
+    operating_margin, net_margin, fcf_margin, fcf_to_net_income, debt_to_assets, cash_to_debt,
+    pe, forward_pe, peg, price_to_book, price_to_sales, ev_to_ebitda, roe, roa, profit_margin,
+    debt_to_equity, current_ratio, dividend_yield, market_cap, beta, sector, industry.
+    Returns, growth, margins and yields are fractions (0.1 is 10%).
+
+    Arguments:
+    - filter: a boolean expression over the fields with and/or/not, comparisons (chains like
+      0 < pe < 20 work), + - * / and abs(), log(), sqrt(), rank() (percentile rank, 0 to 1);
+      text fields compare to quoted strings: sector == 'Technology', sector in ['Energy', 'Utilities'].
+      Leave empty to screen every stock.
+    - rank_by: an expression to sort by, e.g. "return_1y" or "rank(roe) - rank(pe)". Leave empty to keep ticker order.
+    - ascending: true to list the lowest values first
+    - limit: how many stocks to list (the total number of matches is always reported)
+    """
+
+# Appended to every tool description - tools work on any ticker, not just the default one
+TICKER_ARGUMENT = """
+    Arguments:
+    - query: the question to answer from this data
+    - ticker: the stock ticker symbol (e.g. "AAPL"). Leave empty to use the current ticker.
+    """
+
+# Tells the agent which ticker questions refer to by default
+def ticker_context(ticker):
+    if not ticker:
+        return "\n\nNo default ticker is set. Always pass the ticker symbol the user asks about to the tools."
+    return (
+        f"\n\nThe current ticker is {ticker}. Questions that don't name a stock are about {ticker}. "
+        "To analyze or compare other stocks, pass their ticker symbols to the tools."
+    )
+
+# Added to CONTEXT when the agent runs tools in parallel (StockAnalyzerAgent(parallel_tools=True))
+PARALLEL_TOOLS_CONTEXT = """
+
+TOOL EXECUTION:
+Tool calls made in the same response run at the same time. When you need several independent pieces
+of data (e.g. prices, financials, metrics and news), request all of those tool calls together in one
+response instead of one per step, then reason over all of the results."""
+
 # Legacy string format for backwards compatibility
 TOOL_DESCRIPTIONS_STR = """
 parse_price_data: Analyzes historical stock prices and trading patterns
@@ -0,0 +1,96 @@
+import re
+import time
+import threading
+from collections import OrderedDict
+
+from tracing import current_span
+
+
+# Lower-cases, collapses whitespace and drops trailing punctuation so that
+# "What's the P/E?" and "what's the p/e" share a cache entry
+def normalize_query(query):
+    query = re.sub(r"\s+", " ", query.strip().lower())
+    return query.rstrip("?.! ")
+
+
+# LRU + TTL cache for tool results
+# Keys include the data version of the dataset the tool reads, so a data refresh
+# makes old entries unreachable and they age out. Hits also record how long the
+# original call took, which is the LLM/eval time the cache saved.
+class QueryCache():
+    def __init__(self, max_entries=512, ttl=3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+
+        self._entries = OrderedDict()  # key -> (expires_at, seconds it took, result)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.saved_seconds = 0.0
+
+    # Returns the cached result for (scope, query), or runs fn() and caches what it returns
+    # scope identifies the tool, ticker and data version the result depends on;
+    # results for which cacheable(result) is False are returned but not stored
+    def get_or_run(self, scope, query, fn, cacheable=None):
+        key = (scope, normalize_query(query))
+        hit, result = self._lookup(key)
+        if hit:
+            return result
+
+        start = time.monotonic()
+        result = fn()
+        self._store(key, result, time.monotonic() - start, cacheable)
+        return result
+
+    # Same as get_or_run for a coroutine function
+    async def aget_or_run(self, scope, query, fn, cacheable=None):
+        key = (scope, normalize_query(query))
+        hit, result = self._lookup(key)
+        if hit:
+            return result
+
+        start = time.monotonic()
+        result = await fn()
+        self._store(key, result, time.monotonic() - start, cacheable)
+        return result
+
+    def _lookup(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                self.saved_seconds += entry[1]
+                current_span().set("cache_hit", True)
+                return True, entry[2]
+            self.misses += 1
+            current_span().set("cache_hit", False)
+            return False, None
+
+    def _store(self, key, result, elapsed, cacheable):
+        if cacheable is not None and not cacheable(result):
+            return
+
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, elapsed, result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "entries": len(self._entries),
+                "evictions": self.evictions,
+                "saved_seconds": round(self.saved_seconds, 3),
+            }
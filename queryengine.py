@@ -0,0 +1,86 @@
+import asyncio
+import contextvars
+
+from llama_index.core.base.response.schema import Response
+from llama_index.core.output_parsers.utils import parse_code_markdown
+from llama_index.experimental.query_engine import PandasQueryEngine
+from llama_index.experimental.query_engine.pandas.output_parser import PandasInstructionParser
+
+from framesummary import FrameSummary
+from sandbox import ExpressionError
+
+# The query being answered, so the table context can be picked for it
+# A context variable rather than an attribute, since one engine can answer several queries at once
+_query_str = contextvars.ContextVar("pandas_query_str", default="")
+
+
+# Runs the LLM's pandas code through a sandbox.ExpressionExecutor instead of evaluating it in-process
+# Failures come back as the same "There was an error running the output as Python code" text
+class SandboxInstructionParser(PandasInstructionParser):
+    def __init__(self, df, executor):
+        super().__init__(df)
+        self.executor = executor
+        self.frame_key = executor.new_frame_key()
+
+    def parse(self, output):
+        code = parse_code_markdown(output, only_last=True)
+        if not isinstance(code, str):
+            code = code[0]
+        try:
+            return self.executor.run(self.frame_key, self.df, code)
+        except ExpressionError as e:
+            return f"There was an error running the output as Python code. Error message: {e}"
+
+
+# PandasQueryEngine whose prompt describes the frame with a FrameSummary (schema, ranges, the
+# columns and values relevant to the query, a few rows) instead of print(df.head())
+# With an executor, the generated code runs sandboxed (see sandbox.py)
+class SummaryPandasQueryEngine(PandasQueryEngine):
+    def __init__(self, df, summary=None, executor=None, **kwargs):
+        if executor is not None:
+            kwargs["instruction_parser"] = SandboxInstructionParser(df, executor)
+        super().__init__(df=df, **kwargs)
+        self.summary = summary or FrameSummary(df)
+
+    def _get_table_context(self):
+        return self.summary.describe(_query_str.get())
+
+    def _query(self, query_bundle):
+        token = _query_str.set(query_bundle.query_str)
+        try:
+            return super()._query(query_bundle)
+        finally:
+            _query_str.reset(token)
+
+    # PandasQueryEngine._aquery, but the generated code runs in a thread so a slow expression doesn't
+    # hold up the event loop (the stock parser's signal-based timeout only works on the main thread,
+    # so this needs the sandboxed one)
+    async def _aquery(self, query_bundle):
+        if not isinstance(self._instruction_parser, SandboxInstructionParser):
+            token = _query_str.set(query_bundle.query_str)
+            try:
+                return await super()._aquery(query_bundle)
+            finally:
+                _query_str.reset(token)
+
+        query_str = query_bundle.query_str
+        token = _query_str.set(query_str)
+        try:
+            context = self._get_table_context()
+        finally:
+            _query_str.reset(token)
+
+        instructions = await self._llm.apredict(self._pandas_prompt, df_str=context, query_str=query_str,
+                                                instruction_str=self._instruction_str)
+        if self._verbose:
+            print(f"> Pandas Instructions:\n```\n{instructions}\n```")
+        output = await asyncio.to_thread(self._instruction_parser.parse, instructions)
+        if self._verbose:
+            print(f"> Pandas Output: {output}")
+
+        metadata = {"pandas_instruction_str": instructions, "raw_pandas_output": output}
+        if self._synthesize_response:
+            answer = await self._llm.apredict(self._response_synthesis_prompt, query_str=query_str,
+                                              pandas_instructions=instructions, pandas_output=output)
+            return Response(response=str(answer), metadata=metadata)
+        return Response(response=str(output), metadata=metadata)
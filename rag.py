@@ -2,177 +2,397 @@ from dotenv import load_dotenv
 load_dotenv()
 
 import os
-import pandas as pd
+import copy
 import asyncio
 import logging
+import threading
+from typing import TYPE_CHECKING
 
-from prompts import NEW_PROMPT, INSTRUCTION_PROMPT, CONTEXT, TOOL_DESCRIPTIONS
-
-from llama_index.experimental.query_engine import PandasQueryEngine
-from llama_index.core.tools import QueryEngineTool, ToolMetadata
-from llama_index.core.agent import ReActAgent
-from llama_index.llms.openai import OpenAI
-from llama_index.llms.anthropic import Anthropic
-from llama_index.core.agent.workflow import AgentWorkflow
-from llama_index.core import VectorStoreIndex
+from prompts import NEW_PROMPT, INSTRUCTION_PROMPT, CONTEXT, TOOL_DESCRIPTIONS, TICKER_ARGUMENT, QUICK_METRICS_DESCRIPTION, SCREEN_DESCRIPTION, PARALLEL_TOOLS_CONTEXT, ticker_context
 
 from stockdata import StockDataService
+from storage import DataStore
+from registry import ToolRegistry
+from analytics import AnalyticsService
+from screener import Screener
+from indicators import IndicatorEngine
+from querycache import QueryCache
+from sandbox import default_executor
+from tracing import span, traced, current_span, start_span, finish_span, use_span
+
+# llama_index (and the provider SDKs) take seconds to import - llama_index.experimental alone pulls in
+# torch - so they are imported where they are first needed rather than here, and an agent can be created
+# and its data loaded before any of them are
+if TYPE_CHECKING:
+    from llama_index.experimental.query_engine import PandasQueryEngine
 
 logging.getLogger("httpx").setLevel(logging.WARNING)
 
+# PandasQueryEngine returns this instead of raising when its generated code fails; those aren't cached
+QUERY_ERROR = "There was an error running the output as Python code"
+
 class StockAnalyzerAgent:
-    def __init__(self, model, verbose=False):
+    # embed_model is the news embedding model (Settings.embed_model if None); it is wrapped in an on-disk cache
+    # ticker is the default ticker for questions that don't name one (read from the saved metrics if None)
+    # max_tickers is how many tickers keep their query engines and news index in memory
+    # years is how much price history to download for a ticker that has none stored yet
+    # parallel_tools runs every tool call the LLM makes in one step concurrently (needs a function-calling
+    # LLM); the default ReAct agent calls one tool per step
+    # llm overrides the LLM picked from the model name (e.g. a local stub for testing)
+    # executor runs the pandas code the query engines generate (the process-wide ExpressionExecutor from
+    # sandbox.default_executor if None; ExpressionExecutor(workers=0) evaluates in-process)
+    def __init__(self, model, verbose=False, data_dir="data/", backend="feather", embed_model=None,
+                 ticker=None, max_tickers=8, years=5, parallel_tools=False, llm=None, executor=None):
         self.model = model
         self.verbose = verbose
+        self.parallel_tools = parallel_tools
+        self.data_dir = data_dir
+        self.years = years
+        self.store = DataStore(data_dir, backend=backend)
+        self.service = StockDataService(data_dir, backend=backend)
+        self.analytics = AnalyticsService(self.service)
+        self.screener = Screener(self.service)
+        self.indicators = IndicatorEngine()
+        self._indicators_lock = threading.Lock()
+        self.embed_model = embed_model
+        self.news_store = None
+        self.query_cache = QueryCache()
+        self.executor = executor or default_executor()
+        self.ticker = ticker.upper() if ticker else self._detect_ticker()
+        self.registry = ToolRegistry({
+            "parse_price_data": self._build_price_engine,
+            "parse_financial_data": self._build_financial_engine,
+            "parse_metrics": self._build_metrics_engine,
+            "parse_news": self._build_news_index,
+            "parse_technical_indicators": self._build_indicator_engine,
+        }, max_tickers=max_tickers, versions={
+            "parse_price_data": self.service.price_store.version,
+            "parse_financial_data": self.service.financials.version,
+            "parse_metrics": lambda ticker: self.service.ticker_store(ticker).version("metrics"),
+            "parse_news": lambda ticker: self.news_store.version(ticker) if self.news_store else None,
+            "parse_technical_indicators": self.service.price_store.version,
+        })
+        self.tools = None
+        self.llm = llm
         self.agent = None
         self.workflow = None
+        self.service.add_listener(self._on_data_changed)
 
-    # Builds a PandasQueryEngine for parsing csv files
-    def _build_query_engine(self, csv_path: str) -> PandasQueryEngine:
-        df = pd.read_csv(csv_path)
-        engine = PandasQueryEngine(
+    # Called when a background refresh (see refresh.py) changes a dataset. Prices, financials and metrics
+    # engines are rebuilt through their versions; new articles are added to an existing news index here,
+    # so the news engine is rebuilt too without waiting for the index's own refresh interval.
+    def _on_data_changed(self, dataset, ticker, data):
+        if dataset == "news" and data and self.news_store is not None and self.news_store.version(ticker) is not None:
+            self.news_store.update(ticker, data)
+
+    # Auto-detect ticker from the saved metrics
+    def _detect_ticker(self):
+        try:
+            metrics_df = self.store.load("metrics")
+            if 'symbol' in metrics_df.columns:
+                return metrics_df['symbol'].iloc[0]
+        except FileNotFoundError:
+            pass
+        return None
+
+    # Builds a PandasQueryEngine over a DataFrame
+    # Its prompt describes the frame with a cached summary (see framesummary.py), not df.head(), and
+    # the code it generates runs in the sandboxed executor (see sandbox.py). It asks the agent's LLM,
+    # so its requests share the agent's gateway (Settings.llm if built before initialize).
+    def _build_query_engine(self, df) -> "PandasQueryEngine":
+        from llama_index.core import PromptTemplate
+        from queryengine import SummaryPandasQueryEngine
+
+        engine = SummaryPandasQueryEngine(
             df=df,
+            llm=self.llm,
             verbose=self.verbose,
-            instruction_str=INSTRUCTION_PROMPT
+            instruction_str=INSTRUCTION_PROMPT,
+            executor=self.executor,
         )
-        engine.update_prompts({"pandas_prompt": NEW_PROMPT})
+        engine.update_prompts({"pandas_prompt": PromptTemplate(NEW_PROMPT)})
+
+        # Time the generated code's eval separately from the LLM call that wrote it
+        parser = engine._instruction_parser
+        parser.parse = traced("pandas.eval")(parser.parse)
         return engine
 
-    # Builds a VectorStoreIndex from news documents
+    # Loads a ticker's dataset, fetching it through StockDataService if it hasn't been saved yet
+    def _load_ticker_data(self, ticker, name, fetch):
+        store = self.service.ticker_store(ticker)
+        if not store.exists(name):
+            logging.info(f"No saved {name} for {ticker}, fetching it")
+            fetch()
+        return store.load(name)
+
+    # Reads a ticker's stored prices, downloading them first if none are stored
+    def _load_prices(self, ticker):
+        df = self.service.price_store.read(ticker)
+        if df.empty:
+            self.service.sync_prices(self.years, tickers=[ticker])
+            df = self.service.price_store.read(ticker)
+        if df.empty:
+            raise ValueError(f"No price data found for {ticker}")
+        return df
+
+    def _build_price_engine(self, ticker: str) -> "PandasQueryEngine":
+        return self._build_query_engine(self._load_prices(ticker))
+
+    # Indicators are computed for the whole universe (plus this ticker) in one pass
+    # and only extended with new bars on later calls
+    def _build_indicator_engine(self, ticker: str) -> "PandasQueryEngine":
+        self._load_prices(ticker)
+        tickers = sorted(set(self.service.universe) | set(self.indicators.tickers) | {ticker})
+        start, end = self.service.price_window(self.years)
+
+        with self._indicators_lock:
+            panel = self.service.price_store.load_panel(tickers, start, end)
+            self.indicators.update(panel)
+            df = self.indicators.for_ticker(ticker)
+
+        return self._build_query_engine(df)
+
+    # Queries the service's compact financials table for the ticker (categorical keys, float values)
+    def _build_financial_engine(self, ticker: str) -> "PandasQueryEngine":
+        df = self.service.financials.read(ticker)
+        if df.empty:
+            logging.info(f"No saved financials for {ticker}, fetching them")
+            df = self.service.get_financials(ticker)
+        return self._build_query_engine(df)
+
+    def _build_metrics_engine(self, ticker: str) -> "PandasQueryEngine":
+        df = self._load_ticker_data(ticker, "metrics",
+                                    lambda: self.service.get_metrics(self.service.get_info(ticker)))
+        return self._build_query_engine(df)
+
+    # Creates the news index store on first use, with the embedding model behind the embedding cache
+    def _get_news_store(self):
+        if self.news_store is None:
+            from llama_index.core import Settings
+            from newsindex import NewsIndexStore
+            from embedcache import CachedEmbedding
+
+            embed_model = CachedEmbedding(
+                self.embed_model or Settings.embed_model,
+                os.path.join(self.data_dir, "embeddings.sqlite"),
+            )
+            self.news_store = NewsIndexStore(os.path.join(self.data_dir, "news_index"), embed_model=embed_model)
+        return self.news_store
+
+    # Loads the ticker's persisted news index, embedding only articles it hasn't seen yet
     def _build_news_index(self, ticker: str):
         try:
-            # Load news documents from StockDataService
-            service = StockDataService("data/")
-
-            # Gets news focs to fill vector store
-            documents = service.get_news(ticker)
+            # News is only re-fetched from StockDataService when the stored index is due for a refresh
+            index = self._get_news_store().get_index(ticker, lambda: self.service.get_news(ticker))
 
-            if not documents:
+            if index is None:
                 logging.warning(f"No news found for {ticker}")
                 return None
 
-            # Create vector store index from documents
-            index = VectorStoreIndex.from_documents(documents)
-            return index.as_query_engine()
+            return index.as_query_engine(llm=self.llm)
 
         except Exception as e:
             logging.error(f"Error building news index: {str(e)}")
             return None
 
-    # Builds all the tools for the agent
-    def build_tools(self):
-        tools = []
-
-        # Tool 1: Price Data Analysis
-        try:
-            price_engine = self._build_query_engine("data/historical_prices.csv")
-
-            parse_price_data = QueryEngineTool(
-                query_engine=price_engine,
-                metadata=ToolMetadata(
-                    name="parse_price_data",
-                    description=TOOL_DESCRIPTIONS["parse_price_data"],
-                ),
-            )
-            
-            tools.append(parse_price_data)
-
-        except FileNotFoundError:
-            logging.warning("historical_prices.csv not found. Run stockdata.py first.")
-
-        # Tool 2: Financial Data Analysis
-        try:
-            financial_engine = self._build_query_engine("data/financials.csv")
-
-            parse_financial_data = QueryEngineTool(
-                query_engine=financial_engine,
-                metadata=ToolMetadata(
-                    name="parse_financial_data",
-                    description=TOOL_DESCRIPTIONS["parse_financial_data"],
-                ),
-            )
-
-            tools.append(parse_financial_data)
-
-        except FileNotFoundError:
-            logging.warning("financials.csv not found. Run stockdata.py first.")
-
-        # Tool 3: Metrics Analysis
-        try:
-            metrics_engine = self._build_query_engine("data/metrics.csv")
-
-            parse_metrics = QueryEngineTool(
-                query_engine=metrics_engine,
-                metadata=ToolMetadata(
-                    name="parse_metrics",
-                    description=TOOL_DESCRIPTIONS["parse_metrics"],
-                ),
-            )
+    # Wraps one of the registry's tools as an agent tool that takes a query and an optional ticker
+    # The ticker's engine is looked up (or built) in the registry when the tool is called, and
+    # answers are cached per (tool, ticker, data version, query) so repeated questions skip the LLM
+    def _make_tool(self, name):
+        from llama_index.core.tools import FunctionTool
 
-            tools.append(parse_metrics)
-
-        except FileNotFoundError:
-            logging.warning("metrics.csv not found. Run stockdata.py first.")
+        # Returns (cache scope, engine), or (message for the agent, None) when there is nothing to query
+        def lookup(ticker):
+            ticker = (ticker or self.ticker or "").upper()
+            if not ticker:
+                return "No ticker given. Pass the ticker symbol of the stock to analyze.", None
+            current_span().set("ticker", ticker)
 
-        # Tool 4: News Analysis (vector store index)
-        try:
-            # Auto-detect ticker from the metrics.csv file
-            ticker = None
             try:
-                metrics_df = pd.read_csv("data/metrics.csv")
-                if 'symbol' in metrics_df.columns:
-                    ticker = metrics_df['symbol'].iloc[0]
-            except:
-                pass
-
-            if not ticker:
-                ticker = input("Enter the stock ticker for news analysis (must match the ticker used in stockdata.py): ").upper()
+                version, engine = self.registry.entry(ticker, name)
+            except Exception as e:
+                logging.warning(f"Error building {name} for {ticker}: {str(e)}")
+                return f"Could not load data for {ticker}: {str(e)}", None
+
+            if engine is None:
+                return f"No data available for {ticker}.", None
+
+            # Keyed on the version the engine was built from, so refreshed data never serves old answers
+            return (name, ticker, version), engine
+
+        def cacheable(result):
+            return not result.startswith(QUERY_ERROR)
+
+        def run(query: str, ticker: str = "") -> str:
+            with span("tool", tool=name):
+                scope, engine = lookup(ticker)
+                if engine is None:
+                    return scope
+
+                def answer():
+                    with span("query_engine", tool=name):
+                        return str(engine.query(query))
+
+                return self.query_cache.get_or_run(scope, query, answer, cacheable)
+
+        # Engines can take a while to build the first time, so that happens off the event loop; the query's
+        # LLM call is awaited and its generated code runs in the executor from a thread
+        async def arun(query: str, ticker: str = "") -> str:
+            with span("tool", tool=name):
+                scope, engine = await asyncio.to_thread(lookup, ticker)
+                if engine is None:
+                    return scope
+
+                async def answer():
+                    with span("query_engine", tool=name):
+                        return str(await engine.aquery(query))
+
+                return await self.query_cache.aget_or_run(scope, query, answer, cacheable)
+
+        return FunctionTool.from_defaults(
+            fn=run,
+            async_fn=arun,
+            name=name,
+            description=TOOL_DESCRIPTIONS[name] + TICKER_ARGUMENT,
+        )
 
-            print(f"Loading news for ticker: {ticker}")
-            news_engine = self._build_news_index(ticker)
+    # Precomputed headline metrics - answered from AnalyticsService without an LLM call
+    def _make_quick_metrics_tool(self):
+        from llama_index.core.tools import FunctionTool
 
-            if news_engine:
-                parse_news = QueryEngineTool(
-                    query_engine=news_engine,
-                    metadata=ToolMetadata(
-                        name="parse_news",
-                        description=TOOL_DESCRIPTIONS["parse_news"],
-                    ),
-                )
+        def quick_metrics(ticker: str = "") -> str:
+            ticker = (ticker or self.ticker or "").upper()
+            if not ticker:
+                return "No ticker given. Pass the ticker symbol of the stock to analyze."
+            return self.analytics.summary(ticker)
 
-                tools.append(parse_news)
+        return FunctionTool.from_defaults(fn=quick_metrics, name="quick_metrics",
+                                          description=QUICK_METRICS_DESCRIPTION)
 
-            else:
-                logging.warning("News index could not be built. Skipping news tool.")
+    # Cross-ticker filtering and ranking - answered from the Screener's table without an LLM call
+    def _make_screen_tool(self):
+        from llama_index.core.tools import FunctionTool
 
-        except Exception as e:
-            logging.warning(f"Error building news tool: {str(e)}")
+        def screen_stocks(filter: str = "", rank_by: str = "", ascending: bool = False, limit: int = 10) -> str:
+            return self.screener.summary(filter, rank_by, ascending, limit)
 
-        if not tools:
-            raise RuntimeError(
-                "No data files found! Run 'python stockdata.py' first to generate data."
-            )
+        return FunctionTool.from_defaults(fn=screen_stocks, name="screen_stocks", description=SCREEN_DESCRIPTION)
 
+    # Builds all the tools for the agent
+    # Tools are ticker-independent; per-ticker engines are built lazily by the registry
+    def build_tools(self):
+        tools = [self._make_tool(name) for name in self.registry.builders]
+        tools.append(self._make_quick_metrics_tool())
+        tools.append(self._make_screen_tool())
         return tools
 
+    # (Re)creates the agent around the existing tools and LLM - cheap, nothing is rebuilt
+    def _build_workflow(self):
+        from llama_index.core.agent import ReActAgent, FunctionAgent
+        from llama_index.core.agent.workflow import AgentWorkflow
+
+        context = CONTEXT + ticker_context(self.ticker)
+        if self.parallel_tools:
+            # The workflow dispatches all tool calls from one LLM response at once (up to 4 at a time)
+            # and hands every result back together on the next step
+            self.agent = FunctionAgent(tools=self.tools, llm=self.llm, allow_parallel_tool_calls=True,
+                                       system_prompt=context + PARALLEL_TOOLS_CONTEXT)
+        else:
+            self.agent = ReActAgent(tools=self.tools, llm=self.llm, verbose=self.verbose, context=context)
+        self.workflow = AgentWorkflow([self.agent])
+
     def initialize(self):
-        tools = self.build_tools()
+        self.tools = self.build_tools()
+        self.executor.warm(background=True)  # Worker processes take about a second to start
 
-        # Auto-detect model provider based on model name
-        if self.model.startswith("claude"):
-            llm = Anthropic(model=self.model)
-        else:
-            llm = OpenAI(model=self.model)
+        # Auto-detect model provider based on model name, unless an LLM was passed in
+        # Only the chosen provider's client library is imported. Requests go through the process-wide
+        # gateway for the provider (see llmgateway.py), shared with every other agent in the process.
+        if self.llm is None:
+            from llmgateway import gateway_for, provider_for
+            self.llm = gateway_for(provider_for(self.model)).llm(self.model)
 
-        self.agent = ReActAgent(tools=tools, llm=llm, verbose=self.verbose, context=CONTEXT)
-        self.workflow = AgentWorkflow([self.agent])
+        self._build_workflow()
+        return self
+
+    # Switches the default ticker (None for no default); engines already built for other tickers stay cached
+    def set_ticker(self, ticker):
+        self.ticker = ticker.upper() if ticker else None
+        if self.workflow is not None:
+            self._build_workflow()
         return self
 
+    # Returns another agent that shares this one's data service, caches, tool registry and LLM client
+    # but has its own tools, default ticker and workflow, so several can serve requests at once
+    def fork(self):
+        agent = copy.copy(self)
+        if self.workflow is not None:
+            agent.tools = agent.build_tools()
+            agent._build_workflow()
+        return agent
+
+    # Answers simple single-metric questions ("52-week high", "YTD return", ...) from precomputed
+    # analytics without calling the LLM; returns None if the question needs the agent
+    def quick_answer(self, query):
+        known_tickers = set(self.service.universe) | set(self.registry.tickers())
+        if self.ticker:
+            known_tickers.add(self.ticker)
+        return self.analytics.answer(query, default_ticker=self.ticker, known_tickers=known_tickers)
+
     async def analyze(self, query):
+        with span("agent.analyze", ticker=self.ticker) as s:
+            answer = self.quick_answer(query)
+            s.set("fast_path", answer is not None)
+            if answer is not None:
+                return answer
+
+            if self.workflow is None:
+                self.initialize()
+            result = await self.workflow.run(query, max_iterations=30)
+            return result
+
+    # Same as analyze, but yields events as the agent works instead of waiting for the final answer:
+    #   {"type": "token", "delta": str}                     - LLM output as it is generated
+    #   {"type": "tool_call", "tool": str, "kwargs": dict}  - a tool call started
+    #   {"type": "tool_result", "tool": str, "output": str} - a tool call finished, with its observation
+    #   {"type": "answer", "text": str}                     - the final answer, always the last event
+    async def analyze_stream(self, query):
+        from llama_index.core.agent.workflow import AgentStream, ToolCall, ToolCallResult
+
+        answer = self.quick_answer(query)
+        if answer is not None:
+            yield {"type": "answer", "text": answer}
+            return
+
         if self.workflow is None:
             self.initialize()
-        result = await self.workflow.run(query, max_iterations=30)
-        return result
+
+        # The span outlives this frame's yields, so it is only made current while the run starts;
+        # the workflow's tasks inherit it from there
+        analysis = start_span("agent.analyze", {"ticker": self.ticker, "streaming": True})
+        with use_span(analysis):
+            handler = self.workflow.run(query, max_iterations=30)
+        error = None
+        try:
+            async for event in handler.stream_events():
+                if isinstance(event, AgentStream):
+                    if event.delta:
+                        yield {"type": "token", "delta": event.delta}
+                elif isinstance(event, ToolCallResult):
+                    yield {"type": "tool_result", "tool": event.tool_name, "output": str(event.tool_output)}
+                elif isinstance(event, ToolCall):
+                    yield {"type": "tool_call", "tool": event.tool_name, "kwargs": event.tool_kwargs}
+
+            result = await handler
+            yield {"type": "answer", "text": str(result)}
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            # The caller stopped reading early - don't leave the run going in the background
+            if not handler.done():
+                await handler.cancel_run()
+            finish_span(analysis, error)
 
 async def main():
     model = "claude-opus-4-5-20251101"
@@ -0,0 +1,185 @@
+import os
+import json
+import time
+import logging
+import threading
+import datetime as dt
+from zoneinfo import ZoneInfo
+
+from tracing import span
+
+# Keeps StockDataService's stored data current in the background, each kind on its own cadence:
+#   prices      every 5 minutes while the US market is open, then once after the close
+#   news        hourly
+#   financials  daily
+#   info        daily (metrics are derived from it and refreshed with it)
+# Refreshes go through the service's change detection: only datasets whose contents changed are
+# rewritten and get a new version, so the tool registry rebuilds only those engines and the query
+# cache stops serving only their answers. Jobs run one at a time on a daemon thread; queries keep
+# reading the stored files (which are replaced atomically) and never wait for a refresh.
+# When each job last ran is kept in refresh.json, so a restart doesn't refetch everything.
+#
+#   scheduler = service.start_refresh(tickers=["NVDA", "AMD"])
+#   ...
+#   scheduler.stop()
+
+MARKET_TZ = ZoneInfo("America/New_York")
+MARKET_OPEN = dt.time(9, 30)
+MARKET_CLOSE = dt.time(16, 0)
+
+# Seconds between refreshes of each job (prices: while the market is open)
+DEFAULT_INTERVALS = {"prices": 300, "news": 3600, "financials": 86400, "info": 86400}
+
+# Dataset whose file time stands in for a job's last run when refresh.json has no record of it
+JOB_DATASETS = {"news": "news", "financials": "financials", "info": "info"}
+
+
+# Whether the US market is open at an aware datetime (exchange holidays aren't accounted for)
+def market_open(now):
+    now = now.astimezone(MARKET_TZ)
+    return now.weekday() < 5 and MARKET_OPEN <= now.time() < MARKET_CLOSE
+
+
+# The most recent weekday market close at or before an aware datetime
+def last_close(now):
+    now = now.astimezone(MARKET_TZ)
+    close = now.replace(hour=MARKET_CLOSE.hour, minute=MARKET_CLOSE.minute, second=0, microsecond=0)
+    if close > now:
+        close -= dt.timedelta(days=1)
+    while close.weekday() >= 5:
+        close -= dt.timedelta(days=1)
+    return close
+
+
+class RefreshScheduler():
+    # tickers are the tickers whose financials, info and news are refreshed; by default, every ticker
+    # with stored data, looked up each round so tickers analyzed later are picked up. Prices are
+    # refreshed for the service's universe plus those tickers.
+    # intervals overrides DEFAULT_INTERVALS; price_days is how many recent days each price refresh
+    # downloads again; poll_interval is how often (seconds) the thread checks for due jobs
+    def __init__(self, service, tickers=None, intervals=None, price_days=5, poll_interval=30):
+        self.service = service
+        self.tickers = [ticker.upper() for ticker in tickers] if tickers is not None else None
+        self.intervals = {**DEFAULT_INTERVALS, **(intervals or {})}
+        self.price_days = price_days
+        self.poll_interval = poll_interval
+        self.state_path = os.path.join(service.output_dir, "refresh.json")
+
+        self._last_run = self._load_state()  # "job" or "job:TICKER" -> epoch seconds of the last attempt
+        self._counters = {"runs": 0, "changed": 0, "unchanged": 0, "errors": 0}
+        self._lock = threading.Lock()  # One round at a time, whether from the thread or run_pending()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _load_state(self):
+        if not os.path.exists(self.state_path):
+            return {}
+        try:
+            with open(self.state_path) as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logging.warning(f"Ignoring unreadable refresh state {self.state_path}: {e}")
+            return {}
+
+    def _save_state(self):
+        tmp_path = self.state_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self._last_run, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.state_path)
+
+    def tracked_tickers(self):
+        if self.tickers is not None:
+            return list(self.tickers)
+        tickers_dir = os.path.join(self.service.output_dir, "tickers")
+        return sorted(os.listdir(tickers_dir)) if os.path.isdir(tickers_dir) else []
+
+    # When a job last ran: its record in refresh.json, else the time its dataset was last saved
+    def last_run(self, job, ticker=None):
+        key = f"{job}:{ticker}" if ticker else job
+        if key in self._last_run:
+            return self._last_run[key]
+        if ticker and job in JOB_DATASETS:
+            return self.service.ticker_store(ticker).modified(JOB_DATASETS[job])
+        return None
+
+    def _prices_due(self, now):
+        last = self.last_run("prices")
+        if last is None:
+            return True
+        moment = dt.datetime.fromtimestamp(now, MARKET_TZ)
+        if market_open(moment):
+            return now - last >= self.intervals["prices"]
+        return last < last_close(moment).timestamp()  # Once after the close, to get the final bars
+
+    # The jobs due at `now` (epoch seconds), as (job, ticker or None)
+    def due(self, now=None):
+        now = time.time() if now is None else now
+        jobs = [("prices", None)] if self._prices_due(now) else []
+        for ticker in self.tracked_tickers():
+            for job in ("news", "financials", "info"):
+                last = self.last_run(job, ticker)
+                if last is None or now - last >= self.intervals[job]:
+                    jobs.append((job, ticker))
+        return jobs
+
+    def _run_job(self, job, ticker):
+        if job == "prices":
+            tickers = list(dict.fromkeys(list(self.service.universe) + self.tracked_tickers()))
+            return self.service.refresh_prices(self.price_days, tickers=tickers)
+        return self.service.refresh_ticker(ticker, datasets=(job,))
+
+    # Runs every due job once; returns {(job, ticker): what changed} (tickers for prices, dataset names otherwise)
+    def run_pending(self, now=None):
+        results = {}
+        with self._lock:
+            for job, ticker in self.due(now):
+                if self._stop.is_set():
+                    break
+                started = time.time() if now is None else now
+                try:
+                    with span("refresh.job", job=job, ticker=ticker or ""):
+                        changed = self._run_job(job, ticker)
+                except Exception as e:
+                    logging.warning(f"Refresh of {job}{' for ' + ticker if ticker else ''} failed: {e}")
+                    self._counters["errors"] += 1
+                    changed = None
+                else:
+                    self._counters["changed" if changed else "unchanged"] += 1
+                    if changed:
+                        logging.info(f"Refresh of {job}{' for ' + ticker if ticker else ''} changed: "
+                                     f"{', '.join(changed)}")
+                self._counters["runs"] += 1
+
+                # A failed job waits for its next turn too, rather than retrying every poll
+                self._last_run[f"{job}:{ticker}" if ticker else job] = started
+                self._save_state()
+                results[(job, ticker)] = changed
+        return results
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                self.run_pending()
+            except Exception as e:
+                logging.error(f"Refresh round failed: {e}")
+            self._stop.wait(self.poll_interval)
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, name="refresh", daemon=True)
+            self._thread.start()
+        return self
+
+    # Stops the thread after the job in progress, if any
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def stats(self):
+        stats = dict(self._counters)
+        stats["data_version"] = self.service.data_version
+        stats["last_run"] = {key: dt.datetime.fromtimestamp(value).isoformat(timespec="seconds")
+                             for key, value in sorted(self._last_run.items())}
+        return stats
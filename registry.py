@@ -0,0 +1,76 @@
+import threading
+from collections import OrderedDict
+
+from tracing import span
+
+
+# Session-level cache of per-ticker query engines
+# builders maps a tool name to a function that builds that tool's engine for a ticker.
+# Engines are built the first time a (ticker, tool) pair is used and kept for the
+# max_tickers most recently used tickers, so switching between tickers is close to free.
+# versions optionally maps a tool name to a function returning the ticker's data version;
+# an engine built from older data is rebuilt the next time it is requested.
+class ToolRegistry():
+    def __init__(self, builders, max_tickers=8, versions=None):
+        self.builders = builders
+        self.max_tickers = max_tickers
+        self.versions = versions or {}
+
+        self._engines = OrderedDict()  # ticker -> {tool name: (data version, engine)}, least recently used first
+        self._lock = threading.Lock()
+        self._build_locks = {}  # (ticker, tool) -> lock, so concurrent callers build an engine once
+
+    def version(self, ticker, tool_name):
+        version_fn = self.versions.get(tool_name)
+        return version_fn(ticker.upper()) if version_fn else None
+
+    # Returns the engine for a ticker's tool, building it on first use or when its data changed
+    def get(self, ticker, tool_name):
+        return self.entry(ticker, tool_name)[1]
+
+    # Same as get, but returns (data version the engine was built from, engine)
+    def entry(self, ticker, tool_name):
+        ticker = ticker.upper()
+        version = self.version(ticker, tool_name)
+
+        with self._lock:
+            engines = self._engines.get(ticker)
+            if engines is not None:
+                self._engines.move_to_end(ticker)
+                if tool_name in engines and engines[tool_name][0] == version:
+                    return engines[tool_name]
+            build_lock = self._build_locks.setdefault((ticker, tool_name), threading.Lock())
+
+        with build_lock:
+            # Another caller may have finished building while we waited
+            with self._lock:
+                engines = self._engines.get(ticker, {})
+                if tool_name in engines and engines[tool_name][0] == version:
+                    return engines[tool_name]
+
+            with span("registry.build", tool=tool_name, ticker=ticker):
+                engine = self.builders[tool_name](ticker)
+
+            # Building may have fetched the data, so record the version it was built from
+            version = self.version(ticker, tool_name)
+            with self._lock:
+                self._engines.setdefault(ticker, {})[tool_name] = (version, engine)
+                self._engines.move_to_end(ticker)
+                while len(self._engines) > self.max_tickers:
+                    evicted, _ = self._engines.popitem(last=False)
+                    for key in [key for key in self._build_locks if key[0] == evicted]:
+                        del self._build_locks[key]
+
+        return version, engine
+
+    # Drops cached engines for one ticker, or for every ticker
+    def invalidate(self, ticker=None):
+        with self._lock:
+            if ticker is None:
+                self._engines.clear()
+            else:
+                self._engines.pop(ticker.upper(), None)
+
+    def tickers(self):
+        with self._lock:
+            return list(self._engines)
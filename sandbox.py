@@ -0,0 +1,457 @@
+import ast
+import time
+import builtins
+import signal
+import string
+import itertools
+import threading
+import functools
+import multiprocessing
+from types import SimpleNamespace
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+# Runs the pandas code the LLM writes for PandasQueryEngine, in place of its in-process eval:
+#   - each expression is checked against an AST whitelist and compiled once (cached by its text)
+#   - it runs in a worker process with an address-space limit and a CPU-time limit per expression;
+#     a worker that doesn't answer within the wall-clock timeout is killed and replaced, so a runaway
+#     df.apply or cross join costs one error message instead of the session
+#   - workers keep the frames they have been sent, so a frame crosses the process boundary once
+#   - code runs against a copy of df and can't call mutators or file I/O, so the cached frame never
+#     changes and results can be cached per (frame, expression)
+#   - it sees a curated set of pandas and NumPy functions as pd and np, never the modules themselves,
+#     and nothing that evaluates a string of its own (df.query, df.eval, str.format field lookups)
+#
+#   executor = ExpressionExecutor(workers=2, timeout=20)
+#   executor.run(frame_key, df, "df['Close'].pct_change().std()")
+
+
+class ExpressionError(Exception):
+    pass
+
+
+# The expression uses something outside the whitelist
+class ExpressionRejected(ExpressionError):
+    pass
+
+
+# The expression ran out of CPU time, or the worker stopped answering
+class ExpressionTimeout(ExpressionError):
+    pass
+
+
+# Builtins generated code may call; anything else is a NameError
+SAFE_BUILTINS = {name: getattr(builtins, name)
+                 for name in ("abs", "all", "any", "bool", "dict", "divmod", "enumerate", "filter", "float",
+                              "format", "frozenset", "int", "isinstance", "len", "list", "map", "max", "min",
+                              "pow", "range", "repr", "reversed", "round", "set", "slice", "sorted", "str", "sum",
+                              "tuple", "zip")}
+
+ALLOWED_NODES = (
+    ast.Module, ast.Expr, ast.Assign, ast.Expression,
+    ast.Name, ast.Load, ast.Store, ast.Constant, ast.Attribute, ast.Subscript, ast.Slice, ast.Starred,
+    ast.Call, ast.keyword, ast.BinOp, ast.UnaryOp, ast.BoolOp, ast.Compare, ast.IfExp,
+    ast.Tuple, ast.List, ast.Dict, ast.Set, ast.JoinedStr, ast.FormattedValue,
+    ast.Lambda, ast.arguments, ast.arg,
+    ast.ListComp, ast.SetComp, ast.DictComp, ast.GeneratorExp, ast.comprehension,
+    ast.operator, ast.unaryop, ast.boolop, ast.cmpop,
+)
+
+# Attributes that reach files, other modules or the interpreter, e.g. df.to_csv, pd.read_pickle, np.load
+DENIED_ATTRIBUTES = {
+    "to_csv", "to_excel", "to_pickle", "to_parquet", "to_feather", "to_sql", "to_hdf", "to_json", "to_html",
+    "to_latex", "to_stata", "to_orc", "to_xml", "to_clipboard", "to_gbq", "tofile", "dump", "dumps",
+    "load", "loads", "save", "savez", "savez_compressed", "savetxt", "loadtxt", "genfromtxt", "fromfile", "memmap",
+    "fromregex", "DataSource", "HDFStore", "ExcelWriter", "ExcelFile",
+    "io", "lib", "core", "compat", "testing", "ctypeslib", "f2py", "os", "sys", "builtins", "eval", "exec",
+    "query", "style", "format_map",
+}
+# Methods that change their object in place, e.g. df.pop, df.insert, df.update, arr.sort, np.copyto
+MUTATING_ATTRIBUTES = {
+    "pop", "popitem", "insert", "update", "setdefault", "clear", "fill", "put", "itemset", "resize", "setflags",
+    "setfield", "sort", "copyto", "putmask", "place", "put_along_axis", "fill_diagonal",
+}
+# Methods that return text but write to a file or buffer when given one (their first argument)
+WRITER_ATTRIBUTES = {"to_string", "to_markdown"}
+# str.format resolves attributes and keys named in its fields ("{0.__class__}"), so only fields that
+# are plain positions or names are allowed, and only in a literal format string
+FORMAT_ATTRIBUTES = {"format"}
+DENIED_NAMES = {"eval", "exec", "compile", "open", "getattr", "setattr", "delattr", "globals", "locals", "vars",
+                "input", "breakpoint", "help", "exit", "quit", "memoryview", "type", "object", "super"}
+
+
+# Raises ExpressionRejected unless every node, name and attribute is allowed
+def validate(tree):
+    for node in ast.walk(tree):
+        if not isinstance(node, ALLOWED_NODES):
+            raise ExpressionRejected(f"{type(node).__name__} is not allowed")
+        if isinstance(node, ast.Name) and (node.id.startswith("_") or node.id in DENIED_NAMES):
+            raise ExpressionRejected(f"Name '{node.id}' is not allowed")
+        if isinstance(node, ast.Attribute) and (node.attr.startswith("_") or node.attr in DENIED_ATTRIBUTES
+                                                or node.attr.startswith("read_")):
+            raise ExpressionRejected(f"Attribute '{node.attr}' is not allowed")
+        if isinstance(node, ast.Attribute) and node.attr in MUTATING_ATTRIBUTES:
+            raise ExpressionRejected(f"'{node.attr}' changes its object in place and is not allowed")
+        if (isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) and node.func.attr in WRITER_ATTRIBUTES
+                and (node.args or any(k.arg is None or "buf" in k.arg or "path" in k.arg for k in node.keywords))):
+            raise ExpressionRejected(f"{node.func.attr} may only return text, not write to a file or buffer")
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) and node.func.attr in FORMAT_ATTRIBUTES:
+            _check_format(node.func.value)
+        if isinstance(node, ast.Call):
+            # Methods dispatch on a name given as a string too, e.g. df.agg("query", ...)
+            for arg in node.args + [k.value for k in node.keywords]:
+                if isinstance(arg, ast.Constant) and isinstance(arg.value, str) and _denied_name(arg.value):
+                    raise ExpressionRejected(f"'{arg.value}' is not allowed")
+        if isinstance(node, ast.keyword) and node.arg == "inplace":
+            raise ExpressionRejected("inplace changes to df are not allowed")
+        if isinstance(node, ast.Assign) and not all(isinstance(target, ast.Name) for target in node.targets):
+            raise ExpressionRejected("Only assignments to plain names are allowed")
+
+
+def _denied_name(name):
+    return (name.startswith("_") or name.startswith("read_") or name in DENIED_ATTRIBUTES
+            or name in MUTATING_ATTRIBUTES)
+
+
+def _check_format(template):
+    if not (isinstance(template, ast.Constant) and isinstance(template.value, str)):
+        raise ExpressionRejected("format may only be called on a literal string")
+    try:
+        fields = [field for _, field, _, _ in string.Formatter().parse(template.value) if field is not None]
+    except ValueError as e:
+        raise ExpressionRejected(f"Invalid format string: {e}")
+    if any("." in field or "[" in field for field in fields):
+        raise ExpressionRejected("Format fields may not look up attributes or items")
+
+
+# Validates and compiles generated code once per distinct text
+# Returns (code for the statements before the last line or None, code for the final expression)
+@functools.lru_cache(maxsize=1024)
+def compile_expression(source):
+    try:
+        tree = ast.parse(source.strip())
+    except SyntaxError as e:
+        raise ExpressionRejected(f"Invalid syntax: {e.msg}")
+    if not tree.body or not isinstance(tree.body[-1], ast.Expr):
+        raise ExpressionRejected("The code must end with an expression")
+
+    # A quoted expression ("df.head()") is unwrapped rather than returned as a string
+    last = tree.body[-1].value
+    if isinstance(last, ast.Constant) and isinstance(last.value, str) and len(tree.body) == 1:
+        return compile_expression(last.value)
+
+    validate(tree)
+    statements = None
+    if len(tree.body) > 1:
+        statements = compile(ast.Module(tree.body[:-1], type_ignores=[]), "<expression>", "exec")
+    expression = compile(ast.Expression(last), "<expression>", "eval")
+    return statements, expression
+
+
+# What generated code sees as pd and np: functions and types for analysing a frame, without the
+# modules (and the submodules, file readers and string evaluators they lead to)
+PANDAS_NAMES = (
+    "DataFrame", "Series", "Index", "DatetimeIndex", "MultiIndex", "Categorical", "Timestamp", "Timedelta",
+    "DateOffset", "Grouper", "IndexSlice", "NaT", "NA", "to_datetime", "to_numeric", "to_timedelta", "concat",
+    "merge", "merge_asof", "date_range", "bdate_range", "period_range", "timedelta_range", "isna", "isnull",
+    "notna", "notnull", "cut", "qcut", "pivot_table", "crosstab", "get_dummies", "unique",
+)
+NUMPY_NAMES = (
+    "nan", "inf", "pi", "e", "newaxis", "float64", "float32", "int64", "int32", "bool_", "datetime64",
+    "timedelta64", "array", "asarray", "arange", "linspace", "zeros", "ones", "full", "where", "select",
+    "abs", "absolute", "negative", "add", "subtract", "multiply", "divide", "sign", "sqrt", "square", "exp",
+    "expm1", "log", "log1p", "log2", "log10", "power",
+    "round", "floor", "ceil", "clip", "maximum", "minimum", "isnan", "isfinite", "isinf", "nan_to_num",
+    "sum", "prod", "cumsum", "cumprod", "diff", "mean", "median", "std", "var", "min", "max", "ptp",
+    "argmin", "argmax", "argsort", "percentile", "quantile", "average", "nansum", "nanmean", "nanmedian",
+    "nanstd", "nanvar", "nanmin", "nanmax", "nanpercentile", "nanquantile", "corrcoef", "cov", "polyfit",
+    "polyval", "histogram", "unique", "concatenate", "stack", "vstack", "hstack", "all", "any", "count_nonzero",
+)
+SAFE_PANDAS = SimpleNamespace(**{name: getattr(pd, name) for name in PANDAS_NAMES})
+SAFE_NUMPY = SimpleNamespace(**{name: getattr(np, name) for name in NUMPY_NAMES})
+
+
+# Runs compiled code against a copy of df and returns the result as text
+# Lambdas and comprehensions look names up in globals, so everything lives in one namespace
+def evaluate(source, df):
+    statements, expression = compile_expression(source)
+    namespace = {"__builtins__": SAFE_BUILTINS, "pd": SAFE_PANDAS, "np": SAFE_NUMPY, "df": df.copy()}
+    if statements is not None:
+        exec(statements, namespace)
+    return str(eval(expression, namespace))
+
+
+# Limits the rest of this process's address space to memory_mb above what it uses now
+def _limit_memory(memory_mb):
+    try:
+        import resource
+        with open("/proc/self/status") as f:
+            in_use = next(int(line.split()[1]) * 1024 for line in f if line.startswith("VmSize:"))
+        limit = in_use + memory_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    except (ImportError, OSError, StopIteration, ValueError):
+        pass  # Not Linux: rely on the wall-clock timeout only
+
+
+def _on_cpu_limit(signum, frame):
+    raise ExpressionTimeout("Expression exceeded its CPU time limit")
+
+
+# Gives the next expression cpu_seconds of CPU time; past that the kernel sends SIGXCPU
+def _set_cpu_limit(cpu_seconds):
+    try:
+        import resource
+    except ImportError:
+        return
+    _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    if cpu_seconds is None:
+        resource.setrlimit(resource.RLIMIT_CPU, (hard, hard))
+        return
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    soft = int(usage.ru_utime + usage.ru_stime + cpu_seconds) + 1
+    resource.setrlimit(resource.RLIMIT_CPU, (soft if hard == resource.RLIM_INFINITY else min(soft, hard), hard))
+
+
+def _refuse_string_evaluation(*args, **kwargs):
+    raise ExpressionRejected("Evaluating strings (query, eval) is not allowed")
+
+
+# Worker process: receives (frame key, frame or None, keys to forget, source), answers (status, text)
+def _worker_main(conn, memory_mb, cpu_seconds):
+    if hasattr(signal, "SIGXCPU"):
+        signal.signal(signal.SIGXCPU, _on_cpu_limit)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # Ctrl-C is for the parent to handle
+    _limit_memory(memory_mb)
+    # Nothing but generated code runs here, so the string evaluators can go for good - also out of
+    # reach of a method name built at run time, e.g. df.agg("qu" + "ery", ...)
+    pd.DataFrame.query = pd.DataFrame.eval = pd.eval = _refuse_string_evaluation
+    conn.send("ready")
+
+    frames = {}
+    while True:
+        try:
+            key, df, forget, source = conn.recv()
+        except (EOFError, OSError):
+            return
+        for old_key in forget:
+            frames.pop(old_key, None)
+        if df is not None:
+            frames[key] = df
+
+        try:
+            _set_cpu_limit(cpu_seconds)
+            try:
+                reply = ("ok", evaluate(source, frames[key]))
+            finally:
+                _set_cpu_limit(None)
+        except ExpressionTimeout as e:
+            reply = ("timeout", str(e))
+        except MemoryError:
+            reply = ("error", "MemoryError: expression exceeded the memory limit")
+        except Exception as e:
+            reply = ("error", f"{type(e).__name__}: {e}")
+        conn.send(reply)
+
+
+class _Worker():
+    def __init__(self, context, memory_mb, cpu_seconds):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child_conn, memory_mb, cpu_seconds), daemon=True)
+        self.process.start()
+        child_conn.close()
+
+        # Startup (importing pandas in the new process) doesn't count against an expression's timeout
+        if not self.conn.poll(60) or self.conn.recv() != "ready":
+            self.kill()
+            raise ExpressionError("The expression worker process failed to start")
+        self.frames = OrderedDict()  # Frame keys this worker holds, least recently used first
+
+    def kill(self):
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+
+# Runs generated expressions against DataFrames with limits
+# workers=0 evaluates in the calling thread (still validated and cached, but without limits)
+class ExpressionExecutor():
+    # timeout is the wall-clock limit per expression and cpu_seconds its CPU-time limit; memory_mb caps
+    # what a worker may allocate; frames_per_worker is how many frames each worker keeps
+    def __init__(self, workers=2, timeout=20, cpu_seconds=10, memory_mb=2048, frames_per_worker=16,
+                 cache_size=1024):
+        self.workers = workers
+        self.timeout = timeout
+        self.cpu_seconds = cpu_seconds
+        self.memory_mb = memory_mb
+        self.frames_per_worker = frames_per_worker
+        self.cache_size = cache_size
+
+        # Spawned rather than forked: the agent process runs threads and an event loop
+        self._context = multiprocessing.get_context("spawn")
+        self._idle = []
+        self._started = 0
+        self._available = threading.Condition()
+        self._results = OrderedDict()  # (frame key, source) -> text
+        self._results_lock = threading.Lock()
+        self._counters = {"runs": 0, "cache_hits": 0, "rejected": 0, "errors": 0, "timeouts": 0,
+                          "workers_restarted": 0, "seconds": 0.0}
+        self._keys = itertools.count()
+
+    # A key identifying a frame to the workers; each engine takes one for its frame
+    def new_frame_key(self):
+        return next(self._keys)
+
+    def _count(self, name, amount=1):
+        with self._results_lock:
+            self._counters[name] += amount
+
+    def _acquire(self, frame_key):
+        with self._available:
+            while not self._idle and self._started >= self.workers:
+                self._available.wait()
+            if self._idle:
+                # Prefer a worker that already holds the frame
+                for i, worker in enumerate(self._idle):
+                    if frame_key in worker.frames:
+                        return self._idle.pop(i)
+                return self._idle.pop()
+            self._started += 1
+        return self._start_worker()
+
+    # Starts a worker whose slot has already been counted in _started
+    def _start_worker(self):
+        try:
+            return _Worker(self._context, self.memory_mb, self.cpu_seconds)
+        except Exception:
+            with self._available:
+                self._started -= 1
+                self._available.notify()
+            raise
+
+    def _release(self, worker, alive=True):
+        with self._available:
+            if alive:
+                self._idle.append(worker)
+            else:
+                self._started -= 1
+            self._available.notify()
+
+    def _run_in_worker(self, frame_key, df, source):
+        worker = self._acquire(frame_key)
+        try:
+            send_frame = frame_key not in worker.frames
+            forget = []
+            worker.frames[frame_key] = True
+            worker.frames.move_to_end(frame_key)
+            while len(worker.frames) > self.frames_per_worker:
+                forget.append(worker.frames.popitem(last=False)[0])
+
+            worker.conn.send((frame_key, df if send_frame else None, forget, source))
+            if not worker.conn.poll(self.timeout):
+                raise ExpressionTimeout(f"Expression did not finish within {self.timeout}s")
+            status, text = worker.conn.recv()
+        except ExpressionTimeout:
+            worker.kill()
+            self._release(worker, alive=False)
+            self._count("workers_restarted")
+            raise
+        except (EOFError, OSError, BrokenPipeError):
+            # The worker died, e.g. killed by the kernel for exceeding a hard limit
+            worker.kill()
+            self._release(worker, alive=False)
+            self._count("workers_restarted")
+            raise ExpressionError("The expression's worker process exited")
+        except BaseException:
+            worker.kill()
+            self._release(worker, alive=False)
+            raise
+
+        self._release(worker)
+        if status == "timeout":
+            raise ExpressionTimeout(text)
+        if status != "ok":
+            raise ExpressionError(text)
+        return text
+
+    # Evaluates source against df (registered under frame_key) and returns the result as text
+    # Raises ExpressionRejected, ExpressionTimeout or ExpressionError (with the Python error message)
+    def run(self, frame_key, df, source):
+        cache_key = (frame_key, source)
+        with self._results_lock:
+            self._counters["runs"] += 1
+            if cache_key in self._results:
+                self._results.move_to_end(cache_key)
+                self._counters["cache_hits"] += 1
+                return self._results[cache_key]
+
+        start = time.perf_counter()
+        try:
+            compile_expression(source)  # Rejected code never reaches a worker
+            if self.workers:
+                text = self._run_in_worker(frame_key, df, source)
+            else:
+                text = evaluate(source, df)
+        except ExpressionRejected:
+            self._count("rejected")
+            raise
+        except ExpressionTimeout:
+            self._count("timeouts")
+            raise
+        except ExpressionError:
+            self._count("errors")
+            raise
+        except Exception as e:
+            self._count("errors")
+            raise ExpressionError(f"{type(e).__name__}: {e}")
+        finally:
+            self._count("seconds", time.perf_counter() - start)
+
+        with self._results_lock:
+            self._results[cache_key] = text
+            while len(self._results) > self.cache_size:
+                self._results.popitem(last=False)
+        return text
+
+    # Starts the worker processes now instead of on the first expression
+    # In the background, expressions that arrive meanwhile wait for the first worker to be ready
+    def warm(self, background=False):
+        if background:
+            threading.Thread(target=self.warm, daemon=True).start()
+            return self
+
+        with self._available:
+            missing = max(self.workers - self._started, 0)
+            self._started += missing
+        for _ in range(missing):
+            self._release(self._start_worker())
+        return self
+
+    def close(self):
+        with self._available:
+            workers, self._idle = self._idle, []
+            self._started -= len(workers)
+        for worker in workers:
+            worker.kill()
+
+    def stats(self):
+        with self._results_lock:
+            stats = dict(self._counters)
+        stats["seconds"] = round(stats["seconds"], 3)
+        stats["cached_results"] = len(self._results)
+        stats["compiled"] = compile_expression.cache_info().currsize
+        return stats
+
+
+_default_executor = None
+_default_lock = threading.Lock()
+
+
+# The executor agents use unless given their own, so one set of workers serves every agent in the process
+def default_executor():
+    global _default_executor
+    with _default_lock:
+        if _default_executor is None:
+            _default_executor = ExpressionExecutor()
+        return _default_executor
@@ -0,0 +1,410 @@
+import os
+import ast
+import time
+import logging
+import operator
+import threading
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from analytics import METRICS, FINANCIAL_ITEMS, compute_price_metrics, financial_metrics_by_ticker
+from tracing import traced, current_span
+
+# Cross-ticker screening over everything StockDataService has stored. The screen table has one row
+# per ticker (the universe plus every ticker with stored prices or datasets) and one column per field:
+#   - the headline metrics of analytics.py (returns, volatility, moving averages, growth, margins),
+#     statement-based ones for all tickers at once from the FinancialsStore index
+#   - valuation fields of the ticker's stored metrics, under the short names in VALUATION_FIELDS
+#   - ratios between statement line items (DERIVED_RATIOS), at each ticker's latest reported period
+#   - sector and industry, as categoricals
+# Rows are recomputed only for tickers whose prices or metrics changed, and the statement-based
+# fields only when some ticker's financials did. The table is saved as the "screen" dataset with the
+# versions each row came from, so a restart only recomputes rows whose data changed meanwhile.
+#
+# Filters and rankings are small expressions over the columns, evaluated a whole column at a time:
+#   screener.screen("peg < 1 and fcf_growth > 0", rank_by="roe / pe", limit=10)
+#   screener.screen("sector == 'Technology' and volatility_1y < 0.3", rank_by="rank(return_1y) - rank(pe)")
+# Expressions may use field names, numbers, strings, arithmetic, comparisons (including
+# `in [...]`), and/or/not, and the functions in FUNCTIONS; nothing else is accepted.
+
+# Short name -> (yfinance info keys, first one present wins; scale applied to the value)
+VALUATION_FIELDS = {
+    "pe": (("trailingPE",), 1),
+    "forward_pe": (("forwardPE",), 1),
+    "peg": (("pegRatio", "trailingPegRatio"), 1),
+    "price_to_book": (("priceToBook",), 1),
+    "price_to_sales": (("priceToSalesTrailing12Months",), 1),
+    "ev_to_ebitda": (("enterpriseToEbitda",), 1),
+    "roe": (("returnOnEquity",), 1),
+    "roa": (("returnOnAssets",), 1),
+    "profit_margin": (("profitMargins",), 1),
+    "debt_to_equity": (("debtToEquity",), 0.01),  # yfinance reports it in percent
+    "current_ratio": (("currentRatio",), 1),
+    "dividend_yield": (("dividendYield",), 1),
+    "market_cap": (("marketCap",), 1),
+    "beta": (("beta",), 1),
+}
+
+TEXT_FIELDS = ["sector", "industry"]
+
+# Ratio name -> (numerator, denominator) line items
+DERIVED_RATIOS = {
+    "fcf_margin": ("CF_FreeCashFlow", "IS_TotalRevenue"),
+    "fcf_to_net_income": ("CF_FreeCashFlow", "IS_NetIncome"),
+    "debt_to_assets": ("BS_TotalDebt", "BS_TotalAssets"),
+    "cash_to_debt": ("BS_CashAndCashEquivalents", "BS_TotalDebt"),
+}
+
+NUMERIC_FIELDS = [key for key in METRICS] + list(VALUATION_FIELDS) + list(DERIVED_RATIOS)
+
+# Fields computed from the financial statements, for all tickers at once; the rest are computed per ticker
+FINANCIAL_FIELDS = [key for key, (_, _, source) in METRICS.items() if source == "financials"] + list(DERIVED_RATIOS)
+
+# Data versions each row of the saved screen table was computed from
+VERSION_COLUMNS = ["prices_version", "financials_version", "metrics_version"]
+
+# Other names accepted in expressions
+ALIASES = {
+    "fcf_growth": "free_cash_flow_growth_yoy",
+    "revenue_growth": "revenue_growth_yoy",
+    "earnings_growth": "net_income_growth_yoy",
+    "net_income_growth": "net_income_growth_yoy",
+    "pe_ratio": "pe",
+    "peg_ratio": "peg",
+    "price": "latest_close",
+}
+
+FUNCTIONS = {
+    "abs": np.abs,
+    "log": np.log,
+    "sqrt": np.sqrt,
+    "rank": lambda values: values.rank(pct=True),  # 0-1 percentile within the rows being screened
+}
+
+ALLOWED_NODES = (
+    ast.Expression, ast.BoolOp, ast.And, ast.Or, ast.UnaryOp, ast.Not, ast.USub, ast.UAdd,
+    ast.BinOp, ast.Add, ast.Sub, ast.Mult, ast.Div, ast.Pow, ast.Mod, ast.Compare,
+    ast.Lt, ast.LtE, ast.Gt, ast.GtE, ast.Eq, ast.NotEq, ast.In, ast.NotIn,
+    ast.Name, ast.Load, ast.Constant, ast.List, ast.Tuple, ast.Call,
+)
+
+BINARY_OPS = {ast.Add: operator.add, ast.Sub: operator.sub, ast.Mult: operator.mul, ast.Div: operator.truediv,
+              ast.Pow: operator.pow, ast.Mod: operator.mod}
+COMPARE_OPS = {ast.Lt: operator.lt, ast.LtE: operator.le, ast.Gt: operator.gt, ast.GtE: operator.ge,
+               ast.Eq: operator.eq, ast.NotEq: operator.ne}
+
+
+class ScreenError(ValueError):
+    pass
+
+
+# Parses and checks a filter or ranking expression once; the tree is reused for every screen
+@lru_cache(maxsize=512)
+def parse_expression(source):
+    try:
+        tree = ast.parse(source.strip(), mode="eval")
+    except SyntaxError as e:
+        raise ScreenError(f"Invalid expression {source!r}: {e.msg}")
+
+    for node in ast.walk(tree):
+        if not isinstance(node, ALLOWED_NODES):
+            raise ScreenError(f"{type(node).__name__} is not allowed in screen expressions")
+        if isinstance(node, ast.Call):
+            if not isinstance(node.func, ast.Name) or node.func.id not in FUNCTIONS or node.keywords \
+                    or len(node.args) != 1:
+                raise ScreenError(f"Only {', '.join(FUNCTIONS)} of a single value can be called")
+        if isinstance(node, ast.Compare):
+            for op, right in zip(node.ops, node.comparators):
+                if isinstance(op, (ast.In, ast.NotIn)) and not isinstance(right, (ast.List, ast.Tuple)):
+                    raise ScreenError("`in` needs a list, e.g. sector in ['Technology', 'Healthcare']")
+    return tree.body
+
+
+def resolve_field(name, columns):
+    key = name.lower()
+    key = ALIASES.get(key, key)
+    if key not in columns:
+        raise ScreenError(f"Unknown field {name!r}. Fields: {', '.join(columns)}")
+    return key
+
+
+# Field names an expression refers to, in order of appearance
+def expression_fields(source, columns):
+    calls = {id(node.func) for node in ast.walk(parse_expression(source)) if isinstance(node, ast.Call)}
+    names = [node.id for node in ast.walk(parse_expression(source))
+             if isinstance(node, ast.Name) and id(node) not in calls]
+    return list(dict.fromkeys(resolve_field(name, columns) for name in names))
+
+
+# Evaluates a parsed expression against a table, a column (Series) at a time
+def evaluate(node, table):
+    if isinstance(node, ast.Constant):
+        # Numbers are floats, so constant arithmetic like 10 ** 10 ** 10 overflows instead of running forever
+        if isinstance(node.value, (int, float)) and not isinstance(node.value, bool):
+            return float(node.value)
+        return node.value
+    if isinstance(node, ast.Name):
+        return table[resolve_field(node.id, table.columns)]
+    if isinstance(node, (ast.List, ast.Tuple)):
+        return [evaluate(element, table) for element in node.elts]
+    if isinstance(node, ast.Call):
+        return FUNCTIONS[node.func.id](evaluate(node.args[0], table))
+    if isinstance(node, ast.UnaryOp):
+        value = evaluate(node.operand, table)
+        if isinstance(node.op, ast.Not):
+            return ~value if isinstance(value, pd.Series) else not value
+        return -value if isinstance(node.op, ast.USub) else value
+    if isinstance(node, ast.BinOp):
+        return BINARY_OPS[type(node.op)](evaluate(node.left, table), evaluate(node.right, table))
+    if isinstance(node, ast.BoolOp):
+        values = [evaluate(value, table) for value in node.values]
+        combine = operator.and_ if isinstance(node.op, ast.And) else operator.or_
+        result = values[0]
+        for value in values[1:]:
+            result = combine(result, value)
+        return result
+    if isinstance(node, ast.Compare):
+        # a < b < c is (a < b) and (b < c); comparisons with a missing value are False
+        left, result = evaluate(node.left, table), True
+        for op, comparator in zip(node.ops, node.comparators):
+            right = evaluate(comparator, table)
+            if isinstance(op, (ast.In, ast.NotIn)):
+                matches = left.isin(right) if isinstance(left, pd.Series) else left in right
+                value = ~matches if isinstance(op, ast.NotIn) else matches
+            else:
+                value = COMPARE_OPS[type(op)](left, right)
+            result = value if result is True else result & value
+            left = right
+        return result
+    raise ScreenError(f"{type(node).__name__} is not allowed in screen expressions")
+
+
+# Fields shown as percentages (stored as fractions)
+PERCENT_FIELDS = {key for key, (_, kind, _) in METRICS.items() if kind == "pct"} | \
+    {"roe", "roa", "profit_margin", "fcf_margin"}
+
+
+# Screen results with each value formatted for reading (missing values as n/a)
+def format_table(df):
+    def formatter(name):
+        if name in PERCENT_FIELDS:
+            return lambda value: f"{value * 100:.1f}%"
+        if name == "market_cap":
+            return lambda value: f"${value / 1e9:,.1f}B"
+        return lambda value: f"{value:,.4g}" if isinstance(value, (float, int, np.floating)) else str(value)
+
+    return pd.DataFrame({name: df[name].map(lambda value, fmt=formatter(name): "n/a" if pd.isna(value) else fmt(value))
+                         for name in df.columns}, index=df.index)
+
+
+# Latest value of one of a ticker's metrics, scaled, or NaN
+def _valuation(metrics, keys, scale):
+    for key in keys:
+        if key in metrics.columns:
+            value = pd.to_numeric(metrics[key].iloc[0], errors="coerce")
+            if pd.notna(value):
+                return float(value) * scale
+    return np.nan
+
+
+class Screener():
+    # service is the StockDataService whose stored data is screened
+    # max_age is how long (seconds) a table is used before the tickers' data versions are checked again;
+    # refreshes through the service (see refresh.py) make the next screen check at once
+    def __init__(self, service, max_age=2.0):
+        self.service = service
+        self.max_age = max_age
+
+        self._rows = {}  # ticker -> ((prices version, metrics version), {field: value})
+        self._financials = None  # (financials versions, Ticker x field frame)
+        self._table = None  # (versions of every ticker, table)
+        self._checked = None  # (time.monotonic(), service.data_version) of the last version check
+        self._lock = threading.Lock()
+
+    @property
+    def columns(self):
+        return NUMERIC_FIELDS + TEXT_FIELDS
+
+    # Tickers with their own datasets (financials, info, metrics, news) stored
+    def _stored_tickers(self):
+        tickers_dir = os.path.join(self.service.output_dir, "tickers")
+        return set(os.listdir(tickers_dir)) if os.path.isdir(tickers_dir) else set()
+
+    # Every ticker there is something stored for, plus the universe
+    def tickers(self):
+        tickers = set(self.service.universe) | set(list(self.service.price_store.manifest)) | self._stored_tickers()
+        return sorted(ticker.upper() for ticker in tickers)
+
+    # (prices, financials, metrics) versions; tickers without a directory of their own aren't given one
+    def _version(self, ticker, stored):
+        if ticker not in stored:
+            return (self.service.price_store.version(ticker), None, None)
+        store = self.service.ticker_store(ticker)
+        return (self.service.price_store.version(ticker), store.version("financials"), store.version("metrics"))
+
+    # Price metrics and valuation fields of one ticker; only the columns needed are read
+    def _row(self, ticker, version):
+        row = {}
+        if version[0] is not None:
+            prices = self.service.price_store.store.load(ticker, columns=["Close", "Volume"])
+            row.update(compute_price_metrics(prices))
+            row.pop("as_of", None)
+        if version[2] is not None:
+            keys = {key for keys, _ in VALUATION_FIELDS.values() for key in keys}
+            metrics = self.service.ticker_store(ticker).load("metrics", columns=sorted(keys) + TEXT_FIELDS)
+            if not metrics.empty:
+                for name, (keys, scale) in VALUATION_FIELDS.items():
+                    row[name] = _valuation(metrics, keys, scale)
+                for name in TEXT_FIELDS:
+                    if name in metrics.columns and pd.notna(metrics[name].iloc[0]):
+                        row[name] = str(metrics[name].iloc[0])
+        return row
+
+    # Growth, margins and DERIVED_RATIOS for every ticker with financials, from the FinancialsStore index
+    def _financial_fields(self, versions):
+        tickers = [ticker for ticker, version in versions.items() if version[1] is not None]
+        key = tuple((ticker, versions[ticker][1]) for ticker in tickers)
+        if self._financials is not None and self._financials[0] == key:
+            return self._financials[1]
+
+        items = list(dict.fromkeys(FINANCIAL_ITEMS + [item for pair in DERIVED_RATIOS.values() for item in pair]))
+        latest = self.service.financials.latest(items, tickers) if tickers else \
+            pd.DataFrame(columns=pd.MultiIndex.from_product([items, [1, 2]]), dtype=np.float64)
+        fields = financial_metrics_by_ticker(latest)
+        for name, (numerator, denominator) in DERIVED_RATIOS.items():
+            bottom = latest[(denominator, 1)]
+            fields[name] = latest[(numerator, 1)] / bottom.where(bottom != 0)
+
+        self._financials = (key, fields)
+        return fields
+
+    # The screen table: tickers (index) by fields (columns)
+    # Rebuilt when any ticker's data version moved, recomputing only the rows of tickers whose prices or
+    # metrics changed; statement fields are computed for all tickers at once when any financials changed
+    @traced("screener.table")
+    def table(self):
+        with self._lock:
+            checked = self._checked
+            if self._table is not None and checked is not None and checked[1] == self.service.data_version \
+                    and time.monotonic() - checked[0] < self.max_age:
+                current_span().set("checked", False)
+                return self._table[1]
+
+            if self._table is None and not self._rows:
+                self._load_saved()
+            data_version = self.service.data_version
+            stored = self._stored_tickers()
+            versions = {ticker: self._version(ticker, stored) for ticker in self.tickers()}
+            key = tuple(versions.items())
+            self._checked = (time.monotonic(), data_version)
+            current_span().set("checked", True)
+            if self._table is not None and self._table[0] == key:
+                return self._table[1]
+
+            rows, rebuilt = {}, 0
+            for ticker, version in versions.items():
+                cached = self._rows.get(ticker)
+                if cached is None or cached[0] != (version[0], version[2]):
+                    cached = ((version[0], version[2]), self._row(ticker, version))
+                    rebuilt += 1
+                rows[ticker] = cached
+
+            table = pd.DataFrame.from_dict({ticker: row for ticker, (_, row) in rows.items()}, orient="index")
+            table = table.reindex(index=list(versions), columns=self.columns)
+            financial = self._financial_fields(versions).reindex(table.index)
+            table[list(financial.columns)] = financial
+            table[NUMERIC_FIELDS] = table[NUMERIC_FIELDS].astype(np.float64)
+            for name in TEXT_FIELDS:
+                table[name] = table[name].astype("category")
+            table.index.name = "Ticker"
+
+            self._rows = rows
+            self._table = (key, table)
+            self._save(table, versions)
+            current_span().set("tickers", len(table)).set("rebuilt", rebuilt)
+            return table
+
+    def _save(self, table, versions):
+        columns = {name: pd.array([versions[ticker][i] for ticker in table.index], dtype="Int64")
+                   for i, name in enumerate(VERSION_COLUMNS)}
+        try:
+            self.service.store.save("screen", table.assign(**columns))
+        except Exception as e:
+            logging.warning(f"Could not save the screen table: {e}")
+
+    # Seeds the per-ticker rows and statement fields from the table saved by an earlier run
+    def _load_saved(self):
+        try:
+            saved = self.service.store.load("screen")
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            logging.warning(f"Ignoring unreadable screen table: {e}")
+            return
+        if list(saved.columns) != self.columns + VERSION_COLUMNS:
+            return  # Saved with other fields
+
+        versions = {column: [None if pd.isna(value) else int(value) for value in saved[column]]
+                    for column in VERSION_COLUMNS}
+        row_fields = [name for name in self.columns if name not in FINANCIAL_FIELDS]
+        values = saved[row_fields].astype(object).where(saved[row_fields].notna(), np.nan)
+        for i, (ticker, row) in enumerate(zip(saved.index, values.to_dict("records"))):
+            self._rows[ticker] = ((versions["prices_version"][i], versions["metrics_version"][i]), row)
+
+        with_financials = [i for i, version in enumerate(versions["financials_version"]) if version is not None]
+        key = tuple((saved.index[i], versions["financials_version"][i]) for i in with_financials)
+        self._financials = (key, saved[FINANCIAL_FIELDS].iloc[with_financials])
+
+    # Tickers passing the `where` filter, best first by `rank_by` (highest first unless ascending),
+    # with the fields both expressions use plus `columns`; at most `limit` rows (all if None)
+    @traced("screener.screen", args=("where", "rank_by"))
+    def screen(self, where="", rank_by="", ascending=False, limit=20, columns=()):
+        return self._screen(self.table(), where, rank_by, ascending, limit, columns)
+
+    def _screen(self, table, where, rank_by, ascending, limit, columns):
+        rows = table
+        try:
+            if where:
+                mask = evaluate(parse_expression(where), table)
+                if not isinstance(mask, pd.Series) or mask.dtype != bool:
+                    raise ScreenError(f"Filter {where!r} must be a comparison, e.g. pe < 20 and roe > 0.15")
+                rows = table[mask]
+
+            fields = expression_fields(where, table.columns) if where else []
+            if rank_by:
+                score = evaluate(parse_expression(rank_by), rows)
+                if not isinstance(score, pd.Series) or not pd.api.types.is_numeric_dtype(score):
+                    raise ScreenError(f"Ranking {rank_by!r} must be a number per ticker, e.g. roe / pe")
+                score = score.astype(np.float64).replace([np.inf, -np.inf], np.nan)
+                rows = rows.assign(score=score).dropna(subset=["score"]).sort_values("score", ascending=ascending)
+                ranked = [field for field in expression_fields(rank_by, table.columns) if field not in fields]
+                fields = ["score"] + ranked + fields
+        except (TypeError, ValueError, ArithmeticError) as e:
+            if isinstance(e, ScreenError):
+                raise
+            raise ScreenError(f"Could not evaluate {where or rank_by!r}: {e}")
+
+        fields += [resolve_field(name, table.columns) for name in columns if name not in fields]
+        current_span().set("matched", len(rows))
+        result = rows[fields or ["latest_close"]]
+        return result.head(limit) if limit else result
+
+    # The screen as text for the agent: how many tickers matched out of how many, then the top rows
+    @traced("screener.summary", args=("where", "rank_by"))
+    def summary(self, where="", rank_by="", ascending=False, limit=10):
+        table = self.table()
+        try:
+            result = self._screen(table, where, rank_by, ascending, None, ())
+        except ScreenError as e:
+            return str(e)
+
+        header = f"{len(result)} of {len(table)} tickers"
+        header += f" match {where}" if where else ""
+        header += f", ranked by {rank_by} ({'lowest' if ascending else 'highest'} first)" if rank_by else ""
+        if result.empty:
+            return header + "."
+        shown = result.head(limit) if limit else result
+        more = f"\n... and {len(result) - len(shown)} more" if len(result) > len(shown) else ""
+        return f"{header}:\n{format_table(shown).to_string()}{more}"
@@ -0,0 +1,363 @@
+import json
+import time
+import asyncio
+import logging
+import argparse
+from collections import deque
+from contextlib import asynccontextmanager
+
+import numpy as np
+from aiohttp import web, WSMsgType
+
+from rag import StockAnalyzerAgent
+from universe import valid_ticker
+
+# Requests that have not finished by then are cancelled
+REQUEST_TIMEOUT = 180
+
+# Completed requests kept for the latency percentiles and throughput
+METRICS_WINDOW = 1000
+THROUGHPUT_WINDOW = 60
+
+
+class PoolBusy(Exception):
+    pass
+
+
+# Fixed set of warm agents handed out one request at a time
+# A request gets an agent to itself for its whole run. Callers wait in line when every
+# agent is busy and are served in arrival order: a freed agent goes straight to the longest
+# waiting request, and newcomers only take an idle agent when nobody is waiting. Once
+# max_pending are already waiting, or the wait exceeds acquire_timeout, new requests are
+# turned away with PoolBusy instead of piling up.
+class AgentPool():
+    def __init__(self, agents, max_pending=32, acquire_timeout=30):
+        self.agents = list(agents)
+        self.max_pending = max_pending
+        self.acquire_timeout = acquire_timeout
+        self.pending = 0
+
+        self._idle = deque(self.agents)
+        self._waiters = deque()  # Futures of the requests waiting for an agent, oldest first
+
+    @property
+    def idle(self):
+        return len(self._idle)
+
+    @asynccontextmanager
+    async def acquire(self):
+        if self._idle and not self._waiters:
+            agent = self._idle.popleft()
+        else:
+            agent = await self._wait_for_agent()
+
+        try:
+            yield agent
+        finally:
+            self._release(agent)
+
+    def _release(self, agent):
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(agent)
+                return
+        self._idle.append(agent)
+
+    async def _wait_for_agent(self):
+        if self.pending >= self.max_pending:
+            raise PoolBusy(f"{self.pending} requests already waiting")
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self.pending += 1
+        try:
+            return await asyncio.wait_for(waiter, self.acquire_timeout)
+        except BaseException as e:
+            if waiter.done() and not waiter.cancelled():
+                self._release(waiter.result())  # Handed an agent just as the wait was given up
+            elif waiter in self._waiters:
+                self._waiters.remove(waiter)
+            if isinstance(e, asyncio.TimeoutError):
+                raise PoolBusy(f"No agent free after {self.acquire_timeout}s")
+            raise
+        finally:
+            self.pending -= 1
+
+
+def percentiles(values):
+    if not values:
+        return {"p50": None, "p95": None, "p99": None}
+    p50, p95, p99 = np.percentile(np.fromiter(values, dtype=np.float64), [50, 95, 99])
+    return {"p50": round(p50, 3), "p95": round(p95, 3), "p99": round(p99, 3)}
+
+
+# Request counters plus latency and time-to-first-event over the last METRICS_WINDOW requests
+class ServiceMetrics():
+    def __init__(self):
+        self.started = time.time()
+        self.requests = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.in_flight = 0
+        self._latency = deque(maxlen=METRICS_WINDOW)
+        self._first_event = deque(maxlen=METRICS_WINDOW)
+        self._finished_at = deque(maxlen=METRICS_WINDOW)
+
+    def record(self, latency, first_event):
+        self.completed += 1
+        self._latency.append(latency)
+        if first_event is not None:
+            self._first_event.append(first_event)
+        self._finished_at.append(time.monotonic())
+
+    def snapshot(self):
+        cutoff = time.monotonic() - THROUGHPUT_WINDOW
+        recent = sum(1 for finished in self._finished_at if finished >= cutoff)
+        return {
+            "uptime_seconds": round(time.time() - self.started, 1),
+            "requests": self.requests,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "in_flight": self.in_flight,
+            "throughput_per_minute": recent * 60 / THROUGHPUT_WINDOW,
+            "latency_seconds": percentiles(self._latency),
+            "first_event_seconds": percentiles(self._first_event),
+        }
+
+
+# HTTP/WebSocket front end over an AgentPool
+#   POST /analyze  {"query": ..., "ticker": ...}  -> {"answer": ..., "seconds": ...}
+#   GET  /ws       send {"query": ..., "ticker": ...}, receive analyze_stream events as JSON
+#   GET  /chart    ?tickers=NVDA,AMD&years=5&format=html|png -> the price chart file (see charts.py)
+#   GET  /metrics  request counts, latency percentiles, throughput, pool, cache, refresh, chart and LLM
+#                  gateway stats
+#   GET  /health
+# refresh is the RefreshScheduler keeping the pool's data current, if one is running
+class AnalysisServer():
+    def __init__(self, pool, request_timeout=REQUEST_TIMEOUT, refresh=None):
+        self.pool = pool
+        self.request_timeout = request_timeout
+        self.refresh = refresh
+        self.default_ticker = pool.agents[0].ticker
+        self.metrics = ServiceMetrics()
+
+    def app(self):
+        app = web.Application()
+        app.add_routes([
+            web.post("/analyze", self.handle_analyze),
+            web.get("/ws", self.handle_ws),
+            web.get("/chart", self.handle_chart),
+            web.get("/metrics", self.handle_metrics),
+            web.get("/health", self.handle_health),
+        ])
+        return app
+
+    # Runs one query on a pooled agent, passing each event to send
+    # Raises PoolBusy when the pool is saturated and asyncio.TimeoutError past request_timeout
+    async def run(self, query, ticker, send):
+        self.metrics.requests += 1
+        try:
+            async with self.pool.acquire() as agent:
+                self.metrics.in_flight += 1
+                try:
+                    await asyncio.wait_for(self._stream(agent, query, ticker, send), self.request_timeout)
+                finally:
+                    self.metrics.in_flight -= 1
+        except PoolBusy:
+            self.metrics.rejected += 1
+            raise
+        except asyncio.TimeoutError:
+            self.metrics.timed_out += 1
+            raise
+        except Exception:
+            self.metrics.failed += 1
+            raise
+
+    async def _stream(self, agent, query, ticker, send):
+        # Agents are shared between requests, so each request sets its own default ticker
+        ticker = ticker or self.default_ticker
+        if ticker != agent.ticker:
+            agent.set_ticker(ticker)
+
+        start = time.monotonic()
+        first_event = None
+        async for event in agent.analyze_stream(query):
+            if first_event is None:
+                first_event = time.monotonic() - start
+            await send(event)
+        self.metrics.record(time.monotonic() - start, first_event)
+
+    def metrics_snapshot(self):
+        snapshot = self.metrics.snapshot()
+        snapshot["pool"] = {"size": len(self.pool.agents), "idle": self.pool.idle, "waiting": self.pool.pending}
+        snapshot["query_cache"] = self.pool.agents[0].query_cache.stats()
+        if self.refresh is not None:
+            snapshot["refresh"] = self.refresh.stats()
+        snapshot["charts"] = self.pool.agents[0].service.charts.stats()
+        gateway = getattr(self.pool.agents[0].llm, "gateway", None)
+        if gateway is not None:
+            snapshot["llm"] = gateway.stats()
+        return snapshot
+
+    # The request's ticker, upper-cased; raises ValueError unless it is a valid symbol
+    def _ticker(self, body):
+        ticker = body.get("ticker")
+        if ticker is None or ticker == "":
+            return None
+        ticker = ticker.upper() if isinstance(ticker, str) else ticker
+        if not valid_ticker(ticker):
+            raise ValueError(f"Invalid ticker {ticker!r}")
+        return ticker
+
+    async def handle_analyze(self, request):
+        try:
+            body = await request.json()
+            query = body["query"]
+        except (json.JSONDecodeError, KeyError, TypeError):
+            return web.json_response({"error": "Expected a JSON body with a 'query' field"}, status=400)
+        try:
+            ticker = self._ticker(body)
+        except ValueError as e:
+            return web.json_response({"error": str(e)}, status=400)
+
+        events = []
+
+        async def collect(event):
+            events.append(event)
+
+        start = time.monotonic()
+        try:
+            await self.run(query, ticker, collect)
+        except PoolBusy as e:
+            return web.json_response({"error": f"Server busy: {str(e)}"}, status=503, headers={"Retry-After": "5"})
+        except asyncio.TimeoutError:
+            return web.json_response({"error": f"Timed out after {self.request_timeout}s"}, status=504)
+        except Exception as e:
+            logging.error(f"Error analyzing {query!r}: {str(e)}")
+            return web.json_response({"error": str(e)}, status=500)
+
+        answer = next((event["text"] for event in events if event["type"] == "answer"), "")
+        tools = [event["tool"] for event in events if event["type"] == "tool_call"]
+        return web.json_response({"answer": answer, "tools": tools, "seconds": round(time.monotonic() - start, 3)})
+
+    # Each text message is one request; its events are streamed back, ending with an answer or error event
+    async def handle_ws(self, request):
+        ws = web.WebSocketResponse(heartbeat=30)
+        await ws.prepare(request)
+
+        async def send(event):
+            await ws.send_json(event, dumps=lambda data: json.dumps(data, default=str))
+
+        async for message in ws:
+            if message.type != WSMsgType.TEXT:
+                continue
+            try:
+                body = json.loads(message.data)
+                query = body["query"]
+            except (json.JSONDecodeError, KeyError, TypeError):
+                await send({"type": "error", "error": "Expected JSON with a 'query' field"})
+                continue
+            try:
+                ticker = self._ticker(body)
+            except ValueError as e:
+                await send({"type": "error", "error": str(e)})
+                continue
+
+            try:
+                await self.run(query, ticker, send)
+            except PoolBusy as e:
+                await send({"type": "error", "error": f"Server busy: {str(e)}"})
+            except asyncio.TimeoutError:
+                await send({"type": "error", "error": f"Timed out after {self.request_timeout}s"})
+            except Exception as e:
+                logging.error(f"Error analyzing {query!r}: {str(e)}")
+                await send({"type": "error", "error": str(e)})
+
+        return ws
+
+    # Charts the stored prices of the requested tickers (the default ticker if none) over the last `years`
+    # years; the file is drawn off the event loop, and only when those prices changed since it was last drawn
+    async def handle_chart(self, request):
+        service = self.pool.agents[0].service
+        tickers = [ticker.strip().upper() for ticker in request.query.get("tickers", "").split(",") if ticker.strip()]
+        invalid = [ticker for ticker in tickers if not valid_ticker(ticker)]
+        if invalid:
+            return web.json_response({"error": f"Invalid ticker {invalid[0]!r}"}, status=400)
+        try:
+            years = int(request.query.get("years", 5))
+        except ValueError:
+            return web.json_response({"error": "years must be a whole number"}, status=400)
+        start, _ = service.price_window(years)
+
+        try:
+            path = await asyncio.to_thread(service.charts.render, tickers or [self.default_ticker], start,
+                                           fmt=request.query.get("format", "html"))
+        except ValueError as e:
+            return web.json_response({"error": str(e)}, status=400)
+        except ImportError as e:
+            return web.json_response({"error": str(e)}, status=501)
+        return web.FileResponse(path)
+
+    async def handle_metrics(self, request):
+        return web.json_response(self.metrics_snapshot())
+
+    async def handle_health(self, request):
+        return web.json_response({"status": "ok", "agents": len(self.pool.agents)})
+
+
+# Builds pool_size warm agents that share one data service, tool registry and set of caches
+# warm lists tickers whose query engines are built before the server starts taking requests
+def build_pool(model, pool_size=4, warm=(), max_pending=32, **agent_kwargs):
+    agent = StockAnalyzerAgent(model, **agent_kwargs).initialize()
+
+    for ticker in warm:
+        for name in agent.registry.builders:
+            try:
+                agent.registry.get(ticker, name)
+            except Exception as e:
+                logging.warning(f"Could not warm {name} for {ticker}: {str(e)}")
+
+    agents = [agent] + [agent.fork() for _ in range(pool_size - 1)]
+    return AgentPool(agents, max_pending=max_pending)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve stock analysis over HTTP and WebSocket")
+    parser.add_argument("--model", default="claude-sonnet-4-5-20250929")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--data-dir", default="data/")
+    parser.add_argument("--ticker", default=None, help="Default ticker for questions that don't name one")
+    parser.add_argument("--pool-size", type=int, default=4, help="Number of agents serving requests at once")
+    parser.add_argument("--max-pending", type=int, default=32, help="Requests allowed to wait for an agent")
+    parser.add_argument("--timeout", type=float, default=REQUEST_TIMEOUT, help="Seconds before a request is cancelled")
+    parser.add_argument("--warm", default="", help="Comma-separated tickers to load before serving")
+    parser.add_argument("--parallel-tools", action="store_true")
+    parser.add_argument("--llm-concurrency", type=int, default=None,
+                        help="LLM requests in flight at once, across all agents (see llmgateway.py)")
+    parser.add_argument("--llm-rpm", type=float, default=None, help="LLM requests per minute allowed by your account")
+    parser.add_argument("--llm-tpm", type=float, default=None, help="LLM input tokens per minute allowed by your account")
+    parser.add_argument("--refresh", action="store_true",
+                        help="Keep prices, news, financials and info current in the background (see refresh.py)")
+    args = parser.parse_args()
+
+    warm = [ticker.strip().upper() for ticker in args.warm.split(",") if ticker.strip()]
+    if args.llm_concurrency or args.llm_rpm or args.llm_tpm:
+        from llmgateway import gateway_for, provider_for
+        gateway_for(provider_for(args.model)).configure(max_concurrency=args.llm_concurrency,
+                                                        requests_per_minute=args.llm_rpm,
+                                                        tokens_per_minute=args.llm_tpm)
+    pool = build_pool(args.model, pool_size=args.pool_size, warm=warm, max_pending=args.max_pending,
+                      data_dir=args.data_dir, ticker=args.ticker, parallel_tools=args.parallel_tools)
+    refresh = pool.agents[0].service.start_refresh() if args.refresh else None
+    server = AnalysisServer(pool, request_timeout=args.timeout, refresh=refresh)
+    web.run_app(server.app(), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
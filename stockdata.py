@@ -1,52 +1,226 @@
 import pandas as pd
 import numpy as np
 import datetime as dt
-import yfinance as yf
-import plotly.graph_objects as go
 import os
 import uuid
-
-from llama_index.core import Document
+import logging
+import asyncio
+import threading
+import contextvars
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from pricestore import PriceStore
+from charts import ChartRenderer
+from financialstore import FinancialsStore, build_financials
+from storage import DataStore
+from universe import load_universe
+from downloader import BatchDownloader
+from tracing import traced, span, current_span
+
+# yf.Ticker objects kept for reuse; the least recently used are dropped past this
+MAX_TICKER_OBJECTS = 256
+
+# Set while refresh_ticker runs: a background refresh updates a ticker's own datasets but not the
+# "latest" copies in the top-level store, which follow what the user last fetched
+_refreshing = contextvars.ContextVar("refreshing", default=False)
 
 class StockDataService():
-    def __init__(self, output_dir):
+    # backend picks the on-disk format (see storage.py); export_csv also writes a .csv copy of each dataset
+    # universe is a list of tickers or a path to a ticker file (see universe.py); defaults to 10 tech stocks
+    def __init__(self, output_dir, backend="feather", export_csv=False, universe=None, downloader=None):
         self.output_dir = output_dir
         os.makedirs(output_dir, exist_ok=True)
+        self.backend = backend
+        self.export_csv = export_csv
+        self.store = DataStore(output_dir, backend=backend, export_csv=export_csv)
+        self.price_store = PriceStore(os.path.join(output_dir, "prices"), backend=backend)
+        self.financials = FinancialsStore(self)
+        self.charts = ChartRenderer(self.price_store, output_dir)
+        self.universe = load_universe(universe)
+        self.downloader = downloader or BatchDownloader()
+
+        self._tickers = OrderedDict()  # One yf.Ticker (and its cached responses) per symbol, least recent first
+        self._tickers_lock = threading.Lock()
+
+        self.data_version = 0  # Bumped whenever a refresh changes stored data (see refresh.py)
+        self._listeners = []
+
+    # Returns the shared yf.Ticker for a symbol, creating it on first use
+    def _ticker(self, ticker_sym):
+        import yfinance as yf
+
+        with self._tickers_lock:
+            if ticker_sym not in self._tickers:
+                self._tickers[ticker_sym] = yf.Ticker(ticker_sym)
+                while len(self._tickers) > MAX_TICKER_OBJECTS:
+                    self._tickers.popitem(last=False)
+            self._tickers.move_to_end(ticker_sym)
+            return self._tickers[ticker_sym]
+
+    # Drops a symbol's yf.Ticker, so the next request fetches fresh responses instead of its cached ones
+    def forget_ticker(self, ticker_sym):
+        with self._tickers_lock:
+            self._tickers.pop(ticker_sym, None)
+
+    # Per-ticker datasets live under tickers/<TICKER>/ so several tickers can be analyzed side by side
+    def ticker_store(self, ticker_sym):
+        return DataStore(os.path.join(self.output_dir, "tickers", ticker_sym.upper()),
+                         backend=self.backend, export_csv=self.export_csv)
+
+    # Saves a dataset both as the latest one (e.g. "financials") and under its ticker
+    # Unchanged data isn't rewritten, so the dataset's version only moves when its contents do
+    def _save(self, name, df, ticker_sym):
+        if not (_refreshing.get() and ticker_sym):
+            self.store.save(name, df, if_changed=True)
+        if ticker_sym:
+            self.ticker_store(ticker_sym).save(name, df, if_changed=True)
+
+    # Registers fn(dataset, ticker, data) to be called after a refresh changes a dataset
+    # ("prices", "financials", "info", "metrics" or "news"; data is what was fetched)
+    def add_listener(self, fn):
+        self._listeners.append(fn)
+
+    def _notify(self, dataset, ticker, data):
+        self.data_version += 1
+        for fn in list(self._listeners):
+            try:
+                fn(dataset, ticker, data)
+            except Exception as e:
+                logging.error(f"Data change listener failed for {dataset} of {ticker}: {e}")
+
+    # Starts a RefreshScheduler (see refresh.py) that keeps the stored data current in the background
+    def start_refresh(self, **kwargs):
+        from refresh import RefreshScheduler
+        return RefreshScheduler(self, **kwargs).start()
 
     # Fetches historical price for several stocks
+    # Bars already in the local price store are reused; only missing date ranges are downloaded
+    @traced("stockdata.get_historical_prices", args=("years",))
     def get_historical_prices(self, years):
-        # Sets start and end dates for historical stock data
-        end = dt.datetime.now()
-        start = end - dt.timedelta(days = years * 365)  # Sets start date based on user input
+        start, end = self.price_window(years)
 
-        # List of stock tickers to get data from
-        stockList = ["AAPL", "NVDA", "TSLA", "MSFT", "GOOGL", "AMZN", "META", "NFLX", "INTC", "AMD"]
+        self.sync_prices(years)
 
-        # Get historical data based on stockList and date range
-        df = yf.download(stockList, start, end)
-        df.to_csv("data/all_prices.csv", index=False)
+        df = self.price_store.load_panel(self.universe, start, end)
+        self.store.save("all_prices", df)
 
         return df
+
+    # Brings the price store up to date for the universe (or the given tickers) without building a price panel
+    # Each chunk is written to the store as soon as it arrives, so memory stays bounded for
+    # universes with thousands of tickers. Returns the tickers that could not be downloaded.
+    @traced("stockdata.sync_prices", args=("years",))
+    def sync_prices(self, years, tickers=None):
+        start, end = self.price_window(years)
+        tickers = self.universe if tickers is None else load_universe(tickers)
+
+        # Group tickers that are missing the same date range so each range is downloaded together
+        missing = {}
+        for ticker in tickers:
+            for date_range in self.price_store.missing_ranges(ticker, start, end):
+                missing.setdefault(date_range, []).append(ticker)
+
+        jobs = [(tickers, range_start, range_end) for (range_start, range_end), tickers in missing.items()]
+
+        failed = []
+        for range_start, range_end, bars, chunk_failed in self.downloader.run(jobs):
+            # Tickers that came back empty are left uncovered so they are retried next run, and are
+            # reported as failed unless the range just had no sessions yet
+            for ticker, ticker_bars in bars.items():
+                self.price_store.merge(ticker, ticker_bars, range_start, range_end, save_manifest=False)
+            self.price_store.save_manifest()
+            failed.extend(chunk_failed)
+
+        failed = list(dict.fromkeys(failed))  # A ticker missing two ranges may fail in both
+        if failed:
+            logging.warning(f"Could not download prices for {len(failed)} tickers: {', '.join(failed[:20])}")
+
+        current_span().set("ranges", len(jobs)).set("failed", len(failed))
+        return failed
+
+    # Downloads the last `days` days again for the universe (or the given tickers), picking up new bars
+    # and revisions of recent ones. Only tickers whose bars changed are rewritten; returns those tickers.
+    @traced("stockdata.refresh_prices", args=("days",))
+    def refresh_prices(self, days=5, tickers=None):
+        tickers = self.universe if tickers is None else load_universe(tickers)
+        end = dt.date.today()
+        start = end - dt.timedelta(days=days)
+        before = {ticker: self.price_store.version(ticker) for ticker in tickers}
+
+        failed = []
+        for range_start, range_end, bars, chunk_failed in self.downloader.run([(tickers, start, end)]):
+            for ticker, ticker_bars in bars.items():
+                self.price_store.merge(ticker, ticker_bars, range_start, range_end, save_manifest=False)
+            failed.extend(chunk_failed)
+        self.price_store.save_manifest()
+
+        if failed:
+            logging.warning(f"Could not refresh prices for {len(failed)} tickers: {', '.join(failed[:20])}")
+
+        changed = [ticker for ticker in tickers if self.price_store.version(ticker) != before[ticker]]
+        for ticker in changed:
+            self._notify("prices", ticker, None)
+        current_span().set("changed", len(changed)).set("failed", len(failed))
+        return changed
+
+    # Fetches a ticker's datasets again ("financials", "info" - which also updates "metrics" - and
+    # "news") with fresh yfinance responses. Returns the names of the datasets whose contents changed.
+    @traced("stockdata.refresh_ticker", args=("ticker_sym",))
+    def refresh_ticker(self, ticker_sym, datasets=("financials", "info", "news")):
+        store = self.ticker_store(ticker_sym)
+        names = set(datasets) | ({"metrics"} if "info" in datasets else set())
+        before = {name: store.version(name) for name in names}
+
+        self.forget_ticker(ticker_sym)
+        data = {}
+        token = _refreshing.set(True)
+        try:
+            if "financials" in datasets:
+                data["financials"] = self.get_financials(ticker_sym)
+            if "info" in datasets:
+                data["info"] = self.get_info(ticker_sym)
+                data["metrics"] = self.get_metrics(data["info"])
+            if "news" in datasets:
+                data["news"] = self.get_news(ticker_sym)
+        finally:
+            _refreshing.reset(token)
+
+        changed = [name for name in sorted(names) if store.version(name) != before[name]]
+        for name in changed:
+            self._notify(name, ticker_sym.upper(), data.get(name))
+        current_span().set("changed", ",".join(changed))
+        return changed
+
+    # Sets start and end dates for historical stock data based on user input
+    def price_window(self, years):
+        end = dt.date.today()
+        start = end - dt.timedelta(days = years * 365)
+        return start, end
     
     # Uses historical prices to get single stock prices (will likely refactor to just use yfinance to create a whole new df - not using a previous one)
+    @traced("stockdata.get_single_stock_prices", args=("ticker",))
     def get_single_stock_prices(self, df, ticker):
         df = df.xs(ticker, axis=1, level=1)
-        df.to_csv("data/historical_prices.csv")  # Keep index=True (default) to preserve Date column
+        self._save("historical_prices", df, ticker)  # Keeps the Date index
 
         return df
     
     # Gets info on the stock
+    @traced("stockdata.get_info", args=("ticker_sym",))
     def get_info(self, ticker_sym):
-        ticker = yf.Ticker(ticker_sym)
+        ticker = self._ticker(ticker_sym)
 
-        info_dict = ticker.info
+        with span("yfinance.info", ticker=ticker_sym):
+            info_dict = ticker.info
 
         info = pd.DataFrame([info_dict])
-        info.to_csv("data/info.csv", index=False)
+        self._save("info", info, ticker_sym)
 
         return info
     
     # Uses info df to get certain metrics
+    @traced("stockdata.get_metrics")
     def get_metrics(self, info):
 
         # Fetch metrics from the info df - drop useless columns
@@ -78,52 +252,44 @@ class StockDataService():
     ]   
         
         metrics = info.drop(columns=columns_to_drop, errors='ignore')
-        metrics.to_csv("data/metrics.csv", index=False)
+        ticker_sym = metrics['symbol'].iloc[0] if 'symbol' in metrics.columns else None
+        self._save("metrics", metrics, ticker_sym)
 
         return metrics
 
     # Gets financial documents (Balance Sheet, Income Statement, Cashflow)  
+    @traced("stockdata.get_financials", args=("ticker_sym",))
     def get_financials(self, ticker_sym):
-        ticker = yf.Ticker(ticker_sym)
-
-        income_stmt = ticker.income_stmt
-        cashflow = ticker.cashflow
-        balance_sheet = ticker.balance_sheet
-
-        income_stmt.index = [f"IS_{idx}" for idx in income_stmt.index]
-        balance_sheet.index = [f"BS_{idx}" for idx in balance_sheet.index]
-        cashflow.index = [f"CF_{idx}" for idx in cashflow.index]
-
-        financials = pd.concat([income_stmt, cashflow, balance_sheet])
-        financials = financials.T 
-        financials.index.name = "Date"
-
-        # Optimizes data format for better RAG readability
-        if financials is not None and not financials.empty:
-            financials = financials.reset_index()
-            # Handle case where index might not be named 'Date'
-            if 'Date' not in financials.columns:
-                 financials = financials.rename(columns={'index': 'Date'})
-
-            # 2. Add the 'Ticker' column 
-            financials['Ticker'] = ticker_sym
-
-            # 3. Melt: We removed 'Statement_Type' from id_vars because it doesn't exist yet
-            financials = financials.melt(id_vars=['Date', 'Ticker'], 
-                                         var_name='Financial', 
-                                         value_name='Value')
-            
-            # 4. Create 'Statement_Type' by splitting the prefix (IS_, BS_, CF_)
-            # This extracts "IS" from "IS_TotalRevenue"
-            financials['Statement_Type'] = financials['Financial'].apply(lambda x: x.split('_')[0])
-        
-        financials.to_csv("data/financials.csv", index=False)
+        ticker = self._ticker(ticker_sym)
+
+        # The three statements are separate requests, so fetch them at the same time
+        with ThreadPoolExecutor(max_workers=3) as pool:
+            income_future = pool.submit(lambda: ticker.income_stmt)
+            cashflow_future = pool.submit(lambda: ticker.cashflow)
+            balance_future = pool.submit(lambda: ticker.balance_sheet)
+
+        # Long format (Date, Ticker, Financial, Value, Statement_Type) for better RAG readability,
+        # built from the statements' arrays with categorical keys (see financialstore.py)
+        # yfinance's cached frames are only read, never modified, so they need no copy
+        financials = build_financials(ticker_sym, {
+            "income_stmt": income_future.result(),
+            "cashflow": cashflow_future.result(),
+            "balance_sheet": balance_future.result(),
+        })
+
+        self._save("financials", financials, ticker_sym)
+        self.financials.put(ticker_sym, financials)
         return financials
     
     # Gets news on the stock
+    @traced("stockdata.get_news", args=("ticker_sym",))
     def get_news(self, ticker_sym):
-        ticker = yf.Ticker(ticker_sym)
-        news = ticker.news
+        from llama_index.core import Document
+
+        ticker = self._ticker(ticker_sym)
+        with span("yfinance.news", ticker=ticker_sym) as s:
+            news = ticker.news
+            s.set("articles", len(news))
 
         rag_docs = []
         news_csv = []
@@ -144,7 +310,7 @@ class StockDataService():
             pub_time = content.get('pubDate') if 'pubDate' in content else item.get('providerPublishTime')
             
             if isinstance(pub_time, (int, float)):
-                readable_date = dt.fromtimestamp(pub_time).strftime('%Y-%m-%d %H:%M:%S')
+                readable_date = dt.datetime.fromtimestamp(pub_time).strftime('%Y-%m-%d %H:%M:%S')
             elif isinstance(pub_time, str):
                 readable_date = pub_time
             else:
@@ -166,48 +332,59 @@ class StockDataService():
             if not doc_id:
                 doc_id = str(uuid.uuid4())
 
+            # Metadata stays out of the embedded text, so a headline several tickers carry embeds (and is
+            # cached by CachedEmbedding) once
             doc = Document(
-                text_content=content,
+                text=text_content,
                 metadata=metadata,
+                excluded_embed_metadata_keys=list(metadata),
                 id_=doc_id
             )
 
             rag_docs.append(doc)
 
-            # Backup CSV
+            # Backup copy of the news table
             csv_row = {"text": text_content}
             csv_row.update(metadata)
             news_csv.append(csv_row)
 
         if news_csv:
-            pd.DataFrame(news_csv).to_csv("data/news.csv", index=False)
+            self._save("news", pd.DataFrame(news_csv), ticker_sym)
 
         return rag_docs
-            
-    # Creates a viewable price chart
-    def create_price_chart(self, df, ticker, years):
-            close = df["Close"]  # could be single ticker or multiple tickers
-
-            fig = go.Figure()
-
-            fig.add_trace(go.Scatter(
-                x=close.index,
-                y=close.values,
-                mode='lines',
-                name=close.name
-            ))
-
-            fig.update_layout(
-                title= str(ticker) + " Stock Price Over Last " + str(years) + " Years",
-                xaxis_title="Date",
-                yaxis_title="Price ($)",
-                width=1000,
-                height=600,
-                xaxis_showgrid=True,
-                yaxis_showgrid=True
-            )
 
-            fig.show()
+    # Fetches news, financials and info for a ticker at the same time
+    # Total latency is roughly the slowest of the three calls rather than their sum
+    @traced("stockdata.fetch_ticker_data", args=("ticker_sym",))
+    async def fetch_ticker_data(self, ticker_sym):
+        self._ticker(ticker_sym)  # Create the shared Ticker before the calls race to do it
+
+        documents, financials, info = await asyncio.gather(
+            asyncio.to_thread(self.get_news, ticker_sym),
+            asyncio.to_thread(self.get_financials, ticker_sym),
+            asyncio.to_thread(self.get_info, ticker_sym),
+        )
+        metrics = self.get_metrics(info)
+
+        return documents, financials, info, metrics
+
+    # Fetches the price panel and a ticker's news/financials/info at the same time
+    @traced("stockdata.fetch_all", args=("years", "ticker_sym"))
+    async def fetch_all(self, years, ticker_sym):
+        all_stocks, ticker_data = await asyncio.gather(
+            asyncio.to_thread(self.get_historical_prices, years),
+            self.fetch_ticker_data(ticker_sym),
+        )
+        return (all_stocks, *ticker_data)
+            
+    # Renders a price chart of a single ticker's bars or a get_historical_prices panel (tickers picks
+    # which ones to overlay) to a static file under <output_dir>/charts and returns its path (see charts.py)
+    # Long histories are downsampled and the file is reused until the prices change.
+    @traced("stockdata.create_price_chart", args=("ticker",))
+    def create_price_chart(self, df, ticker, years, fmt="html", tickers=None):
+        tickers = tickers or [ticker]
+        title = f"{', '.join(tickers)} Stock Price Over Last {years} Years"
+        return self.charts.render_frame(df, tickers, fmt=fmt, title=title)
 
 def main():
     service = StockDataService("data/")
@@ -215,15 +392,10 @@ def main():
     years = int(input("Enter number of years to look back: "))
     ticker = input("Enter stock ticker: ")
 
-    all_stocks = service.get_historical_prices(years)
+    all_stocks, documents, df_financials, df_info, df_metrics = asyncio.run(service.fetch_all(years, ticker))
 
     single_stock_prices = service.get_single_stock_prices(all_stocks, ticker)
-    service.create_price_chart(single_stock_prices, ticker, years)
-
-    documents = service.get_news(ticker)
-    df_financials = service.get_financials(ticker)
-    df_info = service.get_info(ticker)
-    df_metrics = service.get_metrics(df_info)
+    print(f"Price chart saved to {service.create_price_chart(single_stock_prices, ticker, years)}")
 
 if __name__ == "__main__":
     main()
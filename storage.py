@@ -0,0 +1,197 @@
+import os
+import hashlib
+import threading
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+import pyarrow.parquet as pq
+
+from tracing import span
+
+
+# Storage backends decide how a DataFrame is laid out on disk
+# Feather (Arrow IPC) is the default: typed, columnar, keeps the index and can be memory-mapped on read
+class FeatherBackend():
+    extension = ".feather"
+
+    def write(self, df, path):
+        # Uncompressed so reads can memory-map the file instead of decoding it
+        feather.write_feather(_to_arrow(df), path, compression="uncompressed")
+
+    def read(self, path, columns=None):
+        table = feather.read_table(path, memory_map=True)
+        return _select(table, columns).to_pandas()
+
+
+# Parquet trades some read speed for much smaller files
+class ParquetBackend():
+    extension = ".parquet"
+
+    def write(self, df, path):
+        pq.write_table(_to_arrow(df), path)
+
+    def read(self, path, columns=None):
+        table = pq.read_table(path, memory_map=True)
+        return _select(table, columns).to_pandas()
+
+
+# Plain CSV - kept for exporting data to be opened in other tools
+class CSVBackend():
+    extension = ".csv"
+
+    def write(self, df, path):
+        df.to_csv(path)
+
+    def read(self, path, columns=None):
+        df = pd.read_csv(path, index_col=0, parse_dates=True)
+        return df if columns is None else df[[col for col in df.columns if col in columns]]
+
+
+BACKENDS = {
+    "feather": FeatherBackend,
+    "parquet": ParquetBackend,
+    "csv": CSVBackend,
+}
+
+
+# Keeps the given columns of an Arrow table (the ones it has) plus its stored index, so only
+# those are converted to pandas; memory-mapped columns that aren't kept are never read
+def _select(table, columns):
+    if columns is None:
+        return table
+    metadata = table.schema.pandas_metadata or {}
+    keep = set(columns) | {col for col in metadata.get("index_columns", []) if isinstance(col, str)}
+    return table.select([col for col in table.column_names if col in keep])
+
+
+def get_backend(name):
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown storage backend '{name}'. Choose from: {', '.join(BACKENDS)}")
+    return BACKENDS[name]()
+
+
+# Converts a DataFrame to an Arrow table, keeping its index
+# yfinance's info dict mixes types within a column (e.g. ints and strings), which Arrow
+# can't store, so those object columns are written as strings instead
+def _to_arrow(df):
+    try:
+        return pa.Table.from_pandas(df, preserve_index=True)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+        df = df.copy()
+        for col in df.columns[df.dtypes == object]:
+            df[col] = df[col].map(_to_str)
+        return pa.Table.from_pandas(df, preserve_index=True)
+
+
+def _to_str(value):
+    if value is None or isinstance(value, str):
+        return value
+    if isinstance(value, float) and value != value:  # NaN
+        return None
+    return str(value)
+
+
+# Fingerprint of a DataFrame's contents (values, index, columns and dtypes)
+# Columns holding unhashable values (e.g. lists in yfinance's info) are hashed as text
+def content_hash(df):
+    digest = hashlib.sha1()
+    digest.update(repr((list(df.columns), [str(dtype) for dtype in df.dtypes], df.index.names)).encode())
+    try:
+        hashes = pd.util.hash_pandas_object(df, index=True)
+    except TypeError:
+        hashes = pd.util.hash_pandas_object(df.astype(str), index=True)
+    digest.update(hashes.to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+# Named datasets ("all_prices", "financials", ...) saved under one directory through a backend
+class DataStore():
+    def __init__(self, base_dir, backend="feather", export_csv=False):
+        self.base_dir = base_dir
+        self.backend = get_backend(backend)
+        self.export_csv = export_csv
+        os.makedirs(base_dir, exist_ok=True)
+
+    def path(self, name):
+        return os.path.join(self.base_dir, name + self.backend.extension)
+
+    def exists(self, name):
+        return os.path.exists(self.path(name))
+
+    # Identifies the dataset's contents; None if it has not been saved yet
+    # Datasets saved with if_changed are versioned by their content hash, so two saves can't share a
+    # version the way two writes within the file system's timestamp resolution share an mtime; others
+    # by their file time. Always an integer (it fits an Int64 column).
+    def version(self, name):
+        path = self.path(name)
+        if not os.path.exists(path):
+            return None
+        digest = self.saved_hash(name)
+        if digest is not None:
+            return int(digest[:15], 16)
+        return os.stat(path).st_mtime_ns
+
+    # When the dataset was last saved (seconds since the epoch); None if it has not been saved yet
+    def modified(self, name):
+        path = self.path(name)
+        if not os.path.exists(path):
+            return None
+        return os.stat(path).st_mtime
+
+    def _hash_path(self, name):
+        return os.path.join(self.base_dir, name + ".hash")
+
+    # The content hash recorded when the dataset was last saved with if_changed (None if unknown)
+    def saved_hash(self, name):
+        path = self._hash_path(name)
+        if not os.path.exists(path) or not self.exists(name):
+            return None
+        with open(path) as f:
+            return f.read().strip()
+
+    # Writes a dataset atomically so readers never see a half-written file
+    # The temporary file is unique per thread, so concurrent writers of one dataset don't collide
+    # With if_changed, a dataset whose contents match the last save is left alone, so its version
+    # (and everything keyed on it) stays the same. Returns whether the dataset was written.
+    def save(self, name, df, if_changed=False):
+        path = self.path(name)
+        digest = None
+        if if_changed:
+            digest = content_hash(df)
+            if digest == self.saved_hash(name):
+                return False
+
+        # The old hash is dropped first, so a save that fails halfway never leaves a hash that
+        # doesn't describe the file
+        hash_path = self._hash_path(name)
+        try:
+            os.remove(hash_path)
+        except FileNotFoundError:
+            pass
+
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with span("storage.save", dataset=name, rows=len(df)) as s:
+            self.backend.write(df, tmp_path)
+            s.set("bytes_written", os.path.getsize(tmp_path))
+            os.replace(tmp_path, path)
+
+        if digest is not None:
+            with open(tmp_path, "w") as f:
+                f.write(digest)
+            os.replace(tmp_path, hash_path)
+
+        if self.export_csv and not isinstance(self.backend, CSVBackend):
+            # Default integer indexes carry no information, so leave them out of the export
+            write_index = not isinstance(df.index, pd.RangeIndex)
+            df.to_csv(os.path.join(self.base_dir, name + ".csv"), index=write_index)
+        return True
+
+    # Raises FileNotFoundError if the dataset has not been saved yet
+    # columns limits the load to those columns (the ones the dataset has)
+    def load(self, name, columns=None):
+        path = self.path(name)
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"{path} not found")
+
+        with span("storage.load", dataset=name, bytes_read=os.path.getsize(path)):
+            return self.backend.read(path, columns)
@@ -0,0 +1,359 @@
+import re
+import json
+import time
+import random
+import asyncio
+import hashlib
+import threading
+from collections import deque
+from typing import Any
+
+import numpy as np
+
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.base.llms.types import ToolCallBlock
+from llama_index.core.llms import ChatMessage, ChatResponse, CompletionResponse, MessageRole
+from llama_index.core.llms.callbacks import llm_chat_callback, llm_completion_callback
+from llama_index.core.llms.mock import MockFunctionCallingLLM
+
+# Deterministic, offline stand-ins for the LLM, the LLM provider's API and the embedding model,
+# for benchmarks and tests
+
+# Tools the stub agent calls, in order, when they are available
+STUB_TOOL_ORDER = ["parse_price_data", "parse_financial_data", "parse_metrics", "parse_news",
+                   "parse_technical_indicators"]
+
+# What PandasQueryEngine prompts look like (see NEW_PROMPT)
+PANDAS_PROMPT_MARKER = "The name of the dataframe is `df`"
+
+
+# LLM that follows a fixed script instead of calling a provider
+#   - PandasQueryEngine prompts get `code` back as the expression to evaluate
+#   - As a ReAct agent it calls up to max_tools tools one step at a time, then answers
+#   - As a function-calling agent it requests those tools all at once, then answers
+# latency is slept before every response (time to first token); token_delay between streamed words.
+class StubLLM(MockFunctionCallingLLM):
+    latency: float = 0.0
+    token_delay: float = 0.0
+    max_tools: int = 4
+    code: str = "df.describe()"
+    answer: str = "Based on the tool results, here is the analysis. This is not financial advice."
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "StubLLM"
+
+    def _completion_text(self, prompt):
+        return self.code if PANDAS_PROMPT_MARKER in prompt else self.answer
+
+    # Picks the tools to call from the names offered in the request
+    def _script_tools(self, names):
+        ordered = [name for name in STUB_TOOL_ORDER if name in names]
+        return ordered[:self.max_tools]
+
+    def _user_query(self, messages):
+        users = [m.content for m in messages if m.role == MessageRole.USER and m.content
+                 and not m.content.startswith("Observation:")]
+        return users[-1] if users else ""
+
+    def _respond(self, messages, tools=None):
+        if tools is not None:
+            # Function calling: every tool in one response, then the answer once results are in
+            if any(m.role == MessageRole.TOOL for m in messages):
+                return ChatMessage(role="assistant", content=self.answer)
+            names = self._script_tools([tool.metadata.name for tool in tools])
+            query = self._user_query(messages)
+            blocks = [ToolCallBlock(tool_call_id=f"call_{i}", tool_name=name, tool_kwargs={"query": query})
+                      for i, name in enumerate(names)]
+            if not blocks:
+                return ChatMessage(role="assistant", content=self.answer)
+            return ChatMessage(role="assistant", blocks=blocks)
+
+        # ReAct: one Action per step, counted by the observations so far
+        system = next((m.content for m in messages if m.role == MessageRole.SYSTEM), "") or ""
+        names = self._script_tools(re.findall(r"> Tool Name: (\S+)", system))
+        step = sum(1 for m in messages if (m.content or "").startswith("Observation:"))
+        if step < len(names):
+            action_input = json.dumps({"query": self._user_query(messages)})
+            return ChatMessage(role="assistant", content=(
+                "Thought: I need to use a tool to help me answer the question.\n"
+                f"Action: {names[step]}\nAction Input: {action_input}"
+            ))
+        return ChatMessage(role="assistant", content=f"Thought: I can answer without using any more tools.\n"
+                                                     f"Answer: {self.answer}")
+
+    def _chunks(self, message):
+        content = message.content or ""
+        if message.blocks and not content:
+            return [("", message)]
+        words = content.split(" ")
+        chunks, text = [], ""
+        for i, word in enumerate(words):
+            delta = word if i == 0 else " " + word
+            text += delta
+            chunks.append((delta, ChatMessage(role="assistant", content=text)))
+        return chunks
+
+    @llm_completion_callback()
+    def complete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponse:
+        time.sleep(self.latency)
+        return CompletionResponse(text=self._completion_text(prompt))
+
+    @llm_completion_callback()
+    async def acomplete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponse:
+        await asyncio.sleep(self.latency)
+        return CompletionResponse(text=self._completion_text(prompt))
+
+    @llm_chat_callback()
+    def chat(self, messages, **kwargs: Any) -> ChatResponse:
+        time.sleep(self.latency)
+        message = self._respond(messages, kwargs.get("tools"))
+        return ChatResponse(message=message, delta=message.content or "")
+
+    @llm_chat_callback()
+    async def achat(self, messages, **kwargs: Any) -> ChatResponse:
+        await asyncio.sleep(self.latency)
+        message = self._respond(messages, kwargs.get("tools"))
+        return ChatResponse(message=message, delta=message.content or "")
+
+    @llm_chat_callback()
+    def stream_chat(self, messages, **kwargs: Any):
+        message = self._respond(messages, kwargs.get("tools"))
+
+        def gen():
+            time.sleep(self.latency)
+            for delta, partial in self._chunks(message):
+                yield ChatResponse(message=partial, delta=delta)
+                time.sleep(self.token_delay)
+
+        return gen()
+
+    @llm_chat_callback()
+    async def astream_chat(self, messages, **kwargs: Any):
+        message = self._respond(messages, kwargs.get("tools"))
+
+        async def gen():
+            await asyncio.sleep(self.latency)
+            for delta, partial in self._chunks(message):
+                yield ChatResponse(message=partial, delta=delta)
+                await asyncio.sleep(self.token_delay)
+
+        return gen()
+
+
+# Embedding model that maps each text to a fixed pseudo-random unit vector (seeded by its hash)
+# Identical texts always get identical vectors, unlike MockEmbedding's constant ones
+class StubEmbedding(BaseEmbedding):
+    embed_dim: int = 64
+    model_name: str = "stub-embedding"
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "StubEmbedding"
+
+    def _vector(self, text):
+        seed = int(hashlib.sha256(text.encode("utf-8")).hexdigest()[:16], 16)
+        vector = np.random.default_rng(seed).standard_normal(self.embed_dim)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+    def _get_query_embedding(self, query: str):
+        return self._vector(query)
+
+    def _get_text_embedding(self, text: str):
+        return self._vector(text)
+
+    def _get_text_embeddings(self, texts):
+        return [self._vector(text) for text in texts]
+
+    async def _aget_query_embedding(self, query: str):
+        return self._vector(query)
+
+    async def _aget_text_embedding(self, text: str):
+        return self._vector(text)
+
+
+# Local HTTP server that answers like the Anthropic Messages and OpenAI Chat Completions APIs, so the
+# real provider clients (and llmgateway.py) run without network access or API keys:
+#   - replies like StubLLM: PandasQueryEngine prompts get `code`, a ReAct agent a final answer,
+#     anything else `answer` (no tool calls)
+#   - every response waits `latency` seconds first; streamed ones then send a word every token_delay
+#   - past requests_per_minute in the last minute a request gets a 429 with Retry-After, and a
+#     failure_rate share of the others (seeded) an overloaded error, as from a provider under load
+# requests, rate_limited, failed and max_concurrent count what it saw.
+#
+#   with FakeProvider(latency=0.2, requests_per_minute=60) as provider:
+#       llm = gateway_for("anthropic").llm("claude-sonnet-4-5", base_url=provider.url, api_key="fake")
+#       llm = gateway_for("openai").llm("gpt-4o", base_url=f"{provider.url}/v1", api_key="fake")
+class FakeProvider():
+    def __init__(self, latency=0.0, token_delay=0.0, requests_per_minute=None, failure_rate=0.0, seed=0,
+                 code="df.describe()", answer=StubLLM.model_fields["answer"].default):
+        self.latency = latency
+        self.token_delay = token_delay
+        self.requests_per_minute = requests_per_minute
+        self.failure_rate = failure_rate
+        self.code = code
+        self.answer = answer
+        self.url = None
+
+        self.requests = 0
+        self.rate_limited = 0
+        self.failed = 0
+        self.concurrent = 0
+        self.max_concurrent = 0
+        self._random = random.Random(seed)
+        self._recent = deque()  # Arrival times of the requests answered in the last minute
+        self._loop = None
+        self._runner = None
+        self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    # Serves on a free local port from a background thread
+    def start(self):
+        from aiohttp import web
+
+        app = web.Application()
+        app.add_routes([web.post("/v1/messages", self._handle_anthropic),
+                        web.post("/v1/chat/completions", self._handle_openai)])
+        self._runner = web.AppRunner(app, access_log=None)
+        self._loop = asyncio.new_event_loop()
+        self._loop.run_until_complete(self._runner.setup())
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        self._loop.run_until_complete(site.start())
+        self.url = f"http://127.0.0.1:{self._runner.addresses[0][1]}"
+        self._thread = threading.Thread(target=self._loop.run_forever, name="fake-provider", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+        self._loop = None
+
+    def _reply(self, body):
+        texts = []
+        for message in [{"content": body.get("system") or ""}] + body.get("messages", []):
+            content = message.get("content") or ""
+            if isinstance(content, list):
+                content = " ".join(block.get("text", "") for block in content if isinstance(block, dict))
+            texts.append(content)
+        prompt = "\n".join(texts)
+        if PANDAS_PROMPT_MARKER in prompt:
+            return prompt, self.code
+        if "Action Input:" in prompt and not body.get("tools"):
+            return prompt, f"Thought: I can answer without using any more tools.\nAnswer: {self.answer}"
+        return prompt, self.answer
+
+    # Status and Retry-After of the error to answer with, or None to answer normally
+    def _error(self):
+        now = time.monotonic()
+        while self._recent and self._recent[0] <= now - 60:
+            self._recent.popleft()
+        if self.requests_per_minute and len(self._recent) >= self.requests_per_minute:
+            self.rate_limited += 1
+            return 429, str(max(1, int(self._recent[0] + 60 - now + 1)))
+        if self.failure_rate and self._random.random() < self.failure_rate:
+            self.failed += 1
+            return 529, None
+        self._recent.append(now)
+        return None
+
+    async def _handle(self, request, respond, error_body):
+        from aiohttp import web
+
+        body = await request.json()
+        self.requests += 1
+        error = self._error()
+        if error is not None:
+            status, retry_after = error
+            return web.json_response(error_body(status), status=status,
+                                     headers={"retry-after": retry_after} if retry_after else None)
+
+        self.concurrent += 1
+        self.max_concurrent = max(self.max_concurrent, self.concurrent)
+        try:
+            await asyncio.sleep(self.latency)
+            prompt, text = self._reply(body)
+            return await respond(request, body, text, len(prompt) // 4)
+        finally:
+            self.concurrent -= 1
+
+    async def _stream(self, request, events):
+        from aiohttp import web
+
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        for event in events:
+            await response.write(event.encode())
+            await asyncio.sleep(self.token_delay)
+        await response.write_eof()
+        return response
+
+    async def _handle_anthropic(self, request):
+        def error_body(status):
+            kind = "rate_limit_error" if status == 429 else "overloaded_error"
+            return {"type": "error", "error": {"type": kind, "message": f"Fake provider {kind}"}}
+
+        async def respond(request, body, text, input_tokens):
+            from aiohttp import web
+
+            words = text.split(" ")
+            message = {"id": f"msg_fake_{self.requests}", "type": "message", "role": "assistant",
+                       "model": body.get("model"), "content": [{"type": "text", "text": text}],
+                       "stop_reason": "end_turn", "stop_sequence": None,
+                       "usage": {"input_tokens": input_tokens, "output_tokens": len(words)}}
+            if not body.get("stream"):
+                return web.json_response(message)
+
+            def event(name, data):
+                return f"event: {name}\ndata: {json.dumps(dict(type=name, **data))}\n\n"
+
+            usage = {"input_tokens": input_tokens, "output_tokens": 0}
+            events = [event("message_start", {"message": dict(message, content=[], stop_reason=None, usage=usage)}),
+                      event("content_block_start", {"index": 0, "content_block": {"type": "text", "text": ""}})]
+            events += [event("content_block_delta", {"index": 0, "delta": {"type": "text_delta",
+                                                                           "text": word if i == 0 else " " + word}})
+                       for i, word in enumerate(words)]
+            events += [event("content_block_stop", {"index": 0}),
+                       event("message_delta", {"delta": {"stop_reason": "end_turn", "stop_sequence": None},
+                                               "usage": {"output_tokens": len(words)}}),
+                       event("message_stop", {})]
+            return await self._stream(request, events)
+
+        return await self._handle(request, respond, error_body)
+
+    async def _handle_openai(self, request):
+        def error_body(status):
+            kind = "rate_limit_exceeded" if status == 429 else "server_overloaded"
+            return {"error": {"message": f"Fake provider {kind}", "type": kind, "param": None, "code": kind}}
+
+        async def respond(request, body, text, input_tokens):
+            from aiohttp import web
+
+            words = text.split(" ")
+            base = {"id": f"chatcmpl-fake-{self.requests}", "created": int(time.time()), "model": body.get("model")}
+            if not body.get("stream"):
+                return web.json_response(dict(base, object="chat.completion", choices=[
+                    {"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+                    usage={"prompt_tokens": input_tokens, "completion_tokens": len(words),
+                           "total_tokens": input_tokens + len(words)}))
+
+            def chunk(delta, finish_reason=None):
+                data = dict(base, object="chat.completion.chunk",
+                            choices=[{"index": 0, "delta": delta, "finish_reason": finish_reason}])
+                return f"data: {json.dumps(data)}\n\n"
+
+            events = [chunk({"role": "assistant", "content": word if i == 0 else " " + word})
+                      for i, word in enumerate(words)]
+            events += [chunk({}, "stop"), "data: [DONE]\n\n"]
+            return await self._stream(request, events)
+
+        return await self._handle(request, respond, error_body)
@@ -0,0 +1,54 @@
+import pytest
+
+from analytics import AnalyticsService
+
+METRICS = {
+    "NVDA": {"as_of": "2024-06-28", "latest_close": 123.54, "high_52w": 135.58, "low_52w": 39.23,
+             "ytd_return": 1.495, "volatility_30d": 0.52, "volatility_1y": 0.48, "return_1y": 1.92,
+             "max_drawdown_1y": -0.2, "revenue_growth_yoy": 1.26},
+    "AAPL": {"as_of": "2024-06-28", "latest_close": 210.62, "high_52w": 216.67, "ytd_return": 0.094},
+}
+
+
+@pytest.fixture
+def analytics():
+    analytics = AnalyticsService(service=None)
+    analytics.get = lambda ticker: METRICS.get(ticker.upper(), {})
+    return analytics
+
+
+def answer(analytics, query):
+    return analytics.answer(query, default_ticker="NVDA", known_tickers={"NVDA", "AAPL"})
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("latest close", "NVDA Latest close: $123.54"),
+    ("What's the 52-week high?", "NVDA 52-week high: $135.58"),
+    ("NVDA's YTD return", "NVDA YTD return: 149.50%"),
+    ("30-day volatility", "NVDA 30-day volatility (annualized): 52.00%"),
+    ("1-year volatility", "NVDA 1-year volatility (annualized): 48.00%"),
+    ("revenue growth YoY", "NVDA Revenue growth YoY: 126.00%"),
+    ("AAPL 52 week high", "AAPL 52-week high: $216.67"),
+    ("what is $aapl ytd return", "AAPL YTD return: 9.40%"),
+])
+def test_answers_exact_metric_phrases(analytics, query, expected):
+    assert answer(analytics, query).startswith(expected)
+
+
+@pytest.mark.parametrize("query", [
+    "5 year high",                     # Not the 52-week high
+    "5-year volatility",               # Not the 30-day or 1-year volatility
+    "10 day volatility",
+    "3 year max drawdown",             # The drawdown is over one year
+    "quarterly revenue growth",        # Growth is year over year
+    "current price to book ratio",     # Not the latest close
+    "last price target?",
+    "latest close in euros",
+    "Apple's YTD return",              # A company other than the loaded one
+    "Microsoft 52-week high",
+    "MSFT ytd return",                 # A ticker we have no data for
+    "NVDA and AAPL ytd return",
+    "NVDA AAPL 52-week high",          # Two tickers
+])
+def test_refuses_what_the_metric_does_not_cover(analytics, query):
+    assert answer(analytics, query) is None
@@ -0,0 +1,56 @@
+import datetime as dt
+import logging
+
+import numpy as np
+import pandas as pd
+import pytest
+import yfinance as yf
+
+import pricestore
+from downloader import BatchDownloader
+from stockdata import StockDataService
+
+LISTED = {"AAA", "BBB"}
+END = dt.date(2024, 6, 28)
+
+
+# Answers like yf.download: listed tickers get bars, unknown or delisted ones all-NaN columns
+def fake_download(tickers, start, end, **kwargs):
+    tickers = tickers.split() if isinstance(tickers, str) else list(tickers)
+    index = pd.bdate_range(start, pd.Timestamp(end) - pd.Timedelta(days=1), name="Date")
+    columns = pd.MultiIndex.from_product([["Open", "High", "Low", "Close", "Volume"], tickers],
+                                         names=["Price", "Ticker"])
+    values = np.full((len(index), len(columns)), np.nan)
+    for i, (_, ticker) in enumerate(columns):
+        if ticker in LISTED:
+            values[:, i] = 100.0
+    return pd.DataFrame(values, index=index, columns=columns)
+
+
+@pytest.fixture
+def service(tmp_path, monkeypatch):
+    monkeypatch.setattr(yf, "download", fake_download)
+    monkeypatch.setattr(pricestore, "last_completed_session", lambda: END)
+    monkeypatch.setattr(StockDataService, "price_window", lambda self, years: (END - dt.timedelta(days=60), END))
+    return StockDataService(str(tmp_path), downloader=BatchDownloader(retries=0, backoff=0))
+
+
+def test_tickers_without_bars_are_reported_and_stay_uncovered(service, caplog):
+    with caplog.at_level(logging.WARNING):
+        failed = service.sync_prices(1, tickers=["AAA", "DELISTED", "BBB"])
+    assert failed == ["DELISTED"]
+    assert "DELISTED" in caplog.text
+    assert service.price_store.coverage("AAA") is not None
+    assert service.price_store.coverage("DELISTED") is None
+    assert service.sync_prices(1, tickers=["AAA", "DELISTED", "BBB"]) == ["DELISTED"]  # Retried, still reported
+
+
+def test_lone_unknown_ticker_is_reported(service):
+    assert service.sync_prices(1, tickers=["NOSUCH"]) == ["NOSUCH"]
+
+
+def test_range_without_sessions_is_not_a_failure(monkeypatch):
+    monkeypatch.setattr(yf, "download", lambda *args, **kwargs: pd.DataFrame())
+    # A Saturday, or today before the open: nothing to return for anyone
+    results = list(BatchDownloader(retries=0).run([(["AAA", "BBB"], dt.date(2024, 6, 29), dt.date(2024, 6, 29))]))
+    assert [(bars, failed) for _, _, bars, failed in results] == [({}, [])]
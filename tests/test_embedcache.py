@@ -0,0 +1,91 @@
+import asyncio
+import json
+import os
+import time
+
+import pytest
+from llama_index.core import VectorStoreIndex
+
+from embedcache import CachedEmbedding
+from fixtures import use_fixtures
+from stockdata import StockDataService
+from stubs import StubEmbedding
+
+
+def write_news(fixture_dir, ticker, items):
+    ticker_dir = os.path.join(fixture_dir, "tickers", ticker)
+    os.makedirs(ticker_dir)
+    with open(os.path.join(ticker_dir, "news.json"), "w") as f:
+        json.dump(items, f)
+
+
+def headline(ticker, title):
+    return {"uuid": f"{ticker}-{title}", "publisher": "Reuters",
+            "content": {"title": title, "pubDate": f"2024-06-2{len(ticker)}T12:00:00Z",
+                        "canonicalUrl": {"url": f"https://example.com/{ticker}/{title.replace(' ', '-')}"}}}
+
+
+def test_same_headline_on_two_tickers_is_embedded_once(tmp_path):
+    fixture_dir = str(tmp_path / "fixtures")
+    shared = "Chip stocks rally as AI spending climbs"
+    write_news(fixture_dir, "NVDA", [headline("NVDA", shared)])
+    write_news(fixture_dir, "AMD", [headline("AMD", shared), headline("AMD", "AMD unveils new accelerator")])
+
+    service = StockDataService(str(tmp_path / "data"))
+    with use_fixtures(fixture_dir):
+        nvda, amd = service.get_news("NVDA"), service.get_news("AMD")
+    assert nvda[0].metadata["ticker"] == "NVDA" and amd[0].metadata["ticker"] == "AMD"
+
+    embed_model = CachedEmbedding(StubEmbedding(), str(tmp_path / "embeddings.sqlite"))
+    VectorStoreIndex.from_documents(nvda, embed_model=embed_model)
+    VectorStoreIndex.from_documents(amd, embed_model=embed_model)
+    assert embed_model.stats()["hits"] == 1
+    assert embed_model.stats()["misses"] == 2
+
+
+# Embeds like StubEmbedding after a delay, the way a remote model would: blocking when called
+# synchronously, awaiting when called asynchronously
+class SlowEmbedding(StubEmbedding):
+    def _get_text_embeddings(self, texts):
+        time.sleep(0.2)
+        return super()._get_text_embeddings(texts)
+
+    def _get_query_embedding(self, query):
+        time.sleep(0.2)
+        return super()._get_query_embedding(query)
+
+    async def _aget_text_embeddings(self, texts):
+        await asyncio.sleep(0.2)
+        return super()._get_text_embeddings(texts)
+
+    async def _aget_query_embedding(self, query):
+        await asyncio.sleep(0.2)
+        return super()._get_query_embedding(query)
+
+
+def test_async_misses_do_not_block_the_event_loop(tmp_path):
+    embed_model = CachedEmbedding(SlowEmbedding(), str(tmp_path / "embeddings.sqlite"))
+
+    async def main():
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        ticker = asyncio.create_task(tick())
+        await asyncio.sleep(0)
+        texts = await embed_model.aget_text_embedding_batch(["NVDA beats estimates", "AMD unveils chip"])
+        query = await embed_model.aget_query_embedding("chip news")
+        during = ticks
+        again = await embed_model.aget_text_embedding_batch(["NVDA beats estimates"])
+        ticker.cancel()
+        return texts, query, again, during
+
+    texts, query, again, during = asyncio.run(main())
+    assert during >= 20  # ~0.4s of embedding, during which the other coroutine kept running
+    assert again[0] == pytest.approx(texts[0], abs=1e-6)  # Cached as float32
+    assert query == StubEmbedding().get_query_embedding("chip news")
+    assert embed_model.stats()["hits"] == 1 and embed_model.stats()["misses"] == 3
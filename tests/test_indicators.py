@@ -0,0 +1,68 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from indicators import INDICATORS, IndicatorEngine
+
+
+def make_panel(days=320, tickers=("AAA", "BBB", "SPY"), seed=0):
+    rng = np.random.default_rng(seed)
+    index = pd.bdate_range(end="2024-06-28", periods=days, name="Date")
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, (days, len(tickers))), axis=0))
+    spread = np.abs(rng.normal(0, 0.01, close.shape)) * close
+    frames = {"Close": close, "High": close + spread, "Low": close - spread}
+    return pd.concat({name: pd.DataFrame(values, index=index, columns=list(tickers))
+                      for name, values in frames.items()}, axis=1, names=["Price", "Ticker"])
+
+
+def revise(panel, date, change):
+    panel = panel.copy()
+    for price in ("Close", "High", "Low"):
+        panel.loc[date, (price, "AAA")] += change
+    return panel
+
+
+def assert_matches_cold(engine, panel):
+    cold = IndicatorEngine().update(panel)
+    for name in INDICATORS:
+        np.testing.assert_allclose(engine.result(name).to_numpy(), cold.result(name).to_numpy(),
+                                   rtol=1e-9, atol=1e-9, equal_nan=True, err_msg=name)
+        assert engine.result(name).index.equals(cold.result(name).index)
+
+
+@pytest.mark.parametrize("bars_back", [1, 3, 5])
+def test_revised_recent_bar_matches_cold_computation(bars_back):
+    panel = make_panel()
+    engine = IndicatorEngine().update(panel.iloc[:-10]).update(panel)
+    revised = revise(panel, panel.index[-bars_back], 20.0)
+    engine.update(revised)
+    assert_matches_cold(engine, revised)
+    assert engine.result("sma_20")["AAA"].iloc[-1] == pytest.approx(revised["Close"]["AAA"].iloc[-20:].mean())
+
+
+def test_revision_with_new_bars_matches_cold_computation():
+    panel = make_panel()
+    engine = IndicatorEngine().update(panel.iloc[:-3])
+    revised = revise(panel, panel.index[-4], -5.0)  # The last bar already computed, plus three new ones
+    engine.update(revised)
+    assert_matches_cold(engine, revised)
+
+
+def test_old_revision_and_dropped_bar_match_cold_computation():
+    panel = make_panel()
+    engine = IndicatorEngine().update(panel)
+    revised = revise(panel, panel.index[-100], 10.0)
+    engine.update(revised)
+    assert_matches_cold(engine, revised)
+
+    dropped = revised.drop(revised.index[-2])
+    engine.update(dropped)
+    assert_matches_cold(engine, dropped)
+
+
+def test_unchanged_panel_computes_nothing():
+    panel = make_panel()
+    engine = IndicatorEngine().update(panel)
+    before = engine.result("rsi_14")
+    engine.update(panel)
+    assert engine.result("rsi_14") is before
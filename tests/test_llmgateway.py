@@ -0,0 +1,55 @@
+import asyncio
+
+import pytest
+
+from llama_index.core.llms import ChatMessage
+
+from llmgateway import LLMGateway
+from stubs import FakeProvider
+
+
+@pytest.fixture
+def provider():
+    with FakeProvider(latency=0.3) as provider:
+        yield provider
+
+
+def llm(provider, gateway, model, **kwargs):
+    return gateway.llm(model, base_url=f"{provider.url}/v1", api_key="fake", **kwargs)
+
+
+def together(*llms):
+    async def ask(llm):
+        return await llm.achat([ChatMessage(role="user", content="Summarize the outlook for NVDA")])
+
+    async def main():
+        return await asyncio.gather(*[ask(llm) for llm in llms])
+    return asyncio.run(main())
+
+
+def test_identical_requests_share_a_call(provider):
+    gateway = LLMGateway("openai", max_concurrency=4)
+    together(llm(provider, gateway, "gpt-4o"), llm(provider, gateway, "gpt-4o"))
+    assert provider.requests == 1
+
+
+def test_different_models_are_not_coalesced(provider):
+    gateway = LLMGateway("openai", max_concurrency=4)
+    first, second = together(llm(provider, gateway, "gpt-4o"), llm(provider, gateway, "gpt-4o-mini"))
+    assert provider.requests == 2
+    assert first.raw.model == "gpt-4o"
+    assert second.raw.model == "gpt-4o-mini"
+
+
+def test_different_settings_are_not_coalesced(provider):
+    gateway = LLMGateway("openai", max_concurrency=4)
+    together(llm(provider, gateway, "gpt-4o", temperature=0.0), llm(provider, gateway, "gpt-4o", temperature=0.7),
+             llm(provider, gateway, "gpt-4o", temperature=0.0, max_tokens=50))
+    assert provider.requests == 3
+
+
+def test_different_endpoints_are_not_coalesced():
+    gateway = LLMGateway("openai", max_concurrency=4)
+    with FakeProvider(latency=0.3) as first, FakeProvider(latency=0.3) as second:
+        together(llm(first, gateway, "gpt-4o"), llm(second, gateway, "gpt-4o"))
+    assert (first.requests, second.requests) == (1, 1)
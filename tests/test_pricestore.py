@@ -0,0 +1,80 @@
+import datetime as dt
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+import pricestore
+from fixtures import use_fixtures
+from stockdata import StockDataService
+
+WEDNESDAY = dt.date(2024, 6, 26)
+
+
+def bars(closes, end):
+    index = pd.bdate_range(end=end, periods=len(closes), name="Date")
+    return pd.DataFrame({"Open": closes, "High": closes, "Low": closes, "Close": closes,
+                         "Volume": [1000] * len(closes)}, index=index)
+
+
+def write_prices(fixture_dir, ticker, frame):
+    os.makedirs(os.path.join(fixture_dir, "prices"), exist_ok=True)
+    frame.to_pickle(os.path.join(fixture_dir, "prices", f"{ticker}.pkl"))
+
+
+def test_next_sync_fetches_the_session_in_progress_again(tmp_path, monkeypatch):
+    fixture_dir = str(tmp_path / "fixtures")
+    service = StockDataService(str(tmp_path / "data"), universe=["NVDA"])
+    monkeypatch.setattr(StockDataService, "price_window", lambda self, years: (dt.date(2024, 6, 3), WEDNESDAY))
+
+    # Midday Wednesday: Tuesday's session is the last one that closed; Wednesday's bar is partial
+    monkeypatch.setattr(pricestore, "last_completed_session", lambda: WEDNESDAY - dt.timedelta(days=1))
+    write_prices(fixture_dir, "NVDA", bars([100.0] * 17 + [120.0], WEDNESDAY))
+    with use_fixtures(fixture_dir):
+        service.sync_prices(1)
+    assert service.price_store.coverage("NVDA")[1] == WEDNESDAY - dt.timedelta(days=1)
+    assert service.price_store.read("NVDA")["Close"].iloc[-1] == 120.0
+
+    # After the close Wednesday's final bar replaces the partial one, and then the day is covered
+    monkeypatch.setattr(pricestore, "last_completed_session", lambda: WEDNESDAY)
+    write_prices(fixture_dir, "NVDA", bars([100.0] * 17 + [125.0], WEDNESDAY))
+    with use_fixtures(fixture_dir):
+        service.sync_prices(1)
+    assert service.price_store.read("NVDA")["Close"].iloc[-1] == 125.0
+    assert len(service.price_store.read("NVDA")) == 18
+    assert service.price_store.coverage("NVDA")[1] == WEDNESDAY
+    assert service.price_store.missing_ranges("NVDA", dt.date(2024, 6, 3), WEDNESDAY) == []
+
+
+def test_only_the_session_in_progress_leaves_nothing_covered(tmp_path, monkeypatch):
+    store = pricestore.PriceStore(str(tmp_path))
+    monkeypatch.setattr(pricestore, "last_completed_session", lambda: WEDNESDAY - dt.timedelta(days=1))
+    store.merge("NVDA", bars([120.0], WEDNESDAY), WEDNESDAY, WEDNESDAY)
+    assert store.coverage("NVDA") is None
+    assert store.missing_ranges("NVDA", WEDNESDAY, WEDNESDAY) == [(WEDNESDAY, WEDNESDAY)]
+
+
+def test_concurrent_merges_keep_every_bar(tmp_path):
+    store = pricestore.PriceStore(str(tmp_path))
+    days = pd.bdate_range(end=WEDNESDAY, periods=64, name="Date")
+
+    def merge(i):
+        day = days[i].date()
+        store.merge("NVDA", bars([float(i)], day), day, day, save_manifest=False)
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(merge, range(len(days))))
+    stored = store.read("NVDA")
+    assert list(stored.index) == list(days)
+    assert list(stored["Close"]) == [float(i) for i in range(len(days))]
+
+
+def test_version_follows_contents(tmp_path):
+    store = pricestore.PriceStore(str(tmp_path))
+    versions = []
+    for close in (1.0, 2.0, 2.0):
+        store.merge("NVDA", bars([close], WEDNESDAY), WEDNESDAY, WEDNESDAY)
+        versions.append(store.version("NVDA"))
+    assert versions[0] != versions[1]
+    assert versions[1] == versions[2]  # Downloading the same bar again leaves the version alone
+    assert isinstance(versions[0], int)
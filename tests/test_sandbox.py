@@ -0,0 +1,110 @@
+import pandas as pd
+import pytest
+
+from sandbox import ExpressionError, ExpressionExecutor, ExpressionRejected
+
+CHANGES_DF = [
+    "df.pop('Close')",
+    "df.insert(0, 'Extra', 1)",
+    "df.update(df * 2)",
+    "df['Close'].values.sort()",
+    "np.copyto(df['Close'].values, 0)",
+    "df['Close'].values.fill(0)",
+    "df.attrs.update({'x': 1})",
+]
+WRITES_FILES = [
+    "df.to_string('/tmp/sandbox_test_out')",
+    "df.to_string(buf='/tmp/sandbox_test_out')",
+    "df.to_markdown('/tmp/sandbox_test_out')",
+    "df.to_csv('/tmp/sandbox_test_out')",
+    "np.fromregex('/etc/passwd', '(.*)', [('line', 'S64')])",
+    "np.fromfile('/etc/passwd')",
+    "pd.HDFStore('/tmp/sandbox_test_out')",
+    "pd.ExcelWriter('/tmp/sandbox_test_out.xlsx')",
+]
+
+EVALUATES_STRINGS = [
+    """df.query('@pd.io.common.os.system("id") == 0', engine='python')""",
+    "df.eval('Close * 2')",
+    "pd.eval('1 + 1')",
+    "df.agg('query', expr='Close > 1')",
+    "df.apply('eval', expr='Close * 2')",
+    "'{0.__class__.__init__.__globals__}'.format(df)",
+    "'{0[Close]}'.format(df)",
+    "f = '{}'\nf.format(df)",
+    "df.style.format('{0.__class__}')",
+]
+
+
+def prices():
+    return pd.DataFrame({"Close": [3.0, 1.0, 2.0], "Volume": [10, 30, 20]},
+                        index=pd.date_range("2024-01-01", periods=3))
+
+
+@pytest.fixture(scope="module", params=[0, 1], ids=["in-process", "worker"])
+def executor(request):
+    executor = ExpressionExecutor(workers=request.param, timeout=60)
+    yield executor
+    executor.close()
+
+
+@pytest.mark.parametrize("source", CHANGES_DF + WRITES_FILES)
+def test_rejected_and_df_unchanged(executor, source, tmp_path):
+    df = prices()
+    key = executor.new_frame_key()
+    with pytest.raises(ExpressionRejected):
+        executor.run(key, df, source)
+    pd.testing.assert_frame_equal(df, prices())
+    assert executor.run(key, df, "df['Close'].sum()") == "6.0"
+
+
+def test_unlisted_changes_only_reach_a_copy(executor):
+    df = prices()
+    key = executor.new_frame_key()
+    # ufuncs writing through out= aren't on the deny list; they change the copy evaluate makes
+    executor.run(key, df, "np.negative(df['Close'].values, out=df['Close'].values).sum()")
+    pd.testing.assert_frame_equal(df, prices())
+    assert executor.run(key, df, "df['Close'].sum()") == "6.0"
+
+
+def test_text_output_still_allowed(executor):
+    df = prices()
+    assert "Close" in executor.run(executor.new_frame_key(), df, "df.to_string()")
+
+
+@pytest.mark.parametrize("source", EVALUATES_STRINGS)
+def test_string_evaluation_rejected(executor, source):
+    with pytest.raises(ExpressionRejected):
+        executor.run(executor.new_frame_key(), prices(), source)
+
+
+def test_shell_escape_through_query_rejected():
+    executor = ExpressionExecutor(workers=0)
+    with pytest.raises(ExpressionRejected, match="query"):
+        executor.run(executor.new_frame_key(), prices(),
+                     """df.query('@pd.io.common.os.system("id") == 0', engine='python')""")
+
+
+def test_method_name_built_at_run_time_refused_in_worker():
+    executor = ExpressionExecutor(workers=1, timeout=60)
+    try:
+        with pytest.raises(ExpressionError, match="not allowed"):
+            executor.run(executor.new_frame_key(), prices(), "df.agg('qu' + 'ery', expr='Close > 1')")
+    finally:
+        executor.close()
+
+
+@pytest.mark.parametrize("source", ["pd.io", "np.lib", "pd.api", "np.random", "pd.DataFrame.query"])
+def test_modules_not_reachable_through_pd_and_np(executor, source):
+    with pytest.raises(ExpressionError):
+        executor.run(executor.new_frame_key(), prices(), source)
+
+
+@pytest.mark.parametrize("source, expected", [
+    ("np.where(df['Close'] > 1.5, 1, 0).sum()", "2"),
+    ("pd.to_datetime('2024-01-02') in df.index", "True"),
+    ("'{:.1f}'.format(df['Close'].mean())", "2.0"),
+    ("pd.concat([df, df])['Volume'].sum()", "120"),
+])
+def test_curated_pd_and_np_still_work(executor, source, expected):
+    assert executor.run(executor.new_frame_key(), prices(), source) == expected
@@ -0,0 +1,115 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from aiohttp.test_utils import TestClient, TestServer
+
+from server import AgentPool, AnalysisServer, PoolBusy
+
+
+def test_freed_agent_goes_to_the_waiting_request_first():
+    async def main():
+        pool = AgentPool(["agent"])
+        order = []
+
+        async def first():
+            async with pool.acquire():
+                await asyncio.sleep(0.05)
+            # The agent was just freed and the waiter hasn't run since: a newcomer must not take it
+            async with pool.acquire():
+                order.append("newcomer")
+
+        async def waiter():
+            async with pool.acquire():
+                order.append("waiter")
+
+        running = asyncio.create_task(first())
+        await asyncio.sleep(0.01)
+        await asyncio.gather(running, waiter())
+        return order, pool.idle
+
+    assert asyncio.run(main()) == (["waiter", "newcomer"], 1)
+
+
+def test_waiters_are_served_in_arrival_order():
+    async def main():
+        pool = AgentPool(["a", "b"])
+        order = []
+
+        async def use(name, hold):
+            async with pool.acquire():
+                order.append(name)
+                await asyncio.sleep(hold)
+
+        tasks = [asyncio.create_task(use("busy1", 0.05)), asyncio.create_task(use("busy2", 0.05))]
+        await asyncio.sleep(0.01)
+        for i in range(5):
+            tasks.append(asyncio.create_task(use(f"waiter{i}", 0.01)))
+            await asyncio.sleep(0)
+        await asyncio.gather(*tasks)
+        return order, pool.idle, pool.pending
+
+    order, idle, pending = asyncio.run(main())
+    assert order == ["busy1", "busy2"] + [f"waiter{i}" for i in range(5)]
+    assert (idle, pending) == (2, 0)
+
+
+def test_timed_out_and_cancelled_waiters_give_up_their_place():
+    async def main():
+        pool = AgentPool(["agent"], acquire_timeout=0.02)
+
+        async def hold():
+            async with pool.acquire():
+                await asyncio.sleep(0.1)
+
+        holder = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        with pytest.raises(PoolBusy):
+            async with pool.acquire():
+                pass
+        cancelled = asyncio.create_task(pool.acquire().__aenter__())
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        await holder
+        async with pool.acquire() as agent:
+            return agent, pool.pending
+
+    assert asyncio.run(main()) == ("agent", 0)
+
+
+class FakeAgent():
+    def __init__(self):
+        self.ticker = "NVDA"
+        self.tickers_set = []
+        self.service = SimpleNamespace(price_window=lambda years: (None, None))
+
+    def set_ticker(self, ticker):
+        self.tickers_set.append(ticker)
+        self.ticker = ticker
+
+    async def analyze_stream(self, query):
+        yield {"type": "answer", "text": f"{self.ticker}: {query}"}
+
+
+def test_invalid_tickers_are_rejected():
+    async def main():
+        agent = FakeAgent()
+        async with TestClient(TestServer(AnalysisServer(AgentPool([agent])).app())) as client:
+            responses = [await client.post("/analyze", json={"query": "q", "ticker": ticker})
+                         for ticker in ("../../x", "..", "NVDA/../..", "A" * 16, 5)]
+            statuses = [response.status for response in responses]
+            chart = await client.get("/chart", params={"tickers": "NVDA,../../x"})
+
+            async with client.ws_connect("/ws") as ws:
+                await ws.send_json({"query": "q", "ticker": "../x"})
+                ws_event = await ws.receive_json()
+
+            valid = await client.post("/analyze", json={"query": "q", "ticker": "brk-b"})
+            return statuses, chart.status, ws_event, valid.status, await valid.json(), agent.tickers_set
+
+    statuses, chart_status, ws_event, valid_status, valid_body, tickers_set = asyncio.run(main())
+    assert statuses == [400] * 5
+    assert chart_status == 400
+    assert ws_event["type"] == "error" and "Invalid ticker" in ws_event["error"]
+    assert (valid_status, valid_body["answer"]) == (200, "BRK-B: q")
+    assert tickers_set == ["BRK-B"]  # The rejected requests never reached the agent
@@ -0,0 +1,387 @@
+import os
+import json
+import time
+import logging
+import secrets
+import inspect
+import functools
+import threading
+import contextvars
+
+# Lightweight spans around the hot paths: data fetches, storage I/O, embedding, query engines,
+# tool calls and LLM requests. Spans nest through a context variable (across awaits, and into
+# asyncio.to_thread) and are handed to every registered sink when they start and finish.
+# With no sink registered, span() returns a shared no-op object and traced() calls straight
+# through, so instrumentation costs one global check.
+#
+#   tracing.add_sink(tracing.JSONLinesSink("traces.jsonl"))
+#   with tracing.span("my.step", ticker="NVDA") as s:
+#       s.set("rows", len(df))
+#
+# CAPIT_TRACE=log | jsonl:<path> | otel configures a sink from the environment at import.
+
+_sinks = []
+_current = contextvars.ContextVar("capit_span", default=None)
+_llm_handler_installed = False
+_install_lock = threading.Lock()
+
+
+class Span():
+    __slots__ = ("name", "attributes", "trace_id", "span_id", "parent_id", "start_ns", "end_ns", "error")
+
+    def __init__(self, name, attributes, parent=None):
+        self.name = name
+        self.attributes = attributes
+        self.trace_id = parent.trace_id if parent else secrets.token_hex(16)
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent.span_id if parent else None
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.error = None
+
+    def set(self, key, value):
+        self.attributes[key] = value
+        return self
+
+    # Adds to a numeric attribute, e.g. bytes read over several calls
+    def add(self, key, amount):
+        self.attributes[key] = self.attributes.get(key, 0) + amount
+        return self
+
+    @property
+    def duration_ms(self):
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e6
+
+    # OpenTelemetry-style field names, so JSON lines can be loaded by OTLP tooling
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_span_id": self.parent_id,
+            "start_time_unix_nano": self.start_ns,
+            "end_time_unix_nano": self.end_ns,
+            "duration_ms": round(self.duration_ms, 3),
+            "status": "ERROR" if self.error else "OK",
+            "error": self.error,
+            "attributes": self.attributes,
+        }
+
+
+# Stands in for a Span when tracing is off
+class _NoopSpan():
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, key, value):
+        return self
+
+    def add(self, key, amount):
+        return self
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+def _emit(method, span):
+    for sink in list(_sinks):
+        try:
+            getattr(sink, method)(span)
+        except Exception as e:
+            logging.warning(f"Trace sink {type(sink).__name__} failed: {str(e)}")
+
+
+# Starts a span without making it current; pair with finish_span (and use_span to nest work under it)
+def start_span(name, attributes=None, parent=None):
+    if not _sinks:
+        return NOOP_SPAN
+    span = Span(name, attributes or {}, parent if parent is not None else _current.get())
+    _emit("start", span)
+    return span
+
+
+def finish_span(span, error=None):
+    if not isinstance(span, Span):
+        return
+    span.end_ns = time.time_ns()
+    if error is not None:
+        span.error = f"{type(error).__name__}: {error}"
+    _emit("end", span)
+
+
+class _ActiveSpan():
+    __slots__ = ("name", "attributes", "span", "token")
+
+    def __init__(self, name, attributes):
+        self.name = name
+        self.attributes = attributes
+
+    def __enter__(self):
+        self.span = start_span(self.name, self.attributes)
+        self.token = _current.set(self.span)
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            _current.reset(self.token)
+        except ValueError:
+            pass  # Exited from another context, e.g. an async generator closed by someone else
+        finish_span(self.span, exc)
+        return False
+
+
+class _UseSpan():
+    __slots__ = ("span", "token")
+
+    def __init__(self, span):
+        self.span = span
+
+    def __enter__(self):
+        self.token = _current.set(self.span)
+        return self.span
+
+    def __exit__(self, *exc):
+        _current.reset(self.token)
+        return False
+
+
+# Makes a span from start_span current inside a block, without finishing it
+def use_span(span):
+    if not isinstance(span, Span):
+        return NOOP_SPAN
+    return _UseSpan(span)
+
+
+# Context manager timing a block as a child of the current span
+def span(name, **attributes):
+    if not _sinks:
+        return NOOP_SPAN
+    return _ActiveSpan(name, attributes)
+
+
+# The innermost active span (a no-op span if there is none), for attaching attributes from deep code
+def current_span():
+    return _current.get() or NOOP_SPAN
+
+
+def enabled():
+    return bool(_sinks)
+
+
+# Decorator that wraps each call of a function (sync or async) in a span
+# args names parameters whose values are recorded as attributes, e.g. args=("ticker_sym",)
+def traced(name=None, args=()):
+    def decorator(fn):
+        span_name = name or fn.__qualname__
+        signature = inspect.signature(fn) if args else None
+
+        def attributes(call_args, call_kwargs):
+            if not signature:
+                return {}
+            bound = signature.bind_partial(*call_args, **call_kwargs).arguments
+            return {arg: bound[arg] for arg in args if arg in bound}
+
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*call_args, **call_kwargs):
+                if not _sinks:
+                    return await fn(*call_args, **call_kwargs)
+                with _ActiveSpan(span_name, attributes(call_args, call_kwargs)):
+                    return await fn(*call_args, **call_kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*call_args, **call_kwargs):
+            if not _sinks:
+                return fn(*call_args, **call_kwargs)
+            with _ActiveSpan(span_name, attributes(call_args, call_kwargs)):
+                return fn(*call_args, **call_kwargs)
+        return wrapper
+
+    return decorator
+
+
+# Sinks implement start(span) and end(span); they are called as each span starts and finishes
+
+# Logs one line per finished span
+class LogSink():
+    def __init__(self, level=logging.INFO):
+        self.level = level
+
+    def start(self, span):
+        pass
+
+    def end(self, span):
+        attributes = " ".join(f"{key}={value}" for key, value in span.attributes.items())
+        status = f" error={span.error}" if span.error else ""
+        logging.log(self.level, f"[trace] {span.name} {span.duration_ms:.1f}ms {attributes}{status}")
+
+
+# Appends one JSON object per finished span to a file
+class JSONLinesSink():
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, "a")
+
+    def start(self, span):
+        pass
+
+    def end(self, span):
+        line = json.dumps(span.to_dict(), default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+# Keeps finished spans in memory, e.g. for benchmarks and tests
+class MemorySink():
+    def __init__(self):
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def start(self, span):
+        pass
+
+    def end(self, span):
+        with self._lock:
+            self.spans.append(span)
+
+    # Total milliseconds and count per span name
+    def summary(self):
+        totals = {}
+        with self._lock:
+            for span in self.spans:
+                total = totals.setdefault(span.name, {"count": 0, "ms": 0.0})
+                total["count"] += 1
+                total["ms"] += span.duration_ms
+        return totals
+
+
+# Forwards spans to OpenTelemetry (needs the opentelemetry-api/sdk packages)
+# Parent/child links are kept, so traces show up nested in any OTel backend.
+class OpenTelemetrySink():
+    def __init__(self, tracer_name="capit.ai"):
+        try:
+            from opentelemetry import trace
+        except ImportError:
+            raise ImportError("OpenTelemetrySink requires opentelemetry-api: pip install opentelemetry-sdk")
+
+        self._trace = trace
+        self._tracer = trace.get_tracer(tracer_name)
+        self._open = {}  # our span id -> OTel span
+        self._lock = threading.Lock()
+
+    def start(self, span):
+        with self._lock:
+            parent = self._open.get(span.parent_id)
+        context = self._trace.set_span_in_context(parent) if parent is not None else None
+        otel_span = self._tracer.start_span(span.name, context=context, start_time=span.start_ns)
+        with self._lock:
+            self._open[span.span_id] = otel_span
+
+    def end(self, span):
+        with self._lock:
+            otel_span = self._open.pop(span.span_id, None)
+        if otel_span is None:
+            return
+        for key, value in span.attributes.items():
+            otel_span.set_attribute(key, value if isinstance(value, (bool, int, float, str)) else str(value))
+        if span.error:
+            otel_span.set_status(self._trace.Status(self._trace.StatusCode.ERROR, span.error))
+        otel_span.end(end_time=span.end_ns)
+
+
+def add_sink(sink):
+    _install_llm_handler()
+    _sinks.append(sink)
+    return sink
+
+
+def remove_sink(sink):
+    if sink in _sinks:
+        _sinks.remove(sink)
+
+
+# Token counts from a provider response's usage block, or estimated from the text (~4 chars a token)
+def _token_counts(response, prompt_text):
+    raw = getattr(response, "raw", None)
+    usage = raw.get("usage") if isinstance(raw, dict) else getattr(raw, "usage", None)
+    if usage is not None:
+        if not isinstance(usage, dict):
+            usage = usage.model_dump() if hasattr(usage, "model_dump") else vars(usage)
+        prompt = usage.get("input_tokens", usage.get("prompt_tokens"))
+        completion = usage.get("output_tokens", usage.get("completion_tokens"))
+        if prompt is not None or completion is not None:
+            return {"prompt_tokens": prompt, "completion_tokens": completion}
+
+    text = getattr(getattr(response, "message", None), "content", None) or getattr(response, "text", "") or ""
+    return {"prompt_tokens": len(prompt_text) // 4, "completion_tokens": len(text) // 4, "tokens_estimated": True}
+
+
+# Turns LlamaIndex's LLM start/end events into "llm.chat" / "llm.completion" spans
+def _install_llm_handler():
+    global _llm_handler_installed
+    with _install_lock:
+        if _llm_handler_installed:
+            return
+        _llm_handler_installed = True
+
+    from llama_index.core.instrumentation import get_dispatcher
+    from llama_index.core.instrumentation.event_handlers import BaseEventHandler
+    from llama_index.core.instrumentation.events.llm import (
+        LLMChatStartEvent, LLMChatEndEvent, LLMCompletionStartEvent, LLMCompletionEndEvent,
+    )
+
+    open_spans = {}  # LlamaIndex span id -> (our span, prompt text)
+
+    class LLMSpanHandler(BaseEventHandler):
+        @classmethod
+        def class_name(cls):
+            return "LLMSpanHandler"
+
+        def handle(self, event, **kwargs):
+            if not _sinks:
+                return
+
+            if isinstance(event, (LLMChatStartEvent, LLMCompletionStartEvent)):
+                if isinstance(event, LLMChatStartEvent):
+                    name, prompt = "llm.chat", "\n".join(str(m.content or "") for m in event.messages)
+                    model = (event.model_dict or {}).get("model")
+                else:
+                    name, prompt, model = "llm.completion", event.prompt, None
+                open_spans[event.span_id] = (start_span(name, {"model": model, "prompt_chars": len(prompt)}), prompt)
+
+            elif isinstance(event, (LLMChatEndEvent, LLMCompletionEndEvent)):
+                started = open_spans.pop(event.span_id, None)
+                if started is None:
+                    return
+                llm_span, prompt = started
+                if event.response is not None:
+                    for key, value in _token_counts(event.response, prompt).items():
+                        llm_span.set(key, value)
+                finish_span(llm_span)
+
+    get_dispatcher().add_event_handler(LLMSpanHandler())
+
+
+# Sets up a sink from a spec string: "log", "jsonl:<path>" or "otel"
+def configure(spec):
+    if not spec:
+        return None
+    if spec == "log":
+        return add_sink(LogSink())
+    if spec.startswith("jsonl:"):
+        return add_sink(JSONLinesSink(spec[len("jsonl:"):]))
+    if spec == "otel":
+        return add_sink(OpenTelemetrySink())
+    raise ValueError(f"Unknown trace sink '{spec}'. Use log, jsonl:<path> or otel")
+
+
+configure(os.environ.get("CAPIT_TRACE"))
@@ -0,0 +1,48 @@
+import os
+import re
+import pandas as pd
+
+# Default list of stock tickers to get data from
+DEFAULT_UNIVERSE = ["AAPL", "NVDA", "TSLA", "MSFT", "GOOGL", "AMZN", "META", "NFLX", "INTC", "AMD"]
+
+
+# Yahoo symbols: letters, digits and . - ^ = (BRK-B, ^GSPC, EURUSD=X), with at least one letter or digit
+TICKER_PATTERN = re.compile(r"^(?=.*[A-Z0-9])[A-Z0-9.\-^=]{1,15}$")
+
+
+# Whether an (upper-case) symbol looks like a ticker - it becomes a directory name, so nothing
+# else (a path like ../x, or ..) is accepted
+def valid_ticker(symbol):
+    return isinstance(symbol, str) and TICKER_PATTERN.match(symbol) is not None
+
+
+# Resolves a ticker universe into a clean list of Yahoo symbols
+# source can be None (default list), a list of tickers, or a path to a file:
+#   - .csv files are read from their "Symbol" or "Ticker" column (first column otherwise)
+#   - any other file is read as tickers separated by newlines, commas or spaces
+def load_universe(source=None):
+    if source is None:
+        tickers = DEFAULT_UNIVERSE
+    elif isinstance(source, str):
+        tickers = _read_universe_file(source)
+    else:
+        tickers = list(source)
+
+    # Yahoo uses dashes for share classes (BRK.B -> BRK-B); drop blanks and duplicates, keep order
+    cleaned = [str(t).strip().upper().replace(".", "-") for t in tickers]
+    return list(dict.fromkeys(t for t in cleaned if t))
+
+
+def _read_universe_file(path):
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Universe file {path} not found")
+
+    if path.endswith(".csv"):
+        df = pd.read_csv(path)
+        for col in ("Symbol", "Ticker", "symbol", "ticker"):
+            if col in df.columns:
+                return df[col].dropna().tolist()
+        return df.iloc[:, 0].dropna().tolist()
+
+    with open(path) as f:
+        return f.read().replace(",", " ").split()